@@ -0,0 +1,404 @@
+# src/client.py
+# Klien publisher untuk aggregator. Event dikumpulkan menjadi batch (per ukuran atau waktu),
+# dikirim lewat pool koneksi keep-alive dengan jumlah request bersamaan terbatas, dan body
+# di-gzip. Batch yang ditolak sementara (429/503/gangguan jaringan) dikirim ulang dengan
+# event_id yang sama, jadi aman karena dedup di server.
+#
+#   async with AsyncPublisher("http://127.0.0.1:8080") as publisher:
+#       await publisher.publish({"topic": "app.logs", "source": "svc-a", "payload": {"msg": "..."}})
+#
+#   with Publisher("http://127.0.0.1:8080") as publisher:      # versi sync (thread)
+#       publisher.publish({"topic": "app.logs", "source": "svc-a", "payload": {"msg": "..."}})
+#
+# Hanya bergantung pada httpx, tidak mengimpor modul server.
+
+import asyncio
+import concurrent.futures
+import gzip
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import httpx
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Status yang berarti "coba lagi nanti"; status 4xx lain berarti batch memang ditolak
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Jumlah pesan error permanen yang disimpan untuk PublishError
+MAX_ERRORS = 20
+
+COUNTER_NAMES = ("events", "requests", "accepted", "rejected", "failed", "retries", "retries_busy", "bytes_raw", "bytes_sent")
+
+
+class PublishError(Exception):
+    """Sebagian event gagal dikirim (ditolak server atau batas retry habis), dilaporkan saat flush/close."""
+
+    def __init__(self, failed: int, errors: List[str]):
+        super().__init__(f"{failed} event gagal dikirim: {'; '.join(errors[:3])}")
+        self.failed = failed
+        self.errors = errors
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Tipe {type(value).__name__} tidak bisa diserialisasi ke JSON")
+
+
+def encode_event(event: Union[Dict[str, Any], Any]) -> str:
+    """
+    Event (dict atau model pydantic) -> teks JSON satu baris. event_id dan timestamp yang
+    kosong diisi DI SINI, bukan oleh server: server membuat event_id baru di setiap request,
+    sehingga pengiriman ulang tanpa event_id akan tersimpan dua kali.
+    """
+    event = event.model_dump(mode="json") if hasattr(event, "model_dump") else dict(event)
+    if not event.get("event_id"):
+        event["event_id"] = str(uuid.uuid4())
+    if event.get("timestamp") is None:
+        event["timestamp"] = datetime.utcnow().isoformat()
+    return json.dumps(event, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return max(0.0, float(response.headers["retry-after"]))
+    except (KeyError, ValueError):
+        return None
+
+
+class _BatchJob:
+    """
+    Satu batch dan status pengiriman ulangnya, tanpa I/O (dipakai klien async dan sync).
+    Dengan gzip, batch dikirim sebagai NDJSON ke /publish/stream: saat 429/503 hanya baris
+    setelah committed_line yang dikirim ulang. Tanpa gzip, batch dikirim sebagai array JSON
+    ke /publish (diterima/ditolak utuh).
+    /publish juga menerima gzip, tapi jalur stream tetap dipakai untuk gzip: di /publish satu
+    event tidak valid membuat seluruh batch 422 dan setiap 429/503 mengulang seluruh batch,
+    sedangkan /publish/stream menolak per baris dan melanjutkan dari committed_line.
+    compress=False dipertahankan untuk server/proxy yang tidak meneruskan body gzip.
+    """
+
+    def __init__(self, lines: List[str], compress: bool, compress_level: int,
+                 max_retries: int, backoff: float, max_backoff: float):
+        self.lines = lines
+        self.compress = compress
+        self.compress_level = compress_level
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.attempts = 0
+        self.counters = dict.fromkeys(COUNTER_NAMES, 0)
+        self.errors: List[str] = []
+
+    def request(self) -> Tuple[str, bytes, Dict[str, str]]:
+        """(path, body, header) untuk sisa batch."""
+        if self.compress:
+            raw = ("\n".join(self.lines) + "\n").encode("utf-8")
+            body = gzip.compress(raw, compresslevel=self.compress_level)
+            path, headers = "/publish/stream", {"Content-Type": NDJSON_MEDIA_TYPE, "Content-Encoding": "gzip"}
+        else:
+            raw = body = ("[" + ",".join(self.lines) + "]").encode("utf-8")
+            path, headers = "/publish", {"Content-Type": "application/json"}
+        self.counters["requests"] += 1
+        self.counters["bytes_raw"] += len(raw)
+        self.counters["bytes_sent"] += len(body)
+        return path, body, headers
+
+    def handle(self, outcome: Union[httpx.Response, Exception]) -> Optional[float]:
+        """Memproses hasil satu request. Mengembalikan jeda sebelum kirim ulang, atau None jika batch selesai."""
+        if isinstance(outcome, Exception):
+            message, delay = f"{outcome!r}", None
+        else:
+            status = outcome.status_code
+            summary = self._stream_summary(outcome, status == 202)
+            if status == 202:
+                self._done(summary["accepted"] if summary else len(self.lines))
+                return None
+            if summary:
+                # Baris sampai committed_line sudah ditangani server: hanya sisanya yang dikirim ulang
+                # (atau dilaporkan gagal jika statusnya bukan untuk diulang)
+                self.counters["accepted"] += summary["accepted"]
+                self.lines = self.lines[summary["committed_line"]:]
+            if status not in RETRY_STATUSES:
+                self._fail(len(self.lines), f"HTTP {status}: {outcome.text[:200]}")
+                return None
+            if status == 429:
+                self.counters["retries_busy"] += 1
+            message, delay = f"HTTP {status}", _retry_after(outcome)
+        self.attempts += 1
+        if self.attempts > self.max_retries:
+            self._fail(len(self.lines), f"batas retry habis ({message})")
+            return None
+        self.counters["retries"] += 1
+        if delay is None:
+            delay = min(self.max_backoff, self.backoff * 2 ** (self.attempts - 1)) * random.uniform(0.5, 1.0)
+        return delay
+
+    def _stream_summary(self, response: httpx.Response, complete: bool) -> Optional[Dict[str, Any]]:
+        """
+        Ringkasan /publish/stream (accepted, rejected, committed_line, errors); baris ditolak dicatat.
+        Jika stream terhenti (complete False), hanya baris ditolak sampai committed_line yang
+        dihitung: sisanya ikut dikirim ulang dan dilaporkan oleh percobaan berikutnya.
+        """
+        if not self.compress:
+            return None
+        try:
+            summary = response.json()
+        except ValueError:
+            return None
+        if not isinstance(summary, dict) or "committed_line" not in summary:
+            return None
+        errors = summary.get("errors", [])
+        if not complete:
+            # Server hanya menghitung baris sampai committed_line di "rejected"; errors disaring juga
+            errors = [error for error in errors if error["line"] <= summary["committed_line"]]
+        if summary["rejected"]:
+            self.counters["rejected"] += summary["rejected"]
+            for error in errors:
+                self._error(f"{self.lines[error['line'] - 1][:80]}: {error['error']}")
+        return summary
+
+    def _done(self, accepted: int):
+        self.counters["accepted"] += accepted
+        self.lines = []
+
+    def _fail(self, count: int, message: str):
+        self.counters["failed"] += count
+        self._error(message)
+        self.lines = []
+
+    def _error(self, message: str):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(message)
+
+
+class _PublisherBase:
+    """Parameter dan hasil bersama klien async dan sync."""
+
+    def __init__(self, batch_size: int, flush_interval: float, max_in_flight: int, compress: bool,
+                 compress_level: int, max_retries: int, backoff: float, max_backoff: float):
+        if batch_size < 1 or max_in_flight < 1:
+            raise ValueError("batch_size dan max_in_flight minimal 1")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_in_flight = max_in_flight
+        self.compress = compress
+        self._job_options = (compress, compress_level, max_retries, backoff, max_backoff)
+        self.stats = dict.fromkeys(COUNTER_NAMES, 0)
+        self._errors: List[str] = []
+        self._failed = 0
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+
+    def _collect(self, job: _BatchJob):
+        for name, value in job.counters.items():
+            self.stats[name] += value
+        self._failed += job.counters["failed"] + job.counters["rejected"]
+        self._errors = (self._errors + job.errors)[:MAX_ERRORS]
+
+    def _raise_failures(self):
+        if self._failed:
+            error = PublishError(self._failed, self._errors)
+            self._failed, self._errors = 0, []
+            raise error
+
+
+class AsyncPublisher(_PublisherBase):
+    """
+    Publisher asyncio. publish() hanya menambah event ke buffer; batch dikirim saat penuh
+    (batch_size) atau flush_interval detik setelah event pertamanya. Jika max_in_flight batch
+    sedang dikirim, publish() menunggu (backpressure ke pemanggil, memori tetap terbatas).
+    Event yang gagal dilaporkan sebagai PublishError oleh flush() / aclose().
+    """
+
+    def __init__(self, base_url: str, batch_size: int = 500, flush_interval: float = 0.05, max_in_flight: int = 4,
+                 compress: bool = True, compress_level: int = 1, max_retries: int = 10, backoff: float = 0.2,
+                 max_backoff: float = 30.0, timeout: float = 30.0, transport: Optional[httpx.AsyncBaseTransport] = None):
+        super().__init__(batch_size, flush_interval, max_in_flight, compress, compress_level, max_retries, backoff, max_backoff)
+        self._client = httpx.AsyncClient(base_url=base_url.rstrip("/"), timeout=timeout, limits=self._limits(), transport=transport)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._buffer: List[str] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def publish(self, event: Union[Dict[str, Any], Any]):
+        self._buffer.append(encode_event(event))
+        self.stats["events"] += 1
+        if len(self._buffer) >= self.batch_size:
+            await self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._on_timer)
+
+    async def publish_many(self, events: Iterable[Union[Dict[str, Any], Any]]):
+        for event in events:
+            await self.publish(event)
+
+    def _on_timer(self):
+        self._timer = None
+        self._track(asyncio.get_running_loop().create_task(self._dispatch()))
+
+    def _track(self, task: asyncio.Task):
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        await self._slots.acquire()
+        self._track(asyncio.get_running_loop().create_task(self._send(lines)))
+
+    async def _send(self, lines: List[str]):
+        job = _BatchJob(lines, *self._job_options)
+        try:
+            while True:
+                path, body, headers = job.request()
+                try:
+                    outcome = await self._client.post(path, content=body, headers=headers)
+                except httpx.TransportError as e:
+                    outcome = e
+                delay = job.handle(outcome)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            self._slots.release()
+            self._collect(job)
+
+    async def flush(self):
+        """Mengirim sisa buffer dan menunggu semua batch selesai; raise PublishError jika ada yang gagal."""
+        await self._dispatch()
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        self._raise_failures()
+
+    async def aclose(self):
+        try:
+            await self.flush()
+        finally:
+            await self._client.aclose()
+
+    async def __aenter__(self) -> "AsyncPublisher":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+class Publisher(_PublisherBase):
+    """
+    Publisher sync untuk kode tanpa event loop. Batch dikirim oleh pool max_in_flight thread
+    lewat satu httpx.Client (pool keep-alive); thread latar mengirim batch yang sudah
+    flush_interval detik belum penuh. publish() menunggu jika semua thread sedang mengirim.
+    """
+
+    def __init__(self, base_url: str, batch_size: int = 500, flush_interval: float = 0.05, max_in_flight: int = 4,
+                 compress: bool = True, compress_level: int = 1, max_retries: int = 10, backoff: float = 0.2,
+                 max_backoff: float = 30.0, timeout: float = 30.0, transport: Optional[httpx.BaseTransport] = None):
+        super().__init__(batch_size, flush_interval, max_in_flight, compress, compress_level, max_retries, backoff, max_backoff)
+        self._client = httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout, limits=self._limits(), transport=transport)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="publisher")
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._first_at: Optional[float] = None
+        self._futures: set = set()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="publisher-flush", daemon=True)
+        self._flusher.start()
+
+    def publish(self, event: Union[Dict[str, Any], Any]):
+        line = encode_event(event)
+        with self._lock:
+            self._buffer.append(line)
+            self.stats["events"] += 1
+            if len(self._buffer) < self.batch_size:
+                if self._first_at is None:
+                    self._first_at = time.monotonic()
+                return
+            lines = self._take()
+        self._submit(lines)
+
+    def publish_many(self, events: Iterable[Union[Dict[str, Any], Any]]):
+        for event in events:
+            self.publish(event)
+
+    def _take(self) -> List[str]:
+        lines, self._buffer, self._first_at = self._buffer, [], None
+        return lines
+
+    def _submit(self, lines: List[str]):
+        if not lines:
+            return
+        self._slots.acquire()
+        future = self._executor.submit(self._send, lines)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+
+    def _discard(self, future: concurrent.futures.Future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval / 2):
+            with self._lock:
+                due = self._first_at is not None and time.monotonic() - self._first_at >= self.flush_interval
+                lines = self._take() if due else None
+            if lines:
+                self._submit(lines)
+
+    def _send(self, lines: List[str]):
+        job = _BatchJob(lines, *self._job_options)
+        try:
+            while True:
+                path, body, headers = job.request()
+                try:
+                    outcome = self._client.post(path, content=body, headers=headers)
+                except httpx.TransportError as e:
+                    outcome = e
+                delay = job.handle(outcome)
+                if delay is None:
+                    break
+                time.sleep(delay)
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._collect(job)
+
+    def flush(self):
+        """Mengirim sisa buffer dan menunggu semua batch selesai; raise PublishError jika ada yang gagal."""
+        with self._lock:
+            lines = self._take()
+        self._submit(lines)
+        while True:
+            with self._lock:
+                futures = [future for future in self._futures if not future.done()]
+            if not futures:
+                break
+            concurrent.futures.wait(futures)
+        with self._lock:
+            self._raise_failures()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._closed.set()
+            self._flusher.join()
+            self._executor.shutdown()
+            self._client.close()
+
+    def __enter__(self) -> "Publisher":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
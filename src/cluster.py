@@ -0,0 +1,294 @@
+# src/cluster.py
+# Mode cluster: beberapa node aggregator (masing-masing dengan SQLite sendiri) berbagi ruang
+# key dedup lewat consistent-hash ring atas (topic, event_id). Setiap key punya tepat satu
+# node pemilik; event milik node lain diteruskan ke pemiliknya, jadi dedup tetap di satu tempat.
+# Modul ini tidak tahu soal queue/DB: main.py yang memakai ring dan forwarder.
+
+import asyncio
+import base64
+import bisect
+import hashlib
+import hmac
+import json
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+# Header penanda batch hasil forward: penerima selalu memprosesnya sendiri (tidak diteruskan lagi).
+# Nilainya shared secret cluster; header dari client lain (tanpa secret yang cocok) diabaikan.
+FORWARDED_HEADER = "X-Aggregator-Forwarded"
+
+
+class PeerBusyError(Exception):
+    """Node pemilik menolak batch karena queue-nya penuh (429)."""
+
+    def __init__(self, message: str, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PeerUnavailableError(Exception):
+    """Node pemilik tidak bisa dihubungi atau gagal memproses batch."""
+
+
+class PeerRejectedError(Exception):
+    """Node pemilik menolak batch secara permanen (4xx selain 429, mis. 413); mengulang tidak akan berhasil."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring dengan virtual node: setiap node punya `vnodes` titik di ring,
+    key dimiliki titik pertama searah jarum jam. Menambah/mengurangi satu node hanya
+    memindahkan ~1/N key. Semua node harus memakai daftar node dan vnodes yang sama.
+    """
+
+    def __init__(self, nodes: List[str], vnodes: int = 128):
+        if not nodes:
+            raise ValueError("Ring membutuhkan minimal satu node")
+        points = sorted((_hash64(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, topic: str, event_id: str) -> str:
+        index = bisect.bisect(self._hashes, _hash64(f"{topic}\x00{event_id}"))
+        return self._owners[index % len(self._owners)]
+
+
+class PeerForwarder:
+    """
+    Penerus batch ke satu node peer. Event dari request /publish yang datang bersamaan
+    digabung menjadi satu POST (maksimal batch_size event atau setelah flush_seconds),
+    maksimal max_in_flight POST berjalan bersamaan lewat koneksi keep-alive bersama.
+    submit() baru selesai setelah peer meng-ack (202), jadi ack ke publisher tetap berarti
+    event sudah diterima (dan durable, jika ingest log aktif) di node pemiliknya.
+    """
+
+    def __init__(self, url: str, client: httpx.AsyncClient, batch_size: int, flush_seconds: float, max_in_flight: int,
+                 secret: str = ""):
+        self.url = url
+        self._headers = {"Content-Type": "application/json", **({FORWARDED_HEADER: secret} if secret else {})}
+        self._client = client
+        self._batch_size = batch_size
+        self._flush_seconds = flush_seconds
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_events = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._sending: set = set()
+        self.counters = {"requests": 0, "events": 0, "busy": 0, "errors": 0}
+
+    async def submit(self, event_jsons: List[str]):
+        """
+        Meneruskan event (teks JSON); raise PeerRejectedError / PeerBusyError / PeerUnavailableError
+        jika gagal. Lebih dari batch_size event dipecah menjadi beberapa POST.
+        """
+        if len(event_jsons) > self._batch_size:
+            size = self._batch_size
+            results = await asyncio.gather(*(self.submit(event_jsons[start:start + size])
+                                             for start in range(0, len(event_jsons), size)), return_exceptions=True)
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                raise next((e for e in errors if isinstance(e, PeerRejectedError)),
+                           next((e for e in errors if isinstance(e, PeerBusyError)), errors[0]))
+            return
+        loop = asyncio.get_running_loop()
+        if self._pending_events and self._pending_events + len(event_jsons) > self._batch_size:
+            self._flush()
+        future = loop.create_future()
+        self._pending.append((event_jsons, future))
+        self._pending_events += len(event_jsons)
+        if self._pending_events >= self._batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._flush_seconds, self._flush)
+        await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        pending, self._pending, self._pending_events = self._pending, [], 0
+        task = asyncio.get_running_loop().create_task(self._send(pending))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def drain(self):
+        """Mengirim sisa batch dan menunggu semua POST yang sedang berjalan (shutdown)."""
+        self._flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    async def _send(self, pending: List[Tuple[List[str], asyncio.Future]]):
+        body = "[" + ",".join(text for event_jsons, _ in pending for text in event_jsons) + "]"
+        count = sum(len(event_jsons) for event_jsons, _ in pending)
+        error: Optional[Exception] = None
+        async with self._in_flight:
+            try:
+                response = await self._client.post(
+                    self.url + "/publish", content=body.encode("utf-8"),
+                    headers=self._headers,
+                )
+                if response.status_code == 429:
+                    error = PeerBusyError(f"Node {self.url} sibuk (queue penuh)", response.headers.get("retry-after"))
+                elif 400 <= response.status_code < 500:
+                    error = PeerRejectedError(f"Node {self.url} menolak batch forward: HTTP {response.status_code} "
+                                              f"{response.text[:200]}", response.status_code)
+                elif response.status_code != 202:
+                    error = PeerUnavailableError(f"Node {self.url} menolak batch forward: HTTP {response.status_code}")
+            except httpx.HTTPError as e:
+                error = PeerUnavailableError(f"Node {self.url} tidak bisa dihubungi: {e!r}")
+        self.counters["requests"] += 1
+        if error is None:
+            self.counters["events"] += count
+        else:
+            self.counters["busy" if isinstance(error, PeerBusyError) else "errors"] += 1
+        for _, future in pending:
+            if future.done():
+                continue # request asalnya sudah dibatalkan
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+
+class Cluster:
+    """Ring, forwarder per peer, dan klien HTTP bersama (pool keep-alive) untuk satu node."""
+
+    def __init__(self, nodes: List[str], self_url: str, vnodes: int, batch_size: int, flush_seconds: float,
+                 max_in_flight: int, timeout_seconds: float, secret: str = "",
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        nodes = [node.rstrip("/") for node in nodes]
+        self_url = self_url.rstrip("/")
+        if self_url not in nodes:
+            raise ValueError(f"Node ini ({self_url}) tidak ada di daftar node cluster: {', '.join(nodes)}")
+        self.nodes = nodes
+        self.self_url = self_url
+        self.ring = HashRing(nodes, vnodes)
+        self._secret = secret
+        self._peer_headers = {FORWARDED_HEADER: secret} if secret else {}
+        peers = len(nodes) - 1
+        self.client = httpx.AsyncClient(
+            timeout=timeout_seconds, transport=transport,
+            limits=httpx.Limits(max_connections=max(1, peers) * max_in_flight * 2,
+                                max_keepalive_connections=max(1, peers) * max_in_flight),
+        )
+        self.forwarders: Dict[str, PeerForwarder] = {
+            node: PeerForwarder(node, self.client, batch_size, flush_seconds, max_in_flight, secret)
+            for node in nodes if node != self_url
+        }
+        self.counters = {"local_events": 0, "forwarded_events": 0, "received_forwarded_events": 0}
+
+    def is_forwarded(self, header_value: Optional[str]) -> bool:
+        """
+        True jika request berasal dari peer: nilai FORWARDED_HEADER sama dengan secret cluster.
+        Tanpa secret tidak ada header yang dipercaya; batch tetap diproses lewat ring seperti
+        biasa (event yang diteruskan peer memang milik node ini, jadi tidak diteruskan lagi).
+        """
+        if not self._secret or header_value is None:
+            return False
+        return hmac.compare_digest(header_value.encode("utf-8"), self._secret.encode("utf-8"))
+
+    def split(self, events) -> Tuple[list, Dict[str, list]]:
+        """(event milik node ini, {peer: event miliknya}), urutan dalam tiap grup dipertahankan."""
+        local, remote = [], {}
+        owner = self.ring.owner
+        for event in events:
+            node = owner(event.topic, event.event_id)
+            if node == self.self_url:
+                local.append(event)
+            else:
+                remote.setdefault(node, []).append(event)
+        return local, remote
+
+    async def get_json(self, node: str, path: str, params=None) -> dict:
+        """GET ke peer (bagian request fan-out); raise PeerUnavailableError jika gagal."""
+        try:
+            response = await self.client.get(node + path, params=params, headers=self._peer_headers)
+        except httpx.HTTPError as e:
+            raise PeerUnavailableError(f"Node {node} tidak bisa dihubungi: {e!r}")
+        if response.status_code == 400:
+            raise ValueError(response.json().get("detail", "Request tidak valid"))
+        if response.status_code != 200:
+            raise PeerUnavailableError(f"Node {node} gagal menjawab {path}: HTTP {response.status_code}")
+        return response.json()
+
+    async def close(self):
+        await asyncio.gather(*(forwarder.drain() for forwarder in self.forwarders.values()))
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "self": self.self_url,
+            "nodes": self.nodes,
+            **self.counters,
+            "peers": {node: dict(forwarder.counters) for node, forwarder in self.forwarders.items()},
+        }
+
+
+# --- Cursor /events gabungan ---
+def encode_cursor(node_cursors: List[str]) -> str:
+    """Cursor cluster = cursor tiap node ("" = dari awal), opaque base64url."""
+    return base64.urlsafe_b64encode(json.dumps(node_cursors, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str], node_count: int) -> List[str]:
+    """Raise ValueError jika cursor tidak valid (atau dari cluster dengan jumlah node berbeda)."""
+    if not cursor:
+        return [""] * node_count
+    try:
+        node_cursors = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError(f"Cursor tidak valid: {cursor}")
+    if (not isinstance(node_cursors, list) or len(node_cursors) != node_count
+            or not all(isinstance(item, str) for item in node_cursors)):
+        raise ValueError(f"Cursor tidak valid: {cursor}")
+    return node_cursors
+
+
+def merge_pages(pages: List[dict], limit: int, descending: bool) -> Tuple[List[str], List[str]]:
+    """
+    Menggabungkan halaman keyed dari setiap node menjadi satu halaman urut waktu. Halaman node:
+    {"items": [[key, cursor_setelah_event, json_event]], "after": cursor_awal}.
+    Mengembalikan (json event, cursor baru per node). Node yang sedang kosong tetap disimpan
+    posisinya (bukan dianggap habis), jadi event yang masuk belakangan tetap terbaca di halaman berikutnya.
+    """
+    merged = []
+    for node_index, page in enumerate(pages):
+        merged += [(node_index, item) for item in page["items"]]
+    # Sort stabil (juga dengan reverse): seri waktu tetap berurutan node lalu urutan di node itu
+    merged.sort(key=lambda entry: entry[1][0], reverse=descending)
+    taken = merged[:limit]
+    cursors = [page["after"] for page in pages]
+    for node_index, item in taken:
+        cursors[node_index] = item[1]
+    return [item[2] for _, item in taken], cursors
+
+
+def merge_stats(results: List[dict]) -> dict:
+    """Menjumlahkan bagian /stats yang bisa dijumlah (counter, by_topic, by_source) dari semua node."""
+    merged = {"received": 0, "unique_processed": 0, "duplicate_dropped": 0,
+              "rejected_events (since_restart)": 0, "rejected_requests (since_restart)": 0}
+    topics, groups = set(), {"by_topic": {}, "by_source": {}}
+    for result in results:
+        for name in merged:
+            merged[name] += result.get(name, 0)
+        topics.update(result.get("topics_list", []))
+        for group, summary in groups.items():
+            for key, entry in result.get(group, {}).items():
+                item = summary.setdefault(key, {"received": 0, "unique": 0, "duplicate": 0, "last_seen": None})
+                item["received"] += entry["received"]
+                item["unique"] += entry["unique"]
+                item["duplicate"] += entry["duplicate"]
+                if entry.get("last_seen") and (item["last_seen"] is None or entry["last_seen"] > item["last_seen"]):
+                    item["last_seen"] = entry["last_seen"]
+    return {**merged, "topics_list": sorted(topics), **groups}
@@ -0,0 +1,203 @@
+# src/config.py
+# Konfigurasi layanan, dibaca dari environment variable (dengan nilai default).
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """Baca environment variable sebagai int, pakai default jika kosong/tidak valid."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Baca environment variable sebagai float, pakai default jika kosong/tidak valid."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def _env_topic_seconds(name: str) -> dict:
+    """
+    Baca daftar "pola=detik" dipisah koma (mis. "auth.*=3600,payment.prod=86400") sebagai dict.
+    Pola memakai sintaks fnmatch; entri yang tidak valid diabaikan.
+    """
+    result = {}
+    for item in os.environ.get(name, "").split(","):
+        pattern, _, seconds = item.partition("=")
+        pattern = pattern.strip()
+        if not pattern or not seconds.strip():
+            continue
+        try:
+            result[pattern] = max(0, int(seconds))
+        except ValueError:
+            continue
+    return result
+
+
+# --- Database ---
+DB_FOLDER = os.environ.get("AGGREGATOR_DB_FOLDER", "data")
+# Mode synchronous SQLite (FULL = fsync setiap commit, NORMAL = lebih cepat di WAL)
+SQLITE_SYNCHRONOUS = os.environ.get("AGGREGATOR_SQLITE_SYNCHRONOUS", "FULL").upper()
+# Jumlah file partisi SQLite (dibagi berdasarkan hash topic); tiap partisi punya writer sendiri
+STORAGE_PARTITIONS = max(1, _env_int("AGGREGATOR_STORAGE_PARTITIONS", 1))
+
+# --- Kompresi payload ---
+# 1 = payload disimpan terkompresi (deflate, dictionary per topic); baris lama tetap terbaca. 0 = teks JSON.
+# Opt-in: kompresi berjalan di bawah lock writer partisi, jadi menurunkan throughput tulis
+PAYLOAD_COMPRESSION = _env_int("AGGREGATOR_PAYLOAD_COMPRESSION", 0) != 0
+# Payload lebih kecil dari ini (byte) disimpan sebagai teks JSON (kompresi tidak sepadan)
+PAYLOAD_COMPRESS_MIN_BYTES = max(0, _env_int("AGGREGATOR_PAYLOAD_COMPRESS_MIN_BYTES", 128))
+# Level zlib (1 = tercepat, 9 = terkecil)
+PAYLOAD_COMPRESS_LEVEL = min(9, max(1, _env_int("AGGREGATOR_PAYLOAD_COMPRESS_LEVEL", 6)))
+# Jumlah sampel payload per topic sebelum dictionary dilatih; 0 = tanpa dictionary
+PAYLOAD_DICT_SAMPLES = max(0, _env_int("AGGREGATOR_PAYLOAD_DICT_SAMPLES", 200))
+# Ukuran maksimal dictionary per topic (deflate hanya bisa mereferensikan 32 KB terakhir)
+PAYLOAD_DICT_BYTES = min(32 * 1024, max(256, _env_int("AGGREGATOR_PAYLOAD_DICT_BYTES", 16 * 1024)))
+
+# --- Consumer (group commit) ---
+# Maksimal event yang ditulis dalam satu transaksi
+CONSUMER_BATCH_SIZE = max(1, _env_int("AGGREGATOR_BATCH_SIZE", 500))
+# Maksimal waktu (ms) menunggu batch terisi sebelum di-flush ke DB
+CONSUMER_FLUSH_INTERVAL_MS = max(0.0, _env_float("AGGREGATOR_FLUSH_INTERVAL_MS", 10.0))
+# Jumlah consumer/shard; event dibagi berdasarkan hash (topic, event_id)
+CONSUMER_POOL_SIZE = max(1, _env_int("AGGREGATOR_CONSUMER_POOL_SIZE", 4))
+# Jumlah shard consumer yang dipakai: dengan lebih dari satu partisi, satu shard (dan satu thread
+# writer) per partisi, jadi setiap batch hanya menyentuh satu partisi dan lock writer-nya
+CONSUMER_SHARDS = STORAGE_PARTITIONS if STORAGE_PARTITIONS > 1 else CONSUMER_POOL_SIZE
+# Batch yang gagal ditulis (mis. "database is locked") dicoba lagi, jeda naik 2x dari 0,1 detik sampai batas ini
+CONSUMER_RETRY_MAX_SECONDS = max(0.1, _env_float("AGGREGATOR_CONSUMER_RETRY_MAX_SECONDS", 30.0))
+
+# --- Backpressure ---
+# Total kapasitas queue (dibagi rata ke semua shard); 0 = tidak dibatasi
+MAX_QUEUE_SIZE = max(0, _env_int("AGGREGATOR_MAX_QUEUE_SIZE", 100000))
+# Maksimal waktu (ms) /publish menunggu queue punya ruang sebelum membalas 429; 0 = langsung 429
+PUBLISH_WAIT_MS = max(0.0, _env_float("AGGREGATOR_PUBLISH_WAIT_MS", 0.0))
+# Nilai header Retry-After (detik) pada respons 429
+RETRY_AFTER_SECONDS = max(1, _env_int("AGGREGATOR_RETRY_AFTER_SECONDS", 1))
+
+# --- Ingest log (write-ahead) ---
+# 1 = /publish di-ack setelah batch ditulis dan di-fsync ke log segmen lokal, jadi event yang
+# belum diproses consumer tidak hilang saat crash (di-replay saat startup); 0 = hanya di memori
+INGEST_LOG_ENABLED = _env_int("AGGREGATOR_INGEST_LOG", 1) != 0
+# Folder log (satu sub-folder slot-N per proses worker)
+INGEST_LOG_FOLDER = os.environ.get("AGGREGATOR_INGEST_LOG_FOLDER") or os.path.join(DB_FOLDER, "ingest_log")
+# Ukuran maksimal satu file segmen; segmen yang seluruh isinya sudah tersimpan di SQLite dihapus
+INGEST_LOG_SEGMENT_BYTES = max(64 * 1024, _env_int("AGGREGATOR_INGEST_LOG_SEGMENT_BYTES", 64 * 1024 * 1024))
+# 1 = fsync setiap grup append (tahan crash OS/listrik); 0 = hanya write (tahan crash proses saja)
+INGEST_LOG_FSYNC = _env_int("AGGREGATOR_INGEST_LOG_FSYNC", 1) != 0
+
+# --- Dedup front-cache ---
+# Jumlah key (topic, event_id) terbaru yang diingat di LRU; 0 = LRU dimatikan
+DEDUP_LRU_SIZE = max(0, _env_int("AGGREGATOR_DEDUP_LRU_SIZE", 100000))
+# Total memori maksimal untuk semua Bloom filter (byte); 0 = Bloom dimatikan
+DEDUP_BLOOM_MAX_BYTES = max(0, _env_int("AGGREGATOR_DEDUP_BLOOM_MAX_BYTES", 64 * 1024 * 1024))
+# Target false-positive rate Bloom filter
+DEDUP_BLOOM_ERROR_RATE = min(0.5, max(1e-6, _env_float("AGGREGATOR_DEDUP_BLOOM_ERROR_RATE", 0.01)))
+# Kapasitas minimal Bloom filter per topic (juga untuk topic baru setelah startup)
+DEDUP_BLOOM_MIN_CAPACITY = max(1, _env_int("AGGREGATOR_DEDUP_BLOOM_MIN_CAPACITY", 10000))
+
+# --- /publish/stream (NDJSON) ---
+# Panjang maksimal satu baris NDJSON (byte)
+STREAM_MAX_LINE_BYTES = max(1024, _env_int("AGGREGATOR_STREAM_MAX_LINE_BYTES", 1024 * 1024))
+# Maksimal waktu (ms) stream menunggu ruang di queue sebelum berhenti dengan 429
+STREAM_ENQUEUE_WAIT_MS = max(0.0, _env_float("AGGREGATOR_STREAM_ENQUEUE_WAIT_MS", 30000.0))
+# Maksimal detail error per baris yang dikembalikan di respons
+STREAM_MAX_ERRORS = max(0, _env_int("AGGREGATOR_STREAM_MAX_ERRORS", 100))
+
+# --- Format body (gzip / MessagePack) ---
+# Ukuran maksimal body /publish setelah Content-Encoding dibuka (byte); lebih dari ini: 413
+PUBLISH_MAX_DECODED_BYTES = max(1024, _env_int("AGGREGATOR_PUBLISH_MAX_DECODED_BYTES", 64 * 1024 * 1024))
+# Respons /events minimal sebesar ini (byte) di-gzip jika client mengirim Accept-Encoding: gzip; 0 = tidak pernah
+RESPONSE_GZIP_MIN_BYTES = max(0, _env_int("AGGREGATOR_RESPONSE_GZIP_MIN_BYTES", 1024))
+# Level gzip respons /events (1 = tercepat, 9 = terkecil)
+RESPONSE_GZIP_LEVEL = min(9, max(1, _env_int("AGGREGATOR_RESPONSE_GZIP_LEVEL", 1)))
+
+# --- Retensi dedup ---
+# Jendela retensi default (detik, berdasarkan waktu diproses); 0 = event disimpan selamanya
+RETENTION_SECONDS = max(0, _env_int("AGGREGATOR_RETENTION_SECONDS", 0))
+# Override per topic, mis. "auth.*=3600,audit.*=0" (pola fnmatch, override pertama yang cocok dipakai)
+RETENTION_TOPICS = _env_topic_seconds("AGGREGATOR_RETENTION_TOPICS")
+# Jeda antar putaran pembersihan (detik)
+RETENTION_INTERVAL_SECONDS = max(1.0, _env_float("AGGREGATOR_RETENTION_INTERVAL_SECONDS", 60.0))
+# Maksimal baris yang dihapus per transaksi (lock writer hanya ditahan selama satu batch)
+RETENTION_BATCH_SIZE = max(1, _env_int("AGGREGATOR_RETENTION_BATCH_SIZE", 1000))
+# Jeda (ms) antar batch penghapusan agar ingest mendapat giliran lock writer
+RETENTION_PAUSE_MS = max(0.0, _env_float("AGGREGATOR_RETENTION_PAUSE_MS", 5.0))
+# Maksimal halaman kosong yang dikembalikan ke OS per putaran (incremental vacuum); 0 = dimatikan
+RETENTION_VACUUM_PAGES = max(0, _env_int("AGGREGATOR_RETENTION_VACUUM_PAGES", 2000))
+
+# --- Metrics ---
+# Histogram latensi per tahap (/metrics); 0 = dimatikan
+METRICS_ENABLED = _env_int("AGGREGATOR_METRICS_ENABLED", 1) != 0
+
+# --- Multi-worker (uvicorn --workers N) ---
+# Jumlah proses worker yang berbagi folder data; >1 = /stats dan /metrics diagregasi lewat DB.
+# Default mengikuti WEB_CONCURRENCY (dipakai uvicorn/gunicorn) jika di-set.
+WORKERS = max(1, _env_int("AGGREGATOR_WORKERS", _env_int("WEB_CONCURRENCY", 1)))
+# Interval (detik) tiap worker menulis snapshot status (queue, latensi, cache) ke DB
+WORKER_STATUS_INTERVAL_SECONDS = max(0.1, _env_float("AGGREGATOR_WORKER_STATUS_INTERVAL_SECONDS", 1.0))
+
+# --- Subscription push (/subscribe, Server-Sent Events) ---
+# Kapasitas ring buffer per subscriber (event belum terkirim)
+SUBSCRIBE_BUFFER_SIZE = max(1, _env_int("AGGREGATOR_SUBSCRIBE_BUFFER_SIZE", 1000))
+# Kebijakan default jika buffer penuh: drop_oldest (kirim event "gap") atau disconnect
+SUBSCRIBE_SLOW_POLICY = os.environ.get("AGGREGATOR_SUBSCRIBE_SLOW_POLICY", "drop_oldest").lower()
+if SUBSCRIBE_SLOW_POLICY not in ("drop_oldest", "disconnect"):
+    SUBSCRIBE_SLOW_POLICY = "drop_oldest"
+# Maksimal subscriber terhubung per worker (lebih dari ini: 503)
+SUBSCRIBE_MAX_SUBSCRIBERS = max(1, _env_int("AGGREGATOR_SUBSCRIBE_MAX_SUBSCRIBERS", 1000))
+# Interval komentar keep-alive saat tidak ada event (detik)
+SUBSCRIBE_HEARTBEAT_SECONDS = max(0.1, _env_float("AGGREGATOR_SUBSCRIBE_HEARTBEAT_SECONDS", 15.0))
+# Baris per partisi per query saat backfill dari cursor
+SUBSCRIBE_BACKFILL_BATCH = max(1, _env_int("AGGREGATOR_SUBSCRIBE_BACKFILL_BATCH", 500))
+# Mode multi-worker: interval (ms) membaca event baru dari DB selama ada subscriber
+SUBSCRIBE_POLL_MS = max(10.0, _env_float("AGGREGATOR_SUBSCRIBE_POLL_MS", 200.0))
+
+# --- Rollup (/rollups) ---
+# 1 = jumlah event per bucket menit/jam/hari per (topic, source) di-update bersama penulisan event
+ROLLUPS_ENABLED = _env_int("AGGREGATOR_ROLLUPS_ENABLED", 1) != 0
+# Berapa lama bucket tiap tier disimpan (detik); 0 = selamanya
+ROLLUP_MINUTE_RETENTION_SECONDS = max(0, _env_int("AGGREGATOR_ROLLUP_MINUTE_RETENTION_SECONDS", 7 * 86400))
+ROLLUP_HOUR_RETENTION_SECONDS = max(0, _env_int("AGGREGATOR_ROLLUP_HOUR_RETENTION_SECONDS", 90 * 86400))
+ROLLUP_DAY_RETENTION_SECONDS = max(0, _env_int("AGGREGATOR_ROLLUP_DAY_RETENTION_SECONDS", 0))
+# Maksimal bucket (per seri) dalam satu query /rollups
+ROLLUP_MAX_BUCKETS = max(1, _env_int("AGGREGATOR_ROLLUP_MAX_BUCKETS", 10000))
+
+# --- Cluster (beberapa node, masing-masing dengan folder data sendiri) ---
+# Daftar base URL semua node, dipisah koma, sama persis di setiap node; kosong/satu node = cluster mati
+CLUSTER_NODES = [node.strip().rstrip("/") for node in os.environ.get("AGGREGATOR_CLUSTER_NODES", "").split(",") if node.strip()]
+# Base URL node ini (harus ada di CLUSTER_NODES)
+CLUSTER_SELF = os.environ.get("AGGREGATOR_CLUSTER_SELF", "").strip().rstrip("/")
+# Titik virtual per node di hash ring
+CLUSTER_VNODES = max(1, _env_int("AGGREGATOR_CLUSTER_VNODES", 128))
+# Maksimal event per POST forward ke node pemilik, dan berapa lama event ditahan untuk digabung (ms)
+CLUSTER_FORWARD_BATCH_SIZE = max(1, _env_int("AGGREGATOR_CLUSTER_FORWARD_BATCH_SIZE", 500))
+CLUSTER_FORWARD_FLUSH_MS = max(0.0, _env_float("AGGREGATOR_CLUSTER_FORWARD_FLUSH_MS", 2.0))
+# Maksimal POST forward bersamaan per peer
+CLUSTER_FORWARD_MAX_IN_FLIGHT = max(1, _env_int("AGGREGATOR_CLUSTER_FORWARD_MAX_IN_FLIGHT", 4))
+# Timeout request ke peer (detik)
+CLUSTER_TIMEOUT_SECONDS = max(0.1, _env_float("AGGREGATOR_CLUSTER_TIMEOUT_SECONDS", 10.0))
+# Shared secret antar node: nilai header forward. Header tanpa secret yang cocok diabaikan
+CLUSTER_SECRET = os.environ.get("AGGREGATOR_CLUSTER_SECRET", "")
+
+# --- Logging ---
+# Level log aplikasi (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.environ.get("AGGREGATOR_LOG_LEVEL", "INFO").strip().upper()
+if LOG_LEVEL not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+    LOG_LEVEL = "INFO"
+# Log UNIK/DUPLIKAT per event: hanya 1 dari setiap N event yang ditulis; 0 = tidak ada
+EVENT_LOG_SAMPLE_EVERY = max(0, _env_int("AGGREGATOR_EVENT_LOG_SAMPLE_EVERY", 0))
+# Interval ringkasan jumlah UNIK/DUPLIKAT per topic (detik); 0 = tanpa ringkasan
+EVENT_LOG_SUMMARY_SECONDS = max(0.0, _env_float("AGGREGATOR_EVENT_LOG_SUMMARY_SECONDS", 1.0))
+# Maksimal topic (yang paling ramai) per ringkasan; sisanya digabung dalam satu baris
+EVENT_LOG_SUMMARY_MAX_TOPICS = max(1, _env_int("AGGREGATOR_EVENT_LOG_SUMMARY_MAX_TOPICS", 20))
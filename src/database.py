@@ -3,30 +3,206 @@
 
 import sqlite3
 import os
+import glob
+import heapq
 import logging
-from datetime import datetime
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from fnmatch import fnmatchcase
 import json # Untuk deserialize payload
 
 # Import model Event (relatif dari folder src)
-from .models import Event
+from .models import Event, us_to_datetime, datetime_to_us
+from .payload_codec import PayloadCodec, train_dictionary
+from . import config
 
 # Path database di dalam folder 'data'
-DB_FOLDER = "data"
-DB_NAME = os.path.join(DB_FOLDER, "dedup_store.db")
+DB_FOLDER = config.DB_FOLDER
+DB_NAME = os.path.join(DB_FOLDER, "dedup_store.db") # partisi 0 (sama dengan file lama sebelum ada partisi)
+
+# --- Partisi storage ---
+# Event dibagi ke beberapa file SQLite berdasarkan hash topic: satu topic selalu di satu file,
+# jadi dedup (topic, event_id), query per topic, dan retensi per topic tetap di satu partisi.
+def partition_path(index: int) -> str:
+    """Path file partisi. Partisi 0 memakai nama file lama agar DB satu file tetap terbaca."""
+    return DB_NAME if index == 0 else os.path.join(DB_FOLDER, f"dedup_store.p{index}.db")
+
+def partition_for(topic: str, num_partitions: int | None = None) -> int:
+    """Menentukan partisi untuk topic dengan hash stabil (crc32)."""
+    num_partitions = num_partitions or len(_partitions)
+    if num_partitions == 1:
+        return 0
+    return zlib.crc32(topic.encode("utf-8")) % num_partitions
+
+class _Partition:
+    """
+    Satu file partisi dengan koneksi writer long-lived (bukan buka-tutup per event),
+    dijaga lock karena SQLite hanya mengizinkan satu writer per file.
+    Partisi berbeda punya lock sendiri, jadi penulisannya bisa berjalan paralel.
+    """
+
+    def __init__(self, index: int):
+        self.index = index
+        self.path = partition_path(index)
+        self.conn: sqlite3.Connection | None = None
+        self.lock = threading.Lock()
+
+_partitions = [_Partition(index) for index in range(config.STORAGE_PARTITIONS)]
+# State kompresi payload proses ini (dictionary per topic, penghitung rasio/CPU)
+_payload_codec = PayloadCodec()
+
+# Index sekunder processed_events (nama -> kolom)
+EVENT_INDEXES = {
+    "idx_events_processed_at": "processed_at",
+    "idx_events_ts": "ts_us",
+    "idx_events_topic_processed": "topic, processed_at",
+    "idx_events_topic_ts": "topic, ts_us",
+    "idx_events_topic_source_processed": "topic, source, processed_at",
+    "idx_events_topic_source_ts": "topic, source, ts_us",
+}
+# Kolom waktu /events: since/until dan urutan memakai waktu diproses atau timestamp event
+TIME_COLUMNS = {"processed_at": "processed_at", "timestamp": "ts_us"}
+# Index untuk query /events per (ada topic, ada source, time_field). Dipilih eksplisit (INDEXED BY):
+# tanpa statistik ANALYZE planner kadang memilih index dengan prefix lebih pendek.
+# Filter source tanpa topic memakai index waktu saja (source difilter per baris).
+QUERY_INDEXES = {
+    (True, True, "processed_at"): "idx_events_topic_source_processed",
+    (True, True, "timestamp"): "idx_events_topic_source_ts",
+    (True, False, "processed_at"): "idx_events_topic_processed",
+    (True, False, "timestamp"): "idx_events_topic_ts",
+    (False, True, "processed_at"): "idx_events_processed_at",
+    (False, True, "timestamp"): "idx_events_ts",
+    (False, False, "processed_at"): "idx_events_processed_at",
+    (False, False, "timestamp"): "idx_events_ts",
+}
+
+INSERT_EVENT_SQL = '''
+    INSERT OR IGNORE INTO processed_events (rowid, topic, event_id, ts_us, source, payload, payload_fmt, payload_dict)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+# Rowid tertinggi yang pernah dipakai per partisi (lihat _next_rowid)
+SELECT_ROWID_HIGH_SQL = '''
+    SELECT MAX(COALESCE((SELECT CAST(value AS INTEGER) FROM {schema}.meta WHERE key = 'rowid_high'), 0),
+               COALESCE((SELECT MAX(rowid) FROM {schema}.processed_events), 0))
+'''
+UPSERT_ROWID_HIGH_SQL = "INSERT OR REPLACE INTO {schema}.meta (key, value) VALUES ('rowid_high', ?)"
+SELECT_LATEST_DICT_SQL = "SELECT dict_id, data FROM payload_dicts WHERE topic = ? ORDER BY dict_id DESC LIMIT 1"
+# Hapus satu batch baris kedaluwarsa milik satu topic (memakai idx_events_topic_processed)
+DELETE_EXPIRED_SQL = '''
+    DELETE FROM processed_events WHERE rowid IN (
+        SELECT rowid FROM processed_events WHERE topic = ? AND processed_at < ? ORDER BY processed_at LIMIT ?
+    )
+'''
+# Tier rollup (/rollups): nama -> lebar bucket (detik). Semua tier di-update bersama penulisan
+# event, jadi tier jam/hari adalah downsampling tier menit tanpa job agregasi terpisah.
+ROLLUP_TIERS = {"minute": 60, "hour": 3600, "day": 86400}
+UPSERT_ROLLUP_SQL = '''
+    INSERT INTO event_rollups (tier, topic, bucket_us, source, unique_count, duplicate_count, payload_bytes)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(tier, topic, bucket_us, source) DO UPDATE SET
+        unique_count = unique_count + excluded.unique_count,
+        duplicate_count = duplicate_count + excluded.duplicate_count,
+        payload_bytes = payload_bytes + excluded.payload_bytes
+'''
+# Hapus satu batch bucket kedaluwarsa satu tier (memakai idx_rollups_time)
+DELETE_EXPIRED_ROLLUPS_SQL = '''
+    DELETE FROM event_rollups WHERE (tier, topic, bucket_us, source) IN (
+        SELECT tier, topic, bucket_us, source FROM event_rollups WHERE tier = ? AND bucket_us < ? LIMIT ?
+    )
+'''
+UPSERT_EVENT_STATS_SQL = '''
+    INSERT INTO event_stats (topic, source, received, unique_count, duplicate_count, last_seen_us)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(topic, source) DO UPDATE SET
+        received = received + excluded.received,
+        unique_count = unique_count + excluded.unique_count,
+        duplicate_count = duplicate_count + excluded.duplicate_count,
+        last_seen_us = MAX(COALESCE(last_seen_us, 0), excluded.last_seen_us)
+'''
+
+def existing_indexes(cursor) -> set[str]:
+    return {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+def _open_connection(path: str = DB_NAME) -> sqlite3.Connection:
+    """Membuka koneksi SQLite dalam mode WAL untuk jalur tulis batch."""
+    # isolation_level=None: transaksi dikontrol manual (BEGIN/COMMIT)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+def _open_read_connection(partition: int = 0) -> sqlite3.Connection:
+    """Koneksi baca terpisah (WAL mengizinkan pembaca berjalan bersamaan dengan writer)."""
+    conn = sqlite3.connect(_partitions[partition].path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+@contextmanager
+def _writer(partition: int = 0):
+    """Koneksi writer long-lived milik partisi (dibuka saat pertama kali dipakai), selama lock dipegang."""
+    part = _partitions[partition]
+    with part.lock:
+        if part.conn is None:
+            part.conn = _open_connection(part.path)
+        yield part.conn
+
+def close_database():
+    """Menutup koneksi long-lived semua partisi (dipanggil saat shutdown atau reset DB)."""
+    for part in _partitions:
+        with part.lock:
+            if part.conn is not None:
+                part.conn.close()
+                part.conn = None
+    # Dictionary payload milik file yang ditutup (bisa saja dihapus setelah ini)
+    _payload_codec.clear()
+
+def _existing_partition_files() -> dict[int, str]:
+    """File partisi yang ada di disk, termasuk sisa dari jumlah partisi yang lebih besar sebelumnya."""
+    files = {index: partition_path(index) for index in range(len(_partitions))}
+    for path in glob.glob(os.path.join(DB_FOLDER, "dedup_store.p*.db")):
+        suffix = os.path.basename(path)[len("dedup_store.p"):-len(".db")]
+        if suffix.isdigit():
+            files.setdefault(int(suffix), path)
+    return {index: path for index, path in files.items() if os.path.exists(path)}
+
+def delete_database_files():
+    """Menutup koneksi lalu menghapus semua file partisi (beserta -wal/-shm). Untuk tes/benchmark."""
+    close_database()
+    for path in _existing_partition_files().values():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
 
 def setup_database():
-    """Membuat folder data dan tabel SQLite jika belum ada."""
-    try:
-        os.makedirs(DB_FOLDER, exist_ok=True) 
+    """Membuat folder data dan tabel SQLite di setiap partisi, lalu memindahkan topic yang salah partisi."""
+    # Tutup koneksi lama (misal file DB baru saja dihapus oleh tes)
+    close_database()
+    os.makedirs(DB_FOLDER, exist_ok=True)
+    for part in _partitions:
+        _setup_partition_file(part.path)
+    _rebalance_partitions()
+    logging.info(f"Database siap: {len(_partitions)} partisi di '{DB_FOLDER}'.")
 
-        conn = sqlite3.connect(DB_NAME)
+def _setup_partition_file(path: str):
+    """Membuat tabel SQLite di satu file partisi jika belum ada (termasuk migrasi skema lama)."""
+    try:
+        conn = sqlite3.connect(path)
         cursor = conn.cursor()
+        # DB baru: auto_vacuum INCREMENTAL agar halaman bekas retensi bisa dikembalikan ke OS.
+        # Hanya bisa di-set sebelum tabel pertama dibuat; DB lama tetap NONE (halaman kosong
+        # tetap dipakai ulang oleh insert berikutnya, hanya ukuran file tidak menyusut).
+        if not cursor.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
         # Modifikasi tabel: Tambahkan kolom payload (JSON text)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS processed_events (
                 topic TEXT NOT NULL,
                 event_id TEXT NOT NULL,
-                timestamp TEXT, 
+                timestamp TEXT, -- Format lama (ISO8601), baris baru memakai ts_us
                 source TEXT,
                 payload TEXT, -- Simpan payload sebagai JSON string
                 processed_at TEXT DEFAULT CURRENT_TIMESTAMP, 
@@ -39,22 +215,255 @@ def setup_database():
         if 'payload' not in columns:
             logging.info("Menambahkan kolom 'payload' ke database...")
             cursor.execute("ALTER TABLE processed_events ADD COLUMN payload TEXT")
+        # Metadata kecil key-value (status migrasi, dsb.)
+        cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if 'ts_us' not in columns:
+            # Timestamp ringkas: integer mikrodetik sejak epoch (UTC)
+            logging.info("Menambahkan kolom 'ts_us' ke database...")
+            cursor.execute("ALTER TABLE processed_events ADD COLUMN ts_us INTEGER")
+            # Baris lama perlu diisi ts_us-nya di background (lihat backfill_compact_timestamps)
+            if cursor.execute("SELECT 1 FROM processed_events LIMIT 1").fetchone():
+                cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ts_backfill_after', '0')")
+        if 'payload_fmt' not in columns:
+            # Format kolom payload (lihat payload_codec): NULL/0 = teks JSON, 1 = deflate.
+            # Baris lama tetap NULL dan terbaca apa adanya, tanpa migrasi data.
+            logging.info("Menambahkan kolom 'payload_fmt' dan 'payload_dict' ke database...")
+            cursor.execute("ALTER TABLE processed_events ADD COLUMN payload_fmt INTEGER")
+            cursor.execute("ALTER TABLE processed_events ADD COLUMN payload_dict INTEGER")
+        # Dictionary deflate per topic; tidak pernah diubah setelah ditulis (baris lama tetap
+        # mereferensikan id-nya), jadi aman di-cache di memori setiap proses
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS payload_dicts (
+                topic TEXT NOT NULL,
+                dict_id INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                created_us INTEGER,
+                PRIMARY KEY (topic, dict_id)
+            )
+        ''')
+
+        # Index komposit untuk /events: (topic[, source], waktu) per kolom waktu, sehingga query
+        # topic/source + rentang waktu hanya menyentuh baris yang cocok, sudah dalam urutan
+        # keyset (waktu, rowid). Juga dipakai retensi (topic, processed_at) dan migrasi partisi.
+        # idx_events_topic (topic) lama sudah tercakup prefix (topic, processed_at).
+        for name, columns in EVENT_INDEXES.items():
+            if name not in existing_indexes(cursor):
+                logging.info(f"Membuat index {name} ({columns}) di '{path}'...")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON processed_events ({columns})")
+        cursor.execute("DROP INDEX IF EXISTS idx_events_topic")
+
+        # Statistik durable per (topic, source), di-update dalam transaksi yang sama
+        # dengan insert event, sehingga /stats dan startup tidak perlu scan tabel event
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS event_stats (
+                topic TEXT NOT NULL,
+                source TEXT NOT NULL,
+                received INTEGER NOT NULL DEFAULT 0,
+                unique_count INTEGER NOT NULL DEFAULT 0,
+                duplicate_count INTEGER NOT NULL DEFAULT 0,
+                last_seen_us INTEGER, -- waktu event terakhir diproses (mikrodetik sejak epoch, UTC)
+                PRIMARY KEY (topic, source)
+            )
+        ''')
+        # Migrasi satu kali: DB lama punya event tapi belum punya statistik.
+        # Jumlah duplikat lama tidak diketahui, dimulai dari 0.
+        has_stats = cursor.execute("SELECT 1 FROM event_stats LIMIT 1").fetchone()
+        has_events = cursor.execute("SELECT 1 FROM processed_events LIMIT 1").fetchone()
+        if has_events and not has_stats:
+            logging.info("Mengisi tabel event_stats dari event yang sudah ada (migrasi satu kali)...")
+            cursor.execute('''
+                INSERT INTO event_stats (topic, source, received, unique_count, duplicate_count)
+                SELECT topic, COALESCE(source, ''), COUNT(*), COUNT(*), 0
+                FROM processed_events GROUP BY topic, COALESCE(source, '')
+            ''')
+        # Rollup per bucket waktu diproses per (topic, source), satu baris per tier
+        # (lihat ROLLUP_TIERS). PRIMARY KEY melayani query per topic + rentang waktu,
+        # idx_rollups_time query rentang waktu tanpa topic.
+        has_rollups = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'event_rollups'"
+        ).fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS event_rollups (
+                tier INTEGER NOT NULL, -- lebar bucket (detik)
+                topic TEXT NOT NULL,
+                bucket_us INTEGER NOT NULL, -- awal bucket (mikrodetik sejak epoch, UTC)
+                source TEXT NOT NULL,
+                unique_count INTEGER NOT NULL DEFAULT 0,
+                duplicate_count INTEGER NOT NULL DEFAULT 0,
+                payload_bytes INTEGER NOT NULL DEFAULT 0, -- ukuran JSON payload event unik
+                PRIMARY KEY (tier, topic, bucket_us, source)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_rollups_time ON event_rollups (tier, bucket_us)")
+        if has_events and not has_rollups:
+            # Migrasi satu kali dari event yang ada (waktu diproses). Duplikat lama tidak
+            # diketahui (0); payload_bytes = ukuran tersimpan (bisa terkompresi).
+            logging.info("Mengisi tabel event_rollups dari event yang sudah ada (migrasi satu kali)...")
+            for width in ROLLUP_TIERS.values():
+                cursor.execute('''
+                    INSERT INTO event_rollups (tier, topic, bucket_us, source, unique_count, duplicate_count, payload_bytes)
+                    SELECT ?, topic, CAST(strftime('%s', processed_at) AS INTEGER) / ? * ? * 1000000 AS bucket,
+                           COALESCE(source, '') AS src, COUNT(*), 0, COALESCE(SUM(LENGTH(CAST(payload AS BLOB))), 0)
+                    FROM processed_events WHERE processed_at IS NOT NULL GROUP BY topic, bucket, src
+                ''', (width, width, width))
+        # Tabel topic_counts versi sebelumnya sudah digantikan event_stats
+        cursor.execute("DROP TABLE IF EXISTS topic_counts")
+        if path == DB_NAME:
+            # Snapshot status per proses worker (mode multi-worker), hanya di partisi 0
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS worker_status (
+                    worker_id TEXT PRIMARY KEY,
+                    pid INTEGER,
+                    updated_at REAL NOT NULL, -- time.time() saat snapshot ditulis
+                    snapshot TEXT NOT NULL -- JSON
+                )
+            ''')
 
         conn.commit()
         conn.close()
-        logging.info(f"Database '{DB_NAME}' berhasil disiapkan.")
+        logging.info(f"Database '{path}' berhasil disiapkan.")
     except Exception as e:
-        logging.error(f"Gagal menyiapkan database: {e}", exc_info=True)
+        logging.error(f"Gagal menyiapkan database '{path}': {e}", exc_info=True)
         raise 
 
+def _rebalance_partitions(chunk_size: int = 5000):
+    """
+    Migrasi saat startup (sebelum ingest berjalan): memindahkan topic yang berada di file
+    yang salah ke partisinya, misalnya DB lama satu file saat partisi pertama kali diaktifkan
+    atau saat jumlah partisi berubah. Topic diambil dari event_stats (tanpa scan tabel event).
+
+    Baris dipindah per chunk rowid; setiap chunk (salin + hapus) satu transaksi atomik lintas
+    dua file. Selama migrasi kedua file memakai journal_mode=DELETE, karena transaksi multi-file
+    dalam mode WAL hanya atomik per file. Jika proses terhenti, startup berikutnya melanjutkan.
+    """
+    for source_index, source_path in _existing_partition_files().items():
+        conn = sqlite3.connect(source_path, isolation_level=None)
+        try:
+            has_stats = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'event_stats'"
+            ).fetchone()
+            topics = [row[0] for row in conn.execute("SELECT DISTINCT topic FROM event_stats")] if has_stats else []
+            misplaced = [topic for topic in topics if source_index >= len(_partitions) or partition_for(topic) != source_index]
+            if not misplaced:
+                continue
+            logging.info(f"Memindahkan {len(misplaced)} topic dari '{source_path}' ke partisinya...")
+            conn.execute("PRAGMA journal_mode=DELETE")
+            has_backfill = conn.execute("SELECT 1 FROM meta WHERE key = 'ts_backfill_after'").fetchone()
+            for topic in misplaced:
+                moved = _move_topic(conn, topic, partition_path(partition_for(topic)), chunk_size, bool(has_backfill))
+                logging.info(f"Topic '{topic}': {moved} event dipindah ke partisi {partition_for(topic)}.")
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+        # File sisa partisi lama yang sudah kosong dihapus
+        if source_index >= len(_partitions):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(source_path + suffix):
+                    os.remove(source_path + suffix)
+
+def _move_topic(conn: sqlite3.Connection, topic: str, target_path: str, chunk_size: int, needs_backfill: bool) -> int:
+    """Memindahkan semua baris dan statistik satu topic dari koneksi sumber ke file target."""
+    conn.execute("ATTACH DATABASE ? AS target", (target_path,))
+    try:
+        conn.execute("PRAGMA target.journal_mode=DELETE")
+        # File sisa versi lama bisa belum punya kolom/tabel baru: salin kolom yang ada di keduanya
+        target_columns = {row[1] for row in conn.execute("PRAGMA target.table_info(processed_events)")}
+        columns = ", ".join(
+            row[1] for row in conn.execute("PRAGMA main.table_info(processed_events)") if row[1] in target_columns
+        )
+        has_dicts = conn.execute(
+            "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'payload_dicts'"
+        ).fetchone() is not None
+        has_rollups = conn.execute(
+            "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'event_rollups'"
+        ).fetchone() is not None
+        moved = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Chunk berikutnya dalam urutan (processed_at, rowid) lewat idx_events_topic_processed;
+                # baris di target tetap berurutan waktu proses
+                row = conn.execute('''
+                    SELECT processed_at, rowid FROM (
+                        SELECT processed_at, rowid FROM main.processed_events WHERE topic = ?
+                        ORDER BY processed_at, rowid LIMIT ?
+                    ) ORDER BY processed_at DESC, rowid DESC LIMIT 1
+                ''', (topic, chunk_size)).fetchone()
+                if row is None:
+                    # Semua baris sudah pindah: statistik dipindah terakhir, dalam satu transaksi
+                    conn.execute('''
+                        INSERT INTO target.event_stats (topic, source, received, unique_count, duplicate_count, last_seen_us)
+                        SELECT topic, source, received, unique_count, duplicate_count, last_seen_us
+                        FROM main.event_stats WHERE topic = ?
+                        ON CONFLICT(topic, source) DO UPDATE SET
+                            received = received + excluded.received,
+                            unique_count = unique_count + excluded.unique_count,
+                            duplicate_count = duplicate_count + excluded.duplicate_count,
+                            last_seen_us = MAX(COALESCE(last_seen_us, 0), COALESCE(excluded.last_seen_us, 0))
+                    ''', (topic,))
+                    conn.execute("DELETE FROM main.event_stats WHERE topic = ?", (topic,))
+                    if has_rollups:
+                        conn.execute('''
+                            INSERT INTO target.event_rollups
+                                (tier, topic, bucket_us, source, unique_count, duplicate_count, payload_bytes)
+                            SELECT tier, topic, bucket_us, source, unique_count, duplicate_count, payload_bytes
+                            FROM main.event_rollups WHERE topic = ?
+                            ON CONFLICT(tier, topic, bucket_us, source) DO UPDATE SET
+                                unique_count = unique_count + excluded.unique_count,
+                                duplicate_count = duplicate_count + excluded.duplicate_count,
+                                payload_bytes = payload_bytes + excluded.payload_bytes
+                        ''', (topic,))
+                        conn.execute("DELETE FROM main.event_rollups WHERE topic = ?", (topic,))
+                    if has_dicts:
+                        conn.execute("DELETE FROM main.payload_dicts WHERE topic = ?", (topic,))
+                    conn.execute("COMMIT")
+                    return moved
+                # processed_at NULL (diurutkan paling awal) dipindah per rowid
+                if row[0] is None:
+                    chunk, params = "processed_at IS NULL AND rowid <= ?", (topic, row[1])
+                else:
+                    chunk, params = "(processed_at IS NULL OR (processed_at, rowid) <= (?, ?))", (topic, row[0], row[1])
+                if has_dicts:
+                    # Dictionary ikut sebelum baris yang mereferensikannya
+                    conn.execute(
+                        "INSERT OR IGNORE INTO target.payload_dicts SELECT * FROM main.payload_dicts WHERE topic = ?", (topic,)
+                    )
+                # Rowid baru di target dilanjutkan dari rowid tertinggi target (tidak memakai ulang
+                # rowid yang sudah pernah dibagikan ke subscriber target)
+                rowid_high = _rowid_high(conn, "target")
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO target.processed_events (rowid, {columns})
+                    SELECT ? + ROW_NUMBER() OVER (ORDER BY processed_at, rowid), {columns}
+                    FROM main.processed_events WHERE topic = ? AND {chunk} ORDER BY processed_at, rowid
+                ''', (rowid_high,) + params)
+                _save_rowid_high(conn, _rowid_high(conn, "target"), "target")
+                # Rowid tertinggi sumber dicatat sebelum baris dihapus agar tidak dipakai ulang di sana
+                _save_rowid_high(conn, _rowid_high(conn, "main"), "main")
+                moved += conn.execute(
+                    f"DELETE FROM main.processed_events WHERE topic = ? AND {chunk}", params
+                ).rowcount
+                if needs_backfill:
+                    conn.execute("INSERT OR IGNORE INTO target.meta (key, value) VALUES ('ts_backfill_after', '0')")
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.execute("PRAGMA target.journal_mode=WAL")
+        conn.execute("DETACH DATABASE target")
+
 def check_and_insert_event(event: Event) -> bool:
     """
     Mencoba memasukkan event ke DB. 
     Mengembalikan True jika unik (berhasil insert), False jika duplikat.
+
+    Jalur lama per-event (buka koneksi + commit per event). Consumer memakai
+    insert_events_batch; fungsi ini dipertahankan untuk kompatibilitas dan benchmark.
     """
     conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
+        conn = sqlite3.connect(partition_path(partition_for(event.topic)))
         cursor = conn.cursor()
         
         # Serialize payload ke JSON string
@@ -80,51 +489,764 @@ def check_and_insert_event(event: Event) -> bool:
         if conn:
             conn.close()
 
-# --- FUNGSI BARU UNTUK MEMBACA DATA SAAT STARTUP ---
-def get_all_processed_events() -> list[Event]:
-    """Mengambil semua event yang sudah diproses dari DB."""
-    events = []
-    conn = None
-    try:
-        # Jika file DB tidak ada, kembalikan list kosong
-        if not os.path.exists(DB_NAME):
-             return []
-             
-        conn = sqlite3.connect(DB_NAME)
-        # Set row_factory agar hasil query bisa diakses seperti dictionary
-        conn.row_factory = sqlite3.Row 
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT topic, event_id, timestamp, source, payload FROM processed_events ORDER BY processed_at ASC")
-        rows = cursor.fetchall()
-        
-        for row in rows:
-            try:
-                # Deserialize payload dari JSON string
-                payload_dict = json.loads(row['payload']) if row['payload'] else {}
-                
-                # Buat ulang objek Event
-                event = Event(
-                    topic=row['topic'],
-                    event_id=row['event_id'],
-                    # Konversi string ISO8601 kembali ke datetime
-                    timestamp=datetime.fromisoformat(row['timestamp']) if row['timestamp'] else datetime.utcnow(), 
-                    source=row['source'],
-                    payload=payload_dict
-                )
-                events.append(event)
-            except Exception as parse_error:
-                 logging.error(f"Gagal mem-parsing event dari DB: ID={row['event_id']}, Error: {parse_error}", exc_info=True)
-                 # Lanjutkan ke baris berikutnya jika satu baris rusak
+def compute_stats_deltas(events: list[Event], results: list[bool],
+                         known_duplicates: list[Event] = ()) -> dict[tuple[str, str], list[int]]:
+    """
+    Menghitung perubahan statistik per (topic, source): [received, unique, duplicate].
+    known_duplicates = duplikat yang sudah dijawab cache (tidak ditulis ke tabel event).
+    """
+    deltas: dict[tuple[str, str], list[int]] = {}
+    for event, is_unique in zip(events, results):
+        delta = deltas.setdefault((event.topic, event.source), [0, 0, 0])
+        delta[0] += 1
+        delta[1 if is_unique else 2] += 1
+    for event in known_duplicates:
+        delta = deltas.setdefault((event.topic, event.source), [0, 0, 0])
+        delta[0] += 1
+        delta[2] += 1
+    return deltas
 
-        logging.info(f"Berhasil memuat {len(events)} event dari database.")
-        return events
+def insert_events_batch(events: list[Event], known_duplicates: list[Event] = (), on_stored=None,
+                        committed: dict = None) -> list[bool]:
+    """
+    Memasukkan sekumpulan event dengan SATU transaksi per partisi (group commit).
+    Mengembalikan list bool sejajar dengan input: True jika unik, False jika duplikat.
+    Duplikat di dalam batch yang sama juga terdeteksi (baris kedua di-IGNORE).
+    Statistik durable (event_stats) ikut di-update dalam transaksi yang sama,
+    termasuk untuk known_duplicates yang tidak perlu ditulis.
+    on_stored(partition, [(event, rowid), ...]) dipanggil untuk event unik setelah COMMIT,
+    masih di bawah lock writer, jadi urutan panggilan per partisi sama dengan urutan rowid.
+    Jika terjadi error, transaksi partisi itu di-rollback dan exception diteruskan
+    (partisi yang sudah commit sebelumnya tetap tersimpan beserta statistiknya).
+    committed (opsional): dict partisi -> hasil, diisi setiap kali satu partisi commit. Jika batch
+    yang sama dikirim ulang dengan dict yang sama setelah error, partisi yang sudah commit
+    dilewati, jadi retry tidak menulis/menghitung ulang event-nya sebagai duplikat.
+    """
+    if not events and not known_duplicates:
+        return []
+    if committed is None:
+        committed = {}
+    if len(_partitions) == 1:
+        if 0 not in committed:
+            committed[0] = _insert_partition_batch(0, events, known_duplicates, on_stored)
+        return committed[0]
+    groups: dict[int, tuple[list[int], list[Event]]] = {}
+    for index, event in enumerate(events):
+        groups.setdefault(partition_for(event.topic), ([], []))[0].append(index)
+    for event in known_duplicates:
+        groups.setdefault(partition_for(event.topic), ([], []))[1].append(event)
+    results = [False] * len(events)
+    for partition, (indexes, duplicates) in groups.items():
+        if partition not in committed:
+            committed[partition] = _insert_partition_batch(partition, [events[index] for index in indexes], duplicates, on_stored)
+        for index, is_unique in zip(indexes, committed[partition]):
+            results[index] = is_unique
+    return results
 
-    except Exception as e:
-        logging.error(f"Gagal membaca event dari database: {e}", exc_info=True)
-        # Jika gagal baca, kembalikan list kosong (agar server tetap bisa start)
-        return [] 
+def _insert_partition_batch(partition: int, events: list[Event], known_duplicates: list[Event],
+                            on_stored=None) -> list[bool]:
+    """Satu transaksi tulis di satu partisi (lihat insert_events_batch)."""
+    with _writer(partition) as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            results = []
+            stored = []
+            payload_bytes: dict[tuple[str, str], int] = {}
+            # Rowid eksplisit, naik terus walaupun baris terbaru pernah dihapus (lihat _next_rowid)
+            rowid_high = start_rowid = _rowid_high(conn)
+            for event in events:
+                payload, payload_fmt, payload_dict = _encode_payload(conn, event.topic, event.payload_json)
+                cursor = conn.execute(INSERT_EVENT_SQL, (
+                    rowid_high + 1, event.topic, event.event_id, event.timestamp_us,
+                    event.source, payload, payload_fmt, payload_dict
+                ))
+                # rowcount 1 = baris baru, 0 = di-IGNORE karena PRIMARY KEY sudah ada
+                results.append(cursor.rowcount == 1)
+                if cursor.rowcount == 1:
+                    rowid_high += 1
+                    key = (event.topic, event.source)
+                    payload_bytes[key] = payload_bytes.get(key, 0) + len(event.payload_json.encode("utf-8"))
+                    if on_stored is not None:
+                        stored.append((event, cursor.lastrowid))
+            now_us = datetime_to_us(datetime.utcnow())
+            deltas = compute_stats_deltas(events, results, known_duplicates)
+            conn.executemany(UPSERT_EVENT_STATS_SQL, [
+                (topic, source, received, unique, duplicate, now_us)
+                for (topic, source), (received, unique, duplicate) in deltas.items()
+            ])
+            if config.ROLLUPS_ENABLED:
+                # Satu upsert per (tier, topic, source) per batch, bukan per event
+                conn.executemany(UPSERT_ROLLUP_SQL, [
+                    (width, topic, now_us // (width * 1_000_000) * width * 1_000_000, source,
+                     unique, duplicate, payload_bytes.get((topic, source), 0))
+                    for width in ROLLUP_TIERS.values()
+                    for (topic, source), (_, unique, duplicate) in deltas.items()
+                ])
+            if rowid_high != start_rowid:
+                _save_rowid_high(conn, rowid_high)
+            conn.execute("COMMIT")
+        except Exception:
+            # Batalkan seluruh batch; caller (consumer) yang mencatat error-nya.
+            # Tidak dikembalikan sebagai "duplikat" agar cache dedup tidak salah mengingat key.
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Dictionary yang baru dilatih di transaksi ini ikut batal
+            _payload_codec.forget({event.topic for event in events})
+            raise
+        if stored:
+            on_stored(partition, stored)
+        return results
+
+def _rowid_high(conn: sqlite3.Connection, schema: str = "main") -> int:
+    """
+    Rowid tertinggi yang pernah dipakai di tabel event (di dalam transaksi tulis). Rowid adalah
+    cursor /subscribe dan seri keyset /events, jadi tidak boleh dipakai ulang. Tanpa AUTOINCREMENT,
+    SQLite memberi baris baru MAX(rowid) + 1, sehingga rowid baris terbaru yang dihapus (retensi,
+    pindah partisi) akan terpakai lagi. Karena itu baris baru ditulis dengan rowid eksplisit di atas
+    nilai ini, dan nilai tertingginya dicatat di meta 'rowid_high' (seperti sqlite_sequence).
+    """
+    return conn.execute(SELECT_ROWID_HIGH_SQL.format(schema=schema)).fetchone()[0]
+
+def _save_rowid_high(conn: sqlite3.Connection, value: int, schema: str = "main"):
+    conn.execute(UPSERT_ROWID_HIGH_SQL.format(schema=schema), (str(value),))
+
+# --- Kompresi payload ---
+def _encode_payload(conn: sqlite3.Connection, topic: str, text: str):
+    """
+    Nilai kolom (payload, payload_fmt, payload_dict) untuk satu baris baru, di dalam transaksi
+    tulis partisi topic. Topic tanpa dictionary mengumpulkan sampel dulu (sementara dikompresi
+    tanpa dictionary); dictionary dilatih dan disimpan saat sampel sudah cukup.
+    """
+    if not config.PAYLOAD_COMPRESSION:
+        return text, None, None
+    if not _payload_codec.has_active(topic):
+        # Pertama kali topic ditulis proses ini (atau setelah rollback): muat dari DB
+        row = conn.execute(SELECT_LATEST_DICT_SQL, (topic,)).fetchone()
+        _payload_codec.set_active(topic, tuple(row) if row else None)
+    dictionary = _payload_codec.active(topic)
+    if dictionary is None and config.PAYLOAD_DICT_SAMPLES and len(text) >= config.PAYLOAD_COMPRESS_MIN_BYTES:
+        samples = _payload_codec.add_sample(
+            topic, text.encode("utf-8"), config.PAYLOAD_DICT_SAMPLES, 4 * config.PAYLOAD_DICT_BYTES
+        )
+        if samples:
+            dictionary = _store_payload_dictionary(conn, topic, samples)
+    return _payload_codec.encode(text, config.PAYLOAD_COMPRESS_LEVEL, config.PAYLOAD_COMPRESS_MIN_BYTES, dictionary)
+
+def _store_payload_dictionary(conn: sqlite3.Connection, topic: str, samples: list[bytes]) -> tuple[int, bytes]:
+    """Melatih dan menyimpan dictionary topic; jika worker lain sudah lebih dulu, dictionary itu yang dipakai."""
+    row = conn.execute(SELECT_LATEST_DICT_SQL, (topic,)).fetchone()
+    if row is not None:
+        dictionary = (row[0], row[1])
+    else:
+        dictionary = (1, train_dictionary(samples, config.PAYLOAD_DICT_BYTES))
+        conn.execute(
+            "INSERT INTO payload_dicts (topic, dict_id, data, created_us) VALUES (?, ?, ?, ?)",
+            (topic, dictionary[0], dictionary[1], datetime_to_us(datetime.utcnow())),
+        )
+        logging.info(f"Dictionary payload topic '{topic}' dilatih dari {len(samples)} sampel ({len(dictionary[1])} byte).")
+    _payload_codec.set_active(topic, dictionary)
+    return dictionary
+
+def _load_payload_dictionaries(conn: sqlite3.Connection, rows):
+    """Memuat ke cache dictionary yang direferensikan rows dan belum ada di memori."""
+    missing = {
+        (row['topic'], row['payload_dict']) for row in rows
+        if row['payload_dict'] is not None and (row['topic'], row['payload_dict']) not in _payload_codec.dictionaries
+    }
+    for topic, dict_id in missing:
+        found = conn.execute("SELECT data FROM payload_dicts WHERE topic = ? AND dict_id = ?", (topic, dict_id)).fetchone()
+        if found is not None:
+            _payload_codec.dictionaries[(topic, dict_id)] = found[0]
+
+def _payload_text(row: sqlite3.Row) -> str:
+    """Teks JSON payload satu baris (didekompresi jika perlu)."""
+    return _payload_codec.decode(row['topic'], row['payload'], row['payload_fmt'], row['payload_dict'])
+
+def payload_compression_stats() -> dict:
+    """Rasio kompresi dan biaya CPU kompresi/dekompresi payload di proses ini (untuk /stats)."""
+    return {"enabled": config.PAYLOAD_COMPRESSION, **_payload_codec.stats()}
+
+def backfill_compact_timestamps(batch_size: int = 5000) -> int:
+    """
+    Migrasi satu kali (dijalankan di background): isi ts_us untuk baris lama yang
+    hanya punya timestamp ISO8601. Diproses per rentang rowid agar lock writer singkat;
+    progres disimpan di tabel meta sehingga bisa dilanjutkan setelah restart.
+    Mengembalikan jumlah baris yang dimigrasi.
+    """
+    migrated = sum(_backfill_partition(partition, batch_size) for partition in range(len(_partitions)))
+    if migrated:
+        logging.info(f"Migrasi timestamp ringkas selesai: {migrated} baris.")
+    return migrated
+
+def _backfill_partition(partition: int, batch_size: int) -> int:
+    with _writer(partition) as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'ts_backfill_after'").fetchone()
+    if row is None:
+        return 0 # tidak ada yang perlu dimigrasi
+    last_rowid = int(row[0])
+    migrated = 0
+    while True:
+        with _writer(partition) as conn:
+            rows = conn.execute(
+                "SELECT rowid, timestamp FROM processed_events WHERE rowid > ? AND ts_us IS NULL ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size)
+            ).fetchall()
+            conn.execute("BEGIN IMMEDIATE")
+            if not rows:
+                conn.execute("DELETE FROM meta WHERE key = 'ts_backfill_after'")
+                conn.execute("COMMIT")
+                break
+            last_rowid = rows[-1][0]
+            updates = []
+            for rowid, text in rows:
+                if text is None:
+                    continue
+                try:
+                    updates.append((datetime_to_us(datetime.fromisoformat(text)), rowid))
+                except ValueError:
+                    logging.error(f"Timestamp lama tidak valid (rowid={rowid}): {text!r}")
+            conn.executemany("UPDATE processed_events SET ts_us = ?, timestamp = NULL WHERE rowid = ?", updates)
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'ts_backfill_after'", (str(last_rowid),))
+            conn.execute("COMMIT")
+            migrated += len(updates)
+    return migrated
+
+# --- Retensi dedup ---
+def retention_window(topic: str) -> int:
+    """Jendela retensi (detik) untuk topic: override pertama yang cocok, atau default. 0 = selamanya."""
+    for pattern, seconds in config.RETENTION_TOPICS.items():
+        if fnmatchcase(topic, pattern):
+            return seconds
+    return config.RETENTION_SECONDS
+
+def retention_enabled() -> bool:
+    return config.RETENTION_SECONDS > 0 or any(seconds > 0 for seconds in config.RETENTION_TOPICS.values())
+
+def purge_expired_events(now: datetime | None = None, batch_size: int | None = None,
+                         pause_seconds: float | None = None, stop: threading.Event | None = None) -> int:
+    """
+    Menghapus event yang sudah melewati jendela retensi topic-nya (dijalankan di background).
+    Dihapus per batch kecil, satu statement (transaksi) per batch, lock writer dilepas di
+    antaranya sehingga ingest tidak terblokir. event_stats tidak diubah: statistik tetap
+    menghitung seluruh histori. Mengembalikan jumlah baris yang dihapus.
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or config.RETENTION_BATCH_SIZE
+    pause_seconds = config.RETENTION_PAUSE_MS / 1000 if pause_seconds is None else pause_seconds
+    deleted = 0
+    for partition in range(len(_partitions)):
+        with _writer(partition) as conn:
+            topics = [row[0] for row in conn.execute("SELECT DISTINCT topic FROM event_stats")]
+        for topic in topics:
+            window = retention_window(topic)
+            if window <= 0:
+                continue
+            cutoff = _format_processed_at(now - timedelta(seconds=window))
+            while stop is None or not stop.is_set():
+                with _writer(partition) as conn:
+                    # Rowid tertinggi dicatat dulu: baris terbaru bisa ikut terhapus (lihat _rowid_high)
+                    _save_rowid_high(conn, _rowid_high(conn))
+                    count = conn.execute(DELETE_EXPIRED_SQL, (topic, cutoff, batch_size)).rowcount
+                deleted += count
+                if count < batch_size:
+                    break
+                if pause_seconds:
+                    time.sleep(pause_seconds)
+    if deleted:
+        logging.info(f"Retensi: {deleted} event kedaluwarsa dihapus.")
+    return deleted
+
+def rollup_retention() -> dict[int, int]:
+    """Jendela simpan (detik) per lebar tier rollup; 0 = selamanya."""
+    return {
+        ROLLUP_TIERS["minute"]: config.ROLLUP_MINUTE_RETENTION_SECONDS,
+        ROLLUP_TIERS["hour"]: config.ROLLUP_HOUR_RETENTION_SECONDS,
+        ROLLUP_TIERS["day"]: config.ROLLUP_DAY_RETENTION_SECONDS,
+    }
+
+def purge_expired_rollups(now: datetime | None = None, batch_size: int | None = None,
+                          stop: threading.Event | None = None) -> int:
+    """
+    Menghapus bucket rollup yang lebih tua dari jendela tier-nya (tier kasar tetap menyimpan
+    totalnya). Per batch seperti purge_expired_events. Mengembalikan jumlah bucket dihapus.
+    """
+    now_us = datetime_to_us(now or datetime.utcnow())
+    batch_size = batch_size or config.RETENTION_BATCH_SIZE
+    deleted = 0
+    for width, window in rollup_retention().items():
+        if window <= 0:
+            continue
+        for partition in range(len(_partitions)):
+            while stop is None or not stop.is_set():
+                with _writer(partition) as conn:
+                    count = conn.execute(
+                        DELETE_EXPIRED_ROLLUPS_SQL, (width, now_us - window * 1_000_000, batch_size)
+                    ).rowcount
+                deleted += count
+                if count < batch_size:
+                    break
+    if deleted:
+        logging.info(f"Rollup: {deleted} bucket kedaluwarsa dihapus.")
+    return deleted
+
+def incremental_vacuum(max_pages: int, step_pages: int = 256, stop: threading.Event | None = None) -> int:
+    """
+    Mengembalikan halaman kosong ke OS sedikit demi sedikit (hanya jika auto_vacuum=INCREMENTAL).
+    max_pages berlaku untuk total semua partisi. Mengembalikan jumlah halaman yang dibebaskan.
+    """
+    freed = 0
+    for partition in range(len(_partitions)):
+        freed += _vacuum_partition(partition, max_pages - freed, step_pages, stop)
+    return freed
+
+def _vacuum_partition(partition: int, max_pages: int, step_pages: int, stop: threading.Event | None) -> int:
+    with _writer(partition) as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+    freed = 0
+    while freed < max_pages and (stop is None or not stop.is_set()):
+        with _writer(partition) as conn:
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free_pages == 0:
+                break
+            step = min(step_pages, free_pages, max_pages - freed)
+            conn.execute(f"PRAGMA incremental_vacuum({step})").fetchall()
+        freed += step
+    return freed
+
+def get_event_stats() -> dict[tuple[str, str], dict]:
+    """
+    Statistik durable per (topic, source). Ukurannya sebanding jumlah pasangan topic/source, bukan jumlah event.
+    Dibaca lewat koneksi baca (tidak menunggu lock writer), sehingga juga dipakai /stats mode multi-worker.
+    """
+    rows = []
+    for partition in range(len(_partitions)):
+        conn = _open_read_connection(partition)
+        try:
+            rows += conn.execute(
+                "SELECT topic, source, received, unique_count, duplicate_count, last_seen_us FROM event_stats"
+            ).fetchall()
+        finally:
+            conn.close()
+    # Satu topic hanya ada di satu partisi, jadi key (topic, source) tidak bertabrakan
+    return {
+        (topic, source): {"received": received, "unique": unique, "duplicate": duplicate, "last_seen_us": last_seen_us}
+        for topic, source, received, unique, duplicate, last_seen_us in rows
+    }
+
+def get_topic_counts() -> dict[str, int]:
+    """Jumlah event unik per topic, dijumlahkan dari event_stats (tanpa scan tabel event)."""
+    counts: dict[str, int] = {}
+    for partition in range(len(_partitions)):
+        with _writer(partition) as conn:
+            for topic, count in conn.execute("SELECT topic, SUM(unique_count) FROM event_stats GROUP BY topic"):
+                counts[topic] = counts.get(topic, 0) + count
+    return counts
+
+# --- Rollup (/rollups) ---
+# Kolom pengelompokan /rollups selain bucket waktu
+ROLLUP_GROUPS = {"topic_source": ("topic", "source"), "topic": ("topic",), "source": ("source",), "all": ()}
+
+def get_rollups(tier: str, since: datetime, until: datetime, topic: str | None = None,
+                source: str | None = None, group_by: str = "topic_source") -> list[dict]:
+    """
+    Jumlah event per bucket tier dalam [since, until), dikelompokkan per group_by.
+    Hanya membaca baris rollup yang cocok (PRIMARY KEY per topic, idx_rollups_time tanpa topic),
+    jadi biayanya sebanding jumlah bucket, bukan jumlah event. Bucket tanpa event tidak dikembalikan.
+    """
+    width = ROLLUP_TIERS[tier]
+    group = ROLLUP_GROUPS[group_by]
+    query = "SELECT bucket_us, topic, source, unique_count, duplicate_count, payload_bytes FROM event_rollups"
+    if not topic:
+        query += " INDEXED BY idx_rollups_time"
+    query += " WHERE tier = ? AND bucket_us >= ? AND bucket_us < ?"
+    # Bucket yang beririsan dengan since ikut dihitung (awal bucket dibulatkan ke bawah)
+    since_us = datetime_to_us(since) // (width * 1_000_000) * width * 1_000_000
+    params: list = [width, since_us, datetime_to_us(until)]
+    if topic:
+        query += " AND topic = ?"
+        params.append(topic)
+    if source:
+        query += " AND source = ?"
+        params.append(source)
+    totals: dict[tuple, list[int]] = {}
+    for partition in _partitions_for_query(topic):
+        conn = _open_read_connection(partition)
+        try:
+            for row in conn.execute(query, params):
+                key = (row["bucket_us"], *(row[column] for column in group))
+                total = totals.setdefault(key, [0, 0, 0])
+                total[0] += row["unique_count"]
+                total[1] += row["duplicate_count"]
+                total[2] += row["payload_bytes"]
+        finally:
+            conn.close()
+    buckets = []
+    for key in sorted(totals):
+        unique, duplicate, size = totals[key]
+        buckets.append({
+            "bucket": us_to_datetime(key[0]).isoformat(),
+            **dict(zip(group, key[1:])),
+            "received": unique + duplicate,
+            "unique": unique,
+            "duplicate": duplicate,
+            "duplicate_rate": round(duplicate / (unique + duplicate), 4) if unique + duplicate else 0.0,
+            "payload_bytes": size,
+        })
+    return buckets
+
+# --- Status worker (mode multi-worker) ---
+def write_worker_status(worker_id: str, pid: int, snapshot: dict, expire_seconds: float):
+    """Menyimpan snapshot status satu worker, sekaligus menghapus snapshot worker yang sudah lama mati."""
+    now = time.time()
+    with _writer(0) as conn:
+        conn.execute("BEGIN")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO worker_status (worker_id, pid, updated_at, snapshot) VALUES (?, ?, ?, ?)",
+                (worker_id, pid, now, json.dumps(snapshot)),
+            )
+            conn.execute("DELETE FROM worker_status WHERE updated_at < ?", (now - expire_seconds,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def read_worker_statuses(max_age_seconds: float) -> list[dict]:
+    """Snapshot worker yang diperbarui dalam max_age_seconds terakhir (worker yang mati diabaikan)."""
+    conn = _open_read_connection(0)
+    try:
+        rows = conn.execute(
+            "SELECT worker_id, pid, updated_at, snapshot FROM worker_status WHERE updated_at >= ? ORDER BY worker_id",
+            (time.time() - max_age_seconds,),
+        ).fetchall()
     finally:
-        if conn:
+        conn.close()
+    return [
+        {"worker_id": row["worker_id"], "pid": row["pid"], "updated_at": row["updated_at"], **json.loads(row["snapshot"])}
+        for row in rows
+    ]
+
+def delete_worker_status(worker_id: str):
+    """Menghapus snapshot worker (saat shutdown normal)."""
+    with _writer(0) as conn:
+        conn.execute("DELETE FROM worker_status WHERE worker_id = ?", (worker_id,))
+
+def iter_event_keys(chunk_size: int = 10000):
+    """
+    Generator (topic, event_id) semua event, dibaca per chunk dari index PRIMARY KEY
+    (tanpa membaca/mem-parsing payload). Memakai koneksi baca terpisah per partisi.
+    """
+    for part in _partitions:
+        conn = sqlite3.connect(part.path)
+        try:
+            cursor = conn.execute("SELECT topic, event_id FROM processed_events")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+def _row_timestamp(row: sqlite3.Row) -> datetime:
+    """Timestamp dari ts_us (format ringkas) atau kolom ISO8601 lama."""
+    if row['ts_us'] is not None:
+        return us_to_datetime(row['ts_us'])
+    # Konversi string ISO8601 kembali ke datetime
+    return datetime.fromisoformat(row['timestamp']) if row['timestamp'] else datetime.utcnow()
+
+def row_to_event(row: sqlite3.Row) -> Event:
+    """Membuat ulang objek Event dari satu baris processed_events."""
+    return Event(
+        topic=row['topic'],
+        event_id=row['event_id'],
+        timestamp=_row_timestamp(row),
+        source=row['source'],
+        # Deserialize payload dari JSON string (didekompresi dulu jika tersimpan terkompresi)
+        payload=json.loads(_payload_text(row))
+    )
+
+def _format_processed_at(value: datetime) -> str:
+    """Format datetime ke format kolom processed_at (CURRENT_TIMESTAMP SQLite, UTC)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+def _processed_at_to_seconds(value: str) -> int:
+    return int((datetime.strptime(value, "%Y-%m-%d %H:%M:%S") - datetime(1970, 1, 1)).total_seconds())
+
+def _cursor_int(value: str, cursor: str, signed: bool = False) -> int:
+    """
+    Satu angka di cursor: hanya digit ASCII (opsional "-" di depan jika signed). int() sendiri
+    menerima spasi, "_" dan "+", jadi cursor seperti "1_2_3" tidak akan ditolak.
+    """
+    digits = value[1:] if signed and value.startswith("-") else value
+    if not (digits.isascii() and digits.isdigit()):
+        raise ValueError(f"Cursor tidak valid: {cursor}")
+    return int(value)
+
+def _parse_cursor(after: str | None) -> list[tuple[int, int] | None]:
+    """
+    Cursor = posisi terakhir per partisi, dipisah koma: "<waktu>_<rowid>" (waktu = detik
+    processed_at atau mikrodetik timestamp, sesuai time_field), atau "0" jika partisi itu
+    belum terbaca. Raise ValueError jika cursor tidak valid.
+    """
+    if not after:
+        return [None] * len(_partitions)
+    positions: list[tuple[int, int] | None] = []
+    for part in after.split(","):
+        if part == "0":
+            positions.append(None)
+            continue
+        key, separator, rowid = part.rpartition("_")
+        if not separator:
+            raise ValueError(f"Cursor tidak valid: {after}")
+        # Waktu bisa negatif (timestamp sebelum 1970), rowid tidak
+        positions.append((_cursor_int(key, after, signed=True), _cursor_int(rowid, after)))
+    if len(positions) != len(_partitions):
+        raise ValueError(f"Cursor tidak valid: {after}")
+    return positions
+
+def _format_cursor(positions: list[tuple[int, int] | None]) -> str:
+    return ",".join("0" if position is None else f"{position[0]}_{position[1]}" for position in positions)
+
+def _row_position(row: sqlite3.Row, time_field: str) -> tuple[int, int]:
+    """Posisi keyset (waktu, rowid) satu baris, untuk cursor."""
+    if time_field == "timestamp":
+        return row['ts_us'], row['rowid']
+    return _processed_at_to_seconds(row['processed_at']) if row['processed_at'] else 0, row['rowid']
+
+def _time_param(time_field: str, value: datetime):
+    """Batas waktu dalam format kolom: teks processed_at atau mikrodetik ts_us."""
+    return datetime_to_us(value) if time_field == "timestamp" else _format_processed_at(value)
+
+def _build_events_query(topic: str | None, position: tuple[int, int] | None, since: datetime | None,
+                        until: datetime | None, limit: int | None, source: str | None = None,
+                        time_field: str = "processed_at", descending: bool = False) -> tuple[str, list]:
+    """
+    Menyusun query SELECT event (untuk satu partisi) beserta parameternya.
+    Urutan dan keyset memakai (kolom waktu, rowid), jadi dengan filter topic/source query
+    menjadi satu range scan di index komposit (topic[, source], waktu) tanpa sort.
+    """
+    column = TIME_COLUMNS[time_field]
+    conditions: list[str] = []
+    params: list = []
+    if topic:
+        conditions.append("topic = ?")
+        params.append(topic)
+    if source:
+        conditions.append("source = ?")
+        params.append(source)
+    if since:
+        conditions.append(f"{column} >= ?")
+        params.append(_time_param(time_field, since))
+    elif column == "ts_us":
+        conditions.append("ts_us IS NOT NULL") # baris lama yang belum di-backfill
+    if until:
+        conditions.append(f"{column} < ?")
+        params.append(_time_param(time_field, until))
+    if position:
+        key, rowid = position
+        if time_field == "processed_at":
+            key = _format_processed_at(datetime(1970, 1, 1) + timedelta(seconds=key))
+        conditions.append(f"({column}, rowid) {'<' if descending else '>'} (?, ?)")
+        params += [key, rowid]
+    direction = " DESC" if descending else ""
+    index = QUERY_INDEXES[(bool(topic), bool(source), time_field)]
+    query = ("SELECT rowid, topic, event_id, timestamp, ts_us, source, payload, payload_fmt, payload_dict, processed_at "
+             f"FROM processed_events INDEXED BY {index}")
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {column}{direction}, rowid{direction}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, params
+
+def _partitions_for_query(topic: str | None) -> list[int]:
+    """Query dengan topic cukup membaca satu partisi; tanpa topic membaca semuanya."""
+    return [partition_for(topic)] if topic else list(range(len(_partitions)))
+
+def _merge_key(time_field: str):
+    """Key merge lintas partisi: urutan waktu yang sama dengan query, seri diurutkan per partisi lalu rowid."""
+    column = TIME_COLUMNS[time_field]
+
+    def key(item: tuple[int, sqlite3.Row]):
+        partition, row = item
+        return (row[column] or (0 if column == "ts_us" else ""), partition, row['rowid'])
+    return key
+
+def get_events_page(topic: str | None = None, after: str | None = None, limit: int = 1000,
+                    since: datetime | None = None, until: datetime | None = None, source: str | None = None,
+                    time_field: str = "processed_at", descending: bool = False) -> tuple[list[Event], str | None]:
+    """
+    Membaca event langsung dari SQLite dengan keyset pagination.
+    Cursor berisi posisi (waktu, rowid) terakhir per partisi (string opaque). Jika query
+    mencakup beberapa partisi, hasil tiap partisi digabung (merge) sesuai kolom waktu.
+    Mengembalikan (events, next_cursor); next_cursor None jika sudah habis.
+    Raise ValueError jika cursor tidak valid.
+    """
+    page, positions = _read_events_page(topic, after, limit, since, until, source, time_field, descending)
+    events = []
+    last_rows: dict[int, sqlite3.Row] = {}
+    for partition, row in page:
+        last_rows[partition] = row
+        try:
+            events.append(row_to_event(row))
+        except Exception as parse_error:
+            logging.error(f"Gagal mem-parsing event dari DB: ID={row['event_id']}, Error: {parse_error}", exc_info=True)
+            # Lanjutkan ke baris berikutnya jika satu baris rusak
+    for partition, row in last_rows.items():
+        positions[partition] = _row_position(row, time_field)
+    next_cursor = _format_cursor(positions) if len(page) == limit else None
+    return events, next_cursor
+
+def get_events_page_keyed(topic: str | None = None, after: str | None = None, limit: int = 1000,
+                          since: datetime | None = None, until: datetime | None = None, source: str | None = None,
+                          time_field: str = "processed_at", descending: bool = False) -> tuple[list[list], bool]:
+    """
+    Halaman get_events_page untuk digabung lintas node (mode cluster): per event
+    [key urutan waktu, cursor setelah event ini, JSON event], sehingga node penggabung bisa
+    melanjutkan dari event mana pun. Mengembalikan (items, more); more False jika sudah habis.
+    """
+    page, positions = _read_events_page(topic, after, limit, since, until, source, time_field, descending)
+    column = TIME_COLUMNS[time_field]
+    items = []
+    for partition, row in page:
+        positions[partition] = _row_position(row, time_field)
+        items.append([row[column] or (0 if column == "ts_us" else ""), _format_cursor(positions), row_to_ndjson(row)[:-1]])
+    return items, len(page) == limit
+
+def _read_events_page(topic, after, limit, since, until, source, time_field, descending):
+    """Baris satu halaman (partisi, row) yang sudah digabung lintas partisi, dan posisi cursor awal."""
+    positions = _parse_cursor(after)
+    per_partition = []
+    for partition in _partitions_for_query(topic):
+        query, params = _build_events_query(
+            topic, positions[partition], since, until, limit, source, time_field, descending
+        )
+        conn = _open_read_connection(partition)
+        try:
+            rows = conn.execute(query, params).fetchall()
+            _load_payload_dictionaries(conn, rows)
+        finally:
+            conn.close()
+        per_partition.append([(partition, row) for row in rows])
+
+    if len(per_partition) == 1:
+        page = per_partition[0]
+    else:
+        page = list(heapq.merge(*per_partition, key=_merge_key(time_field), reverse=descending))[:limit]
+    return page, positions
+
+def _event_json(topic: str, event_id: str, timestamp: datetime, source: str, payload_text: str) -> str:
+    """
+    Satu event sebagai JSON dengan bentuk yang sama seperti /events.
+    Payload sudah berupa teks JSON, jadi disisipkan apa adanya tanpa parse ulang / validasi pydantic.
+    """
+    return '{"topic":%s,"event_id":%s,"timestamp":%s,"source":%s,"payload":%s}' % (
+        json.dumps(topic), json.dumps(event_id), json.dumps(timestamp.isoformat()), json.dumps(source), payload_text
+    )
+
+def event_to_json(event) -> str:
+    """JSON event yang baru disimpan (Event/CompactEvent), untuk push ke subscriber."""
+    return _event_json(event.topic, event.event_id, us_to_datetime(event.timestamp_us), event.source, event.payload_json)
+
+def row_to_ndjson(row: sqlite3.Row) -> str:
+    """Satu baris processed_events sebagai satu baris JSON (dengan newline); payload didekompresi jika perlu."""
+    return _event_json(row['topic'], row['event_id'], _row_timestamp(row), row['source'], _payload_text(row)) + "\n"
+
+def stream_events_ndjson(topic: str | None = None, after: str | None = None,
+                         since: datetime | None = None, until: datetime | None = None,
+                         source: str | None = None, time_field: str = "processed_at",
+                         descending: bool = False, chunk_size: int = 500):
+    """
+    Generator NDJSON: membaca event dari cursor SQLite per chunk (memori konstan)
+    dan menghasilkan satu string per chunk (beberapa baris sekaligus).
+    Beberapa partisi di-stream bersamaan dan digabung sesuai kolom waktu.
+    Raise ValueError saat dibuat jika cursor tidak valid.
+    """
+    positions = _parse_cursor(after)
+    queries = [
+        (partition, _build_events_query(topic, positions[partition], since, until, None, source, time_field, descending))
+        for partition in _partitions_for_query(topic)
+    ]
+
+    def partition_rows(conn: sqlite3.Connection, partition: int, query: str, params: list):
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            _load_payload_dictionaries(conn, rows)
+            for row in rows:
+                yield partition, row
+
+    def generate():
+        connections = []
+        try:
+            streams = []
+            for partition, (query, params) in queries:
+                conn = _open_read_connection(partition)
+                connections.append(conn)
+                streams.append(partition_rows(conn, partition, query, params))
+            merged = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=_merge_key(time_field), reverse=descending)
+            chunk = []
+            for _, row in merged:
+                chunk.append(row_to_ndjson(row))
+                if len(chunk) >= chunk_size:
+                    yield "".join(chunk)
+                    chunk = []
+            if chunk:
+                yield "".join(chunk)
+        finally:
+            for conn in connections:
+                conn.close()
+
+    return generate()
+
+# --- Subscription (/subscribe) ---
+def parse_subscription_cursor(cursor: str) -> list[int]:
+    """Cursor subscription = rowid terakhir per partisi, dipisah koma. Raise ValueError jika tidak valid."""
+    positions = [_cursor_int(part, cursor) for part in cursor.split(",")]
+    if len(positions) != len(_partitions):
+        raise ValueError(f"Cursor tidak valid: {cursor}")
+    return positions
+
+def format_subscription_cursor(positions: list[int]) -> str:
+    return ",".join(map(str, positions))
+
+def max_rowids() -> list[int]:
+    """Rowid terbesar per partisi: posisi awal subscriber baru (hanya event setelah ini)."""
+    positions = []
+    for partition in range(len(_partitions)):
+        conn = _open_read_connection(partition)
+        try:
+            positions.append(conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM processed_events").fetchone()[0])
+        finally:
+            conn.close()
+    return positions
+
+def read_events_after(positions: list[int], topic: str | None = None, limit: int = 500) -> list[tuple[int, int, str, str]]:
+    """
+    Event dengan rowid setelah posisi per partisi, dalam urutan rowid (urutan commit), maksimal
+    limit per partisi. Dipakai backfill /subscribe dan tail DB mode multi-worker.
+    Mengembalikan (partisi, rowid, topic, JSON event).
+    """
+    items = []
+    for partition in _partitions_for_query(topic):
+        query = ("SELECT rowid, topic, event_id, timestamp, ts_us, source, payload, payload_fmt, payload_dict "
+                 "FROM processed_events WHERE rowid > ?")
+        params: list = [positions[partition]]
+        if topic:
+            query += " AND topic = ?"
+            params.append(topic)
+        conn = _open_read_connection(partition)
+        try:
+            rows = conn.execute(query + " ORDER BY rowid LIMIT ?", params + [limit]).fetchall()
+            _load_payload_dictionaries(conn, rows)
+        finally:
             conn.close()
-# ----------------------------------------------------
\ No newline at end of file
+        items += [(partition, row['rowid'], row['topic'], row_to_ndjson(row)[:-1]) for row in rows]
+    return items
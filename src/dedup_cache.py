@@ -0,0 +1,216 @@
+# src/dedup_cache.py
+# Lapisan dedup di memori sebelum SQLite: LRU key terbaru + Bloom filter per topic.
+# SQLite tetap sumber kebenaran; cache ini hanya menjawab kasus yang pasti.
+
+import hashlib
+import math
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Hasil klasifikasi cache untuk satu event
+DUPLICATE = "duplicate" # pasti duplikat (ada di LRU / muncul lagi di batch yang sama)
+NEW = "new"             # Bloom filter: pasti belum pernah dilihat
+MAYBE = "maybe"         # tidak pasti, harus ditanyakan ke SQLite
+
+
+class BloomFilter:
+    """Bloom filter sederhana berbasis bytearray dengan double hashing (blake2b)."""
+
+    def __init__(self, capacity: int, error_rate: float, max_bytes: Optional[int] = None):
+        capacity = max(1, capacity)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        if max_bytes is not None:
+            num_bits = min(num_bits, max_bytes * 8)
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = max(1, min(16, round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.bits)
+
+
+class DedupCache:
+    """
+    Front-cache dedup. Hanya diakses dari event loop (tidak thread-safe).
+
+    - LRU berisi (topic, event_id) yang sudah dikonfirmasi ada di SQLite:
+      hit = duplikat tanpa menyentuh disk.
+    - Bloom filter per topic: negatif = pasti baru, positif = mungkin (tanya SQLite).
+    Memori dibatasi oleh lru_size (jumlah key) dan bloom_max_bytes (total semua topic).
+    """
+
+    def __init__(self, lru_size: int, bloom_error_rate: float, bloom_max_bytes: int, bloom_min_capacity: int):
+        self.lru_size = lru_size
+        self.bloom_error_rate = bloom_error_rate
+        self.bloom_max_bytes = bloom_max_bytes
+        self.bloom_min_capacity = bloom_min_capacity
+        self.clear()
+
+    def clear(self):
+        """Mengosongkan cache dan counter."""
+        self.recent: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self.blooms: Dict[str, BloomFilter] = {}
+        # Topic yang sudah kehabisan budget memori Bloom (selalu MAYBE)
+        self.unbloomed_topics: set = set()
+        self.bloom_bytes = 0
+        self.warming = False
+        self._pending_keys: List[Tuple[str, str]] = []
+        self.counters = {
+            "lru_hits": 0,
+            "lru_misses": 0,
+            "batch_repeats": 0,
+            "bloom_definitely_new": 0,
+            "bloom_maybe": 0,
+            "bloom_false_positives": 0,
+            "sqlite_lookups": 0,
+        }
+
+    # --- Bloom filter ---
+    def _new_bloom(self, topic: str, capacity: int, max_bytes: Optional[int] = None) -> Optional[BloomFilter]:
+        remaining = self.bloom_max_bytes - self.bloom_bytes
+        if max_bytes is not None:
+            remaining = min(remaining, max_bytes)
+        if remaining < 8:
+            self.unbloomed_topics.add(topic)
+            return None
+        bloom = BloomFilter(capacity, self.bloom_error_rate, max_bytes=remaining)
+        self.blooms[topic] = bloom
+        self.bloom_bytes += bloom.size_bytes
+        return bloom
+
+    def _bloom_for(self, topic: str) -> Optional[BloomFilter]:
+        if self.warming:
+            return None
+        bloom = self.blooms.get(topic)
+        if bloom is None and topic not in self.unbloomed_topics:
+            bloom = self._new_bloom(topic, self.bloom_min_capacity)
+        return bloom
+
+    def begin_warm_up(self):
+        """
+        Menandai Bloom filter sedang dibangun di background. Selama itu Bloom tidak
+        dipakai (semua jadi MAYBE) dan key baru dicatat agar bisa ditambahkan setelahnya.
+        """
+        self.warming = True
+        self._pending_keys = []
+
+    def build_blooms(self, topic_counts: Dict[str, int], keys: Iterable[Tuple[str, str]]) -> Dict[str, BloomFilter]:
+        """
+        Membangun Bloom filter per topic berdasarkan jumlah baris di DB saat startup
+        (kapasitas 2x jumlah baris agar ada ruang tumbuh), lalu mengisinya dengan key lama.
+        Jika total ukuran melebihi budget, ukuran tiap topic diperkecil secara proporsional.
+        Tidak mengubah state cache, jadi aman dijalankan di thread lain.
+        """
+        capacities = {topic: max(count * 2, self.bloom_min_capacity) for topic, count in topic_counts.items()}
+        wanted = {
+            topic: math.ceil(-cap * math.log(self.bloom_error_rate) / (math.log(2) ** 2) / 8)
+            for topic, cap in capacities.items()
+        }
+        total_wanted = sum(wanted.values())
+        scale = min(1.0, self.bloom_max_bytes / total_wanted) if total_wanted else 1.0
+        blooms = {}
+        for topic, capacity in capacities.items():
+            max_bytes = int(wanted[topic] * scale)
+            if max_bytes >= 8:
+                blooms[topic] = BloomFilter(capacity, self.bloom_error_rate, max_bytes=max_bytes)
+        for topic, event_id in keys:
+            bloom = blooms.get(topic)
+            if bloom is not None:
+                bloom.add(event_id)
+        return blooms
+
+    def install_blooms(self, blooms: Dict[str, BloomFilter]):
+        """Memasang hasil build_blooms (dipanggil dari event loop) dan menambahkan key yang masuk selama warm-up."""
+        self.blooms = blooms
+        self.unbloomed_topics = set()
+        self.bloom_bytes = sum(bloom.size_bytes for bloom in blooms.values())
+        self.warming = False
+        for topic, event_id in self._pending_keys:
+            bloom = self._bloom_for(topic)
+            if bloom is not None:
+                bloom.add(event_id)
+        self._pending_keys = []
+
+    # --- LRU ---
+    def _remember(self, key: Tuple[str, str]):
+        if self.lru_size <= 0:
+            return
+        self.recent[key] = None
+        self.recent.move_to_end(key)
+        if len(self.recent) > self.lru_size:
+            self.recent.popitem(last=False)
+
+    # --- API untuk consumer ---
+    def classify(self, events) -> List[str]:
+        """
+        Mengklasifikasikan batch event menjadi DUPLICATE / NEW / MAYBE.
+        Kemunculan kedua dari key yang sama di dalam satu batch pasti duplikat
+        (kemunculan pertama akan ditulis atau sudah ada), jadi tidak perlu ke SQLite.
+        """
+        verdicts = []
+        seen_in_batch = set()
+        for event in events:
+            key = (event.topic, event.event_id)
+            if key in seen_in_batch:
+                self.counters["batch_repeats"] += 1
+                verdicts.append(DUPLICATE)
+                continue
+            seen_in_batch.add(key)
+            if key in self.recent:
+                self.recent.move_to_end(key)
+                self.counters["lru_hits"] += 1
+                verdicts.append(DUPLICATE)
+                continue
+            self.counters["lru_misses"] += 1
+            bloom = self._bloom_for(event.topic)
+            if bloom is not None and event.event_id not in bloom:
+                self.counters["bloom_definitely_new"] += 1
+                verdicts.append(NEW)
+            else:
+                self.counters["bloom_maybe"] += 1
+                verdicts.append(MAYBE)
+        return verdicts
+
+    def record(self, topic: str, event_id: str, verdict: str, is_unique: bool):
+        """Mencatat hasil SQLite untuk event yang tidak dijawab cache."""
+        self.counters["sqlite_lookups"] += 1
+        if verdict == MAYBE and is_unique:
+            # Bloom bilang "mungkin ada" padahal baru
+            self.counters["bloom_false_positives"] += 1
+        if is_unique:
+            if self.warming:
+                self._pending_keys.append((topic, event_id))
+            else:
+                bloom = self._bloom_for(topic)
+                if bloom is not None:
+                    bloom.add(event_id)
+        # Unik maupun duplikat, key ini sekarang pasti ada di SQLite
+        self._remember((topic, event_id))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "lru_entries": len(self.recent),
+            "lru_capacity": self.lru_size,
+            "bloom_topics": len(self.blooms),
+            "bloom_bytes": self.bloom_bytes,
+            "bloom_max_bytes": self.bloom_max_bytes,
+            "bloom_warming": self.warming,
+        }
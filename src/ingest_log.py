@@ -0,0 +1,396 @@
+# src/ingest_log.py
+# Write-ahead log ingest: setiap batch /publish ditulis ke file segmen lokal dan di-fsync
+# (group commit: semua batch yang masuk selama fsync sebelumnya di-fsync bersama) sebelum di-ack.
+# Consumer menandai event selesai setelah tersimpan di SQLite. Checkpoint (nomor record terakhir
+# yang semua record sebelumnya sudah selesai) disimpan ke disk, dan segmen yang seluruh isinya
+# sudah selesai dihapus. Saat startup, record setelah checkpoint di-replay ke queue.
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .models import CompactEvent
+from .workers import InterProcessLock
+
+# Header record: panjang body, crc32 body, nomor urut record, jumlah event
+_HEADER = struct.Struct("<IIQI")
+SEGMENT_PREFIX = "seg-"
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_FILE = "checkpoint"
+
+
+class IngestLogError(Exception):
+    """Batch tidak bisa ditulis/di-fsync ke ingest log (mis. disk penuh)."""
+
+
+class LogRecord:
+    """Satu batch di log; dirujuk oleh semua CompactEvent di batch itu (bukan per event)."""
+    __slots__ = ("log", "seq", "remaining")
+
+    def __init__(self, log: "IngestLog", seq: int, remaining: int):
+        self.log = log
+        self.seq = seq
+        self.remaining = remaining
+
+
+def encode_events(events: List[CompactEvent]) -> bytes:
+    return json.dumps(
+        [[e.topic, e.event_id, e.source, e.timestamp_us, e.payload_json] for e in events],
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def decode_events(body: bytes) -> List[CompactEvent]:
+    return [CompactEvent(*item) for item in json.loads(body)]
+
+
+def _segment_path(folder: str, first_seq: int) -> str:
+    return os.path.join(folder, f"{SEGMENT_PREFIX}{first_seq:020d}{SEGMENT_SUFFIX}")
+
+
+def _read_records(path: str) -> Iterator[Tuple[int, int, int, bytes]]:
+    """(offset, seq, jumlah event, body) per record valid; berhenti di record terpotong/rusak."""
+    with open(path, "rb") as f:
+        offset = 0
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, crc, seq, count = _HEADER.unpack(header)
+            body = f.read(length)
+            if len(body) < length or zlib.crc32(body) != crc:
+                return
+            yield offset, seq, count, body
+            offset += _HEADER.size + length
+
+
+class IngestLog:
+    """
+    Log append-only di satu folder, milik satu proses. State in-memory (antrean tulis,
+    record yang belum selesai, checkpoint) hanya diubah dari event loop; penulisan file
+    dan fsync dijalankan di satu thread khusus, satu grup per putaran.
+    Dengan readonly=True (log yatim milik worker lain yang sudah berhenti) tidak ada append:
+    log hanya di-replay, lalu foldernya dihapus setelah seluruh isinya selesai.
+    """
+
+    def __init__(self, folder: str, segment_bytes: int, fsync: bool = True,
+                 lock: Optional[InterProcessLock] = None, readonly: bool = False):
+        self.folder = folder
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.readonly = readonly
+        self._lock = lock
+        self._segments: List[Tuple[int, str]] = [] # (seq pertama, path), urut
+        self._file = None
+        self._file_size = 0
+        self._buffer: List[bytes] = []
+        self._buffer_last_seq = 0
+        self._next_seq = 1
+        self._durable_seq = 0
+        self._checkpoint = 0
+        self._saved_checkpoint = 0
+        self._pending: Dict[int, LogRecord] = {}
+        self._replay_seqs: List[int] = []
+        self._waiters = deque() # (seq, future), seq naik
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closing = False
+        self._error: Optional[BaseException] = None
+        self.counters = {"appended_records": 0, "appended_events": 0, "appended_bytes": 0,
+                         "fsyncs": 0, "replayed_events": 0, "deleted_segments": 0}
+
+    # --- Startup ---
+    def open(self) -> int:
+        """
+        Membaca checkpoint dan memvalidasi semua segmen (ekor yang terpotong saat crash dibuang),
+        lalu mendaftarkan record setelah checkpoint sebagai belum selesai. Mengembalikan jumlah
+        event yang perlu di-replay (lihat iter_unconsumed).
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        try:
+            with open(os.path.join(self.folder, CHECKPOINT_FILE)) as f:
+                self._checkpoint = self._saved_checkpoint = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            self._checkpoint = self._saved_checkpoint = 0
+        names = sorted(name for name in os.listdir(self.folder)
+                       if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+        last_seq = self._checkpoint
+        replay_events = 0
+        for name in names:
+            path = os.path.join(self.folder, name)
+            valid_end = 0
+            for offset, seq, count, body in _read_records(path):
+                valid_end = offset + _HEADER.size + len(body)
+                last_seq = max(last_seq, seq)
+                if seq > self._checkpoint:
+                    self._pending[seq] = LogRecord(self, seq, count)
+                    self._replay_seqs.append(seq)
+                    replay_events += count
+            if valid_end == 0:
+                os.remove(path) # segmen kosong (mis. baru dibuat saat proses berhenti)
+                continue
+            if valid_end < os.path.getsize(path):
+                logging.warning(f"Ingest log: ekor segmen {name} terpotong/rusak, dibuang dari byte {valid_end}.")
+                with open(path, "r+b") as f:
+                    f.truncate(valid_end)
+            self._segments.append((int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]), path))
+        self._durable_seq = last_seq
+        self._next_seq = last_seq + 1
+        if not self.readonly:
+            # Append selalu ke segmen baru, segmen lama hanya dibaca untuk replay
+            self._segments.append(self._roll_segment(self._next_seq))
+        return replay_events
+
+    def iter_unconsumed(self) -> Iterator[List[CompactEvent]]:
+        """Event per record yang belum selesai saat open(), dibaca ulang dari segmen secara bertahap."""
+        wanted = set(self._replay_seqs)
+        self._replay_seqs = []
+        for _, path in list(self._segments):
+            if not wanted:
+                return
+            if self._file is not None and path == self._file.name:
+                continue
+            for _, seq, _, body in _read_records(path):
+                if seq in wanted:
+                    wanted.discard(seq)
+                    record = self._pending[seq]
+                    events = decode_events(body)
+                    for event in events:
+                        event.log_record = record
+                    self.counters["replayed_events"] += len(events)
+                    yield events
+
+    def start(self):
+        """Menjalankan task flusher (group fsync, checkpoint, truncation) di event loop yang sedang berjalan."""
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-log")
+        self._flusher = asyncio.create_task(self._flush_loop())
+        self._wakeup.set() # checkpoint/truncation awal (mis. log yatim yang sudah kosong)
+
+    # --- Jalur publish ---
+    def append(self, events: List[CompactEvent]) -> LogRecord:
+        """
+        Menambahkan batch ke antrean tulis (sinkron, tanpa I/O) dan menandai setiap event
+        dengan record-nya. Batch baru durable setelah wait_durable(record.seq).
+        """
+        if self._error is not None:
+            raise IngestLogError(f"Ingest log tidak bisa ditulis: {self._error}")
+        seq = self._next_seq
+        self._next_seq += 1
+        body = encode_events(events)
+        self._buffer.append(_HEADER.pack(len(body), zlib.crc32(body), seq, len(events)))
+        self._buffer.append(body)
+        self._buffer_last_seq = seq
+        record = self._pending[seq] = LogRecord(self, seq, len(events))
+        for event in events:
+            event.log_record = record
+        self.counters["appended_records"] += 1
+        self.counters["appended_events"] += len(events)
+        self.counters["appended_bytes"] += _HEADER.size + len(body)
+        self._wakeup.set()
+        return record
+
+    async def wait_durable(self, seq: int):
+        """Menunggu sampai record seq sudah di-fsync (atau raise IngestLogError)."""
+        if seq <= self._durable_seq:
+            return
+        if self._error is not None:
+            raise IngestLogError(f"Ingest log tidak bisa ditulis: {self._error}")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((seq, future))
+        await future
+
+    # --- Jalur consumer ---
+    def _complete(self, seq: int):
+        """Semua event record seq sudah tersimpan: majukan checkpoint sejauh mungkin."""
+        del self._pending[seq]
+        # Semua seq < _next_seq yang tidak ada di _pending sudah selesai
+        while self._checkpoint + 1 < self._next_seq and self._checkpoint + 1 not in self._pending:
+            self._checkpoint += 1
+        self._wakeup.set()
+
+    # --- Flusher ---
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._buffer:
+                chunks, last_seq = self._buffer, self._buffer_last_seq
+                self._buffer = []
+                try:
+                    rolled = await loop.run_in_executor(self._executor, self._write, chunks, last_seq)
+                except Exception as e:
+                    logging.error(f"Gagal menulis ingest log: {e}", exc_info=True)
+                    self._error = e
+                    self._resolve_waiters(error=IngestLogError(f"Ingest log tidak bisa ditulis: {e}"))
+                    return
+                if rolled is not None:
+                    self._segments.append(rolled)
+                self._durable_seq = last_seq
+                self._resolve_waiters()
+            if self._checkpoint != self._saved_checkpoint or self._drained():
+                checkpoint = self._checkpoint
+                try:
+                    deleted = await loop.run_in_executor(
+                        self._executor, self._save_checkpoint, checkpoint, list(self._segments), self._drained()
+                    )
+                except Exception as e:
+                    logging.error(f"Gagal menyimpan checkpoint ingest log: {e}", exc_info=True)
+                    deleted = []
+                else:
+                    self._saved_checkpoint = checkpoint
+                self._segments = [segment for segment in self._segments if segment not in deleted]
+                self.counters["deleted_segments"] += len(deleted)
+                if self.readonly and self._drained():
+                    return
+            if self._closing and not self._buffer:
+                return
+
+    def _drained(self) -> bool:
+        return self.readonly and not self._pending and not self._replay_seqs
+
+    def _resolve_waiters(self, error: Optional[Exception] = None):
+        while self._waiters and (error is not None or self._waiters[0][0] <= self._durable_seq):
+            _, future = self._waiters.popleft()
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+    def _write(self, chunks: List[bytes], last_seq: int) -> Optional[Tuple[int, str]]:
+        """(thread log) Menulis satu grup, satu fsync, lalu ganti segmen jika sudah penuh."""
+        data = b"".join(chunks)
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.counters["fsyncs"] += 1
+        self._file_size += len(data)
+        if self._file_size >= self.segment_bytes:
+            return self._roll_segment(last_seq + 1)
+        return None
+
+    def _roll_segment(self, first_seq: int) -> Tuple[int, str]:
+        if self._file is not None:
+            self._file.close()
+        segment = (first_seq, _segment_path(self.folder, first_seq))
+        self._file = open(segment[1], "ab")
+        self._file_size = 0
+        if self.fsync:
+            _fsync_dir(self.folder)
+        return segment
+
+    def _save_checkpoint(self, checkpoint: int, segments: List[Tuple[int, str]], drained: bool) -> List[Tuple[int, str]]:
+        """
+        (thread log) Menyimpan checkpoint (tulis file sementara + rename), lalu menghapus segmen
+        yang semua record-nya <= checkpoint. Segmen aktif tidak pernah dihapus. Jika checkpoint
+        hilang saat crash, record yang sudah selesai hanya di-replay ulang (dan dibuang oleh dedup).
+        """
+        tmp_path = os.path.join(self.folder, CHECKPOINT_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(str(checkpoint))
+        os.replace(tmp_path, os.path.join(self.folder, CHECKPOINT_FILE))
+        deleted = []
+        active = self._file.name if self._file is not None else None
+        for (first_seq, path), following in zip(segments, segments[1:] + [None]):
+            finished = drained or (following is not None and following[0] - 1 <= checkpoint)
+            if path != active and finished:
+                os.remove(path)
+                deleted.append((first_seq, path))
+        if drained:
+            # Log yatim sudah habis di-replay: folder dihapus dan slot dilepas
+            shutil.rmtree(self.folder, ignore_errors=True)
+            if self._lock is not None:
+                self._lock.release()
+        return deleted
+
+    # --- Shutdown ---
+    async def close(self):
+        """Flush sisa antrean tulis dan checkpoint terakhir, lalu menutup file dan thread log."""
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lock is not None:
+            self._lock.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "segments": len(self._segments),
+            "durable_seq": self._durable_seq,
+            "checkpoint": self._checkpoint,
+            "pending_records": len(self._pending),
+        }
+
+
+def mark_done(events) -> None:
+    """Dipanggil consumer setelah event tersimpan di SQLite (event tanpa record log diabaikan)."""
+    for event in events:
+        record = getattr(event, "log_record", None) # Event pydantic (jalur lama/tes) tidak punya record
+        if record is None:
+            continue
+        record.remaining -= 1
+        if record.remaining == 0:
+            record.log._complete(record.seq)
+
+
+def _fsync_dir(folder: str):
+    """fsync folder agar file segmen baru tetap ada setelah crash (POSIX)."""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def open_worker_logs(root: str, segment_bytes: int, fsync: bool = True) -> Tuple[IngestLog, List[IngestLog]]:
+    """
+    Membuka log milik worker ini dan log yatim yang perlu di-replay.
+    Setiap worker memakai slot pertama (root/slot-N) yang lock-nya masih bebas, jadi setelah
+    restart log yang sama dipakai lagi. Slot lain yang ada di disk tapi lock-nya bebas (mis.
+    jumlah worker dikurangi) diambil alih dalam mode readonly: di-replay lalu dihapus.
+    """
+    os.makedirs(root, exist_ok=True)
+    slot = 0
+    while True:
+        lock = InterProcessLock(os.path.join(root, f"slot-{slot}.lock"))
+        if lock.acquire(blocking=False):
+            break
+        slot += 1
+    own = IngestLog(os.path.join(root, f"slot-{slot}"), segment_bytes, fsync, lock=lock)
+    orphans = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if not name.startswith("slot-") or not os.path.isdir(path) or path == own.folder:
+            continue
+        orphan_lock = InterProcessLock(path + ".lock")
+        if orphan_lock.acquire(blocking=False):
+            orphans.append(IngestLog(path, segment_bytes, fsync, lock=orphan_lock, readonly=True))
+    return own, orphans
@@ -0,0 +1,96 @@
+# src/ingest_stream.py
+# Parsing body NDJSON (opsional gzip) secara bertahap per chunk untuk /publish/stream.
+# Memori dibatasi ukuran chunk + panjang maksimal satu baris, bukan ukuran body.
+
+import zlib
+from typing import AsyncIterator, Optional, Tuple
+
+# Ukuran maksimal output satu langkah dekompresi (melindungi dari "gzip bomb")
+DECOMPRESS_STEP_BYTES = 64 * 1024
+
+
+class UnsupportedEncodingError(Exception):
+    """Content-Encoding body tidak didukung."""
+
+
+class LineTooLongError(Exception):
+    """Satu baris NDJSON melebihi batas panjang."""
+
+
+async def iter_decoded_chunks(chunks: AsyncIterator[bytes], content_encoding: Optional[str]) -> AsyncIterator[bytes]:
+    """
+    Meneruskan chunk body, didekompresi jika Content-Encoding gzip/deflate. Body gzip boleh
+    berisi beberapa member yang disambung (setiap member didekompresi berurutan). Raise
+    zlib.error jika body rusak, terpotong, atau ada data setelah akhir stream deflate.
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        async for chunk in chunks:
+            if chunk:
+                yield chunk
+        return
+    if encoding in ("gzip", "x-gzip"):
+        wbits = 16 + zlib.MAX_WBITS
+    elif encoding == "deflate":
+        wbits = zlib.MAX_WBITS
+    else:
+        raise UnsupportedEncodingError(f"Content-Encoding tidak didukung: {content_encoding}")
+
+    decompressor = zlib.decompressobj(wbits=wbits)
+    received = False
+    async for chunk in chunks:
+        data = chunk
+        received = received or bool(chunk)
+        while data:
+            if decompressor.eof:
+                # Member berikutnya (gzip); deflate hanya punya satu stream
+                if wbits == zlib.MAX_WBITS:
+                    raise zlib.error("data setelah akhir stream deflate")
+                decompressor = zlib.decompressobj(wbits=wbits)
+            out = decompressor.decompress(data, DECOMPRESS_STEP_BYTES)
+            if out:
+                yield out
+            data = decompressor.unused_data if decompressor.eof else decompressor.unconsumed_tail
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+    if received and not decompressor.eof:
+        raise zlib.error("data terpotong")
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Tuple[int, object]]:
+    """
+    Memecah aliran byte menjadi baris. Menghasilkan (nomor_baris, bytes) untuk setiap
+    baris tidak kosong, atau (nomor_baris, LineTooLongError) jika baris terlalu panjang
+    (sisa baris tersebut dibuang sampai newline berikutnya). Nomor baris mulai dari 1.
+    """
+    buffer = bytearray()
+    line_no = 0
+    skipping = False # sedang membuang sisa baris yang terlalu panjang
+    async for chunk in chunks:
+        start = 0
+        while True:
+            newline = chunk.find(b"\n", start)
+            if newline == -1:
+                if not skipping:
+                    buffer += chunk[start:]
+                    if len(buffer) > max_line_bytes:
+                        line_no += 1
+                        yield line_no, LineTooLongError(f"Baris melebihi {max_line_bytes} byte")
+                        buffer.clear()
+                        skipping = True
+                break
+            if skipping:
+                skipping = False
+            else:
+                buffer += chunk[start:newline]
+                line_no += 1
+                if len(buffer) > max_line_bytes:
+                    yield line_no, LineTooLongError(f"Baris melebihi {max_line_bytes} byte")
+                elif buffer.strip():
+                    yield line_no, bytes(buffer)
+                buffer.clear()
+            start = newline + 1
+    if buffer.strip() and not skipping:
+        line_no += 1
+        yield line_no, bytes(buffer)
@@ -0,0 +1,119 @@
+# src/log_pipeline.py
+# Logging aplikasi lewat queue: handler di thread pemanggil (event loop, thread DB) hanya
+# memasukkan record ke queue, lalu satu thread writer (QueueListener) memformat dan menulisnya
+# ke stderr. Log per event di consumer (UNIK/DUPLIKAT) tidak lagi ditulis satu baris per event:
+# EventLogSampler menulis 1 dari setiap N event dan/atau ringkasan periodik per topic.
+# Error dan log startup/shutdown tidak disampling.
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+from typing import Dict, List, Optional
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler bawaan memformat record (asctime, traceback) di thread pemanggil agar record
+    bisa di-pickle ke proses lain. Listener di sini berada di proses yang sama, jadi hanya pesan
+    yang digabung dengan args sekarang (objek di args bisa berubah setelahnya); format lengkap,
+    termasuk traceback exc_info, dikerjakan thread writer.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _Listener(logging.handlers.QueueListener):
+    """QueueListener yang stop()-nya boleh dipanggil lebih dari sekali (manual dan saat proses keluar)."""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(level=logging.INFO, fmt: str = LOG_FORMAT, stream=None,
+                  logger: Optional[logging.Logger] = None) -> Optional[logging.handlers.QueueListener]:
+    """
+    Pengganti logging.basicConfig: memasang handler queue di logger (default: root) dan
+    menjalankan thread writer ke stream (default: stderr). Seperti basicConfig, tidak melakukan
+    apa-apa jika logger sudah punya handler (mis. dari --log-config uvicorn atau pytest).
+    Mengembalikan listener (sudah berjalan) atau None. Sisa record ditulis saat proses keluar.
+    """
+    logger = logger if logger is not None else logging.getLogger()
+    if logger.handlers:
+        return None
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter(fmt))
+    records = queue.SimpleQueue()
+    logger.addHandler(_InProcessQueueHandler(records))
+    logger.setLevel(level)
+    listener = _Listener(records, output)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class EventLogSampler:
+    """
+    Log hasil dedup per event dari consumer:
+      sample_every > 0     event ke-N, 2N, ... (dihitung lintas batch) ditulis dengan pesan
+                           UNIK/DUPLIKAT yang sama seperti sebelumnya
+      summary_seconds > 0  jumlah unik/duplikat per topic dikumpulkan dan ditulis oleh
+                           flush_summary() (dipanggil periodik dari lifespan), satu baris per
+                           topic, maksimal max_topics topic teramai per ringkasan
+    Keduanya 0 = log per event mati. Hanya dipakai dari event loop, jadi tanpa lock.
+    """
+
+    def __init__(self, sample_every: int = 0, summary_seconds: float = 0.0, max_topics: int = 20,
+                 logger: Optional[logging.Logger] = None):
+        self.sample_every = sample_every
+        self.summary_seconds = summary_seconds
+        self.max_topics = max_topics
+        self.logger = logger if logger is not None else logging.getLogger()
+        self._offset = 0 # posisi event berikutnya dalam siklus sampling (0..N-1)
+        self._counts: Dict[str, List[int]] = {}
+        self._since = time.monotonic()
+
+    def record(self, batch: list, results: List[bool]):
+        """Mencatat hasil satu batch consumer (results[i] True = event ke-i unik)."""
+        if self.summary_seconds > 0:
+            counts = self._counts
+            for event, is_unique in zip(batch, results):
+                entry = counts.get(event.topic)
+                if entry is None:
+                    entry = counts[event.topic] = [0, 0]
+                entry[0 if is_unique else 1] += 1
+        every = self.sample_every
+        if every > 0:
+            first = every - 1 - self._offset
+            self._offset = (self._offset + len(batch)) % every
+            if not self.logger.isEnabledFor(logging.INFO):
+                return
+            for index in range(first, len(batch), every):
+                event = batch[index]
+                if results[index]:
+                    self.logger.info(f"Event UNIK diproses: (Topic: {event.topic}, ID: {event.event_id})")
+                else:
+                    self.logger.info(f"Event DUPLIKAT terdeteksi: (Topic: {event.topic}, ID: {event.event_id})")
+
+    def flush_summary(self):
+        """Menulis ringkasan sejak flush sebelumnya; topic tanpa event tidak ditulis."""
+        now = time.monotonic()
+        counts, self._counts = self._counts, {}
+        elapsed, self._since = now - self._since, now
+        if not counts:
+            return
+        ranked = sorted(counts.items(), key=lambda item: (-(item[1][0] + item[1][1]), item[0]))
+        for topic, (unique, duplicate) in ranked[:self.max_topics]:
+            self.logger.info(f"Ringkasan {elapsed:.1f} detik (Topic: {topic}): {unique} UNIK, {duplicate} DUPLIKAT")
+        rest = ranked[self.max_topics:]
+        if rest:
+            unique = sum(entry[0] for _, entry in rest)
+            duplicate = sum(entry[1] for _, entry in rest)
+            self.logger.info(f"Ringkasan {elapsed:.1f} detik ({len(rest)} topic lain): {unique} UNIK, {duplicate} DUPLIKAT")
@@ -1,91 +1,747 @@
 # src/main.py
 # VERSI FINAL (FIXED 3) - Membaca data dari DB saat startup
 
-from fastapi import FastAPI, HTTPException, Request
-from typing import List, Union, Dict, Any
+from fastapi import FastAPI, HTTPException, Request, Query, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
 import asyncio
+import json
+import os
 import time
 import logging
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
-from .models import Event
+from .models import Event, CompactEvent, EVENT_LIST_ADAPTER, parse_events_json, PUBLISH_BODY_SCHEMA, datetime_to_us, us_to_datetime
 # --- PERUBAHAN DI SINI ---
-from .database import setup_database, check_and_insert_event, get_all_processed_events # Impor fungsi baru
+from .database import (
+    setup_database, insert_events_batch, close_database, partition_for,
+    get_topic_counts, iter_event_keys, get_events_page, stream_events_ndjson,
+    backfill_compact_timestamps, get_event_stats, compute_stats_deltas,
+    retention_enabled, purge_expired_events, incremental_vacuum,
+    write_worker_status, read_worker_statuses, delete_worker_status, payload_compression_stats,
+    event_to_json, max_rowids, read_events_after, parse_subscription_cursor, format_subscription_cursor,
+    purge_expired_rollups, get_rollups, ROLLUP_TIERS, ROLLUP_GROUPS, get_events_page_keyed,
+)
+from .dedup_cache import DedupCache, DUPLICATE
+from .ingest_stream import iter_decoded_chunks, iter_ndjson_lines, UnsupportedEncodingError
+from .workers import InterProcessLock, WORKER_ID
+from .ingest_log import IngestLog, IngestLogError, open_worker_logs, mark_done
+from .subscriptions import SubscriptionHub, Subscriber
+from .cluster import (
+    Cluster, PeerBusyError, PeerRejectedError, PeerUnavailableError, FORWARDED_HEADER, encode_cursor, decode_cursor,
+    merge_pages, merge_stats,
+)
+from .log_pipeline import setup_logging, EventLogSampler
+from .wire import (
+    MSGPACK_MEDIA_TYPE, BodyTooLargeError, InvalidBodyError, UnsupportedMediaTypeError, accepts_gzip,
+    accepts_msgpack, decode_body, gzip_bytes, gzip_chunks, is_msgpack, pack_events, parse_events_msgpack,
+)
+from . import config
+from . import metrics
+from . import wire
 # -------------------------
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Record log ditulis thread terpisah (lewat queue), bukan langsung dari event loop
+setup_logging(config.LOG_LEVEL)
+# Log UNIK/DUPLIKAT per event disampling/diringkas, tidak satu baris per event
+event_log = EventLogSampler(
+    config.EVENT_LOG_SAMPLE_EVERY, config.EVENT_LOG_SUMMARY_SECONDS, config.EVENT_LOG_SUMMARY_MAX_TOPICS
+)
 
 # --- State Aplikasi (Global) ---
 # Dikosongkan dulu, akan diisi saat startup
-event_queue = asyncio.Queue()
-unique_events_storage: List[Event] = [] 
+# Satu queue per shard; event dengan (topic, event_id) sama selalu masuk shard yang sama
+# Kapasitas dibatasi (MAX_QUEUE_SIZE dibagi rata per shard) agar burst tidak menghabiskan memori
+SHARD_QUEUE_SIZE = -(-config.MAX_QUEUE_SIZE // config.CONSUMER_SHARDS) # pembulatan ke atas
+# TimedQueue mencatat lama event mengantre (histogram queue_wait)
+shard_queues: List[asyncio.Queue] = [metrics.TimedQueue(maxsize=SHARD_QUEUE_SIZE) for _ in range(config.CONSUMER_SHARDS)]
+# Statistik per shard (jumlah diproses & laju per detik)
+shard_stats: List[Dict[str, Any]] = [
+    {"processed": 0, "rate": 0.0, "window_start": time.time(), "window_count": 0, "high_water": 0}
+    for _ in range(config.CONSUMER_SHARDS)
+]
+RATE_WINDOW_SECONDS = 1.0
+# Salinan di memori dari tabel event_stats: (topic, source) -> received/unique/duplicate/last_seen_us
+event_stats: Dict[tuple, Dict[str, Any]] = {}
+# Front-cache dedup (LRU + Bloom per topic) sebelum SQLite
+dedup_cache = DedupCache(
+    lru_size=config.DEDUP_LRU_SIZE,
+    bloom_error_rate=config.DEDUP_BLOOM_ERROR_RATE,
+    bloom_max_bytes=config.DEDUP_BLOOM_MAX_BYTES,
+    bloom_min_capacity=config.DEDUP_BLOOM_MIN_CAPACITY,
+)
 stats = {
     "start_time": time.time(),
-    "received": 0, # Received akan selalu mulai dari 0 setiap restart
+    "received": 0, # Diisi dari DB (event yang sudah diproses), lalu bertambah setiap /publish
     "unique_processed": 0, # Akan diisi dari DB
-    "duplicate_dropped": 0, # Tidak bisa dihitung ulang, mulai dari 0
-    "topics": set() # Akan diisi dari DB
+    "duplicate_dropped": 0, # Akan diisi dari DB
+    "topics": set(), # Akan diisi dari DB
+    "rejected_events": 0, # Event yang ditolak karena queue penuh (429)
+    "rejected_requests": 0
+}
+# Status pembersihan retensi (background)
+retention_stats = {
+    "runs": 0,
+    "deleted_total": 0,
+    "vacuumed_pages_total": 0,
+    "last_run": None,
+    "last_deleted": 0,
+    "last_duration_ms": None,
 }
+# Ingest log (write-ahead) milik worker ini, dibuka saat startup; None = tidak aktif
+ingest_log: IngestLog = None
+# Log yatim dari worker yang sudah berhenti (di-replay lalu dihapus)
+adopted_logs: List[IngestLog] = []
+# Subscriber /subscribe yang terhubung ke worker ini
+subscriptions = SubscriptionHub()
+# Mode cluster (AGGREGATOR_CLUSTER_NODES): ring + forwarder ke node lain, dibuat saat startup; None = satu node
+cluster: Cluster = None
+# --- Multi-worker ---
+# Setiap proses worker punya queue, consumer, dan dedup cache sendiri; dedup yang menentukan
+# tetap INSERT OR IGNORE di SQLite bersama, jadi event yang sama di dua worker tidak diproses dua kali.
+MULTI_WORKER = config.WORKERS > 1
+# Snapshot worker yang tidak diperbarui selama ini dianggap milik worker yang sudah mati
+WORKER_STATUS_MAX_AGE = 3 * config.WORKER_STATUS_INTERVAL_SECONDS
+# Setup/migrasi skema dijalankan bergantian, bukan bersamaan oleh semua worker
+setup_lock = InterProcessLock(os.path.join(config.DB_FOLDER, ".setup.lock"))
+# Hanya pemegang lock ini yang menjalankan pemeliharaan (migrasi timestamp, retensi)
+maintenance_lock = InterProcessLock(os.path.join(config.DB_FOLDER, ".maintenance.lock"))
+# Mode multi-worker: posisi (rowid per partisi) tail DB untuk subscriber; None = tidak ada subscriber
+subscription_tail = {"positions": None, "lock": None}
 # --- End of State ---
 
 
-# --- Background Consumer Task (Sama seperti versi FIXED 2) ---
-async def consumer_task(queue: asyncio.Queue): 
-    logging.info("Consumer task dimulai...")
+# --- Sharding ---
+def shard_for(topic: str, event_id: str, num_shards: int = config.CONSUMER_SHARDS) -> int:
+    """
+    Menentukan shard untuk (topic, event_id) dengan hash stabil (crc32, bukan hash() bawaan).
+    Dengan lebih dari satu partisi, shard = partisi topic: batch satu consumer hanya menulis ke
+    satu partisi, jadi topic yang ramai tidak menahan topic di partisi lain.
+    """
+    if config.STORAGE_PARTITIONS > 1:
+        return partition_for(topic, config.STORAGE_PARTITIONS) % num_shards
+    return zlib.crc32(f"{topic}\x00{event_id}".encode("utf-8")) % num_shards
+
+def _record_shard_progress(shard_id: int, count: int):
+    """Update jumlah diproses dan laju (events/detik) untuk satu shard."""
+    if shard_id >= len(shard_stats):
+        return
+    shard = shard_stats[shard_id]
+    shard["processed"] += count
+    shard["window_count"] += count
+    now = time.time()
+    elapsed = now - shard["window_start"]
+    if elapsed >= RATE_WINDOW_SECONDS:
+        shard["rate"] = shard["window_count"] / elapsed
+        shard["window_start"] = now
+        shard["window_count"] = 0
+
+# --- Backpressure ---
+class QueueFullError(Exception):
+    """Queue shard tidak punya cukup ruang untuk seluruh batch."""
+
+class BatchTooLargeError(Exception):
+    """Batch melebihi kapasitas total queue shard sehingga tidak akan pernah muat."""
+
+def _try_enqueue_all(events: List[CompactEvent], shard_ids: List[int], needed: Dict[int, int]) -> bool:
+    """
+    Memasukkan SEMUA event ke queue shard-nya, atau tidak sama sekali.
+    Tidak ada await di dalam fungsi ini, jadi cek kapasitas + append ke ingest log + put_nowait
+    atomik di event loop (batch yang ditolak 429 tidak pernah masuk log).
+    """
+    for shard_id, count in needed.items():
+        queue = shard_queues[shard_id]
+        if queue.maxsize > 0 and queue.maxsize - queue.qsize() < count:
+            return False
+    if ingest_log is not None and events:
+        ingest_log.append(events)
+    for event, shard_id in zip(events, shard_ids):
+        queue = shard_queues[shard_id]
+        queue.put_nowait(event)
+        if queue.qsize() > shard_stats[shard_id]["high_water"]:
+            shard_stats[shard_id]["high_water"] = queue.qsize()
+    return True
+
+async def enqueue_events(events: List[Event], wait_seconds: float = None):
+    """
+    Enqueue batch secara all-or-nothing. Jika queue penuh, tunggu maksimal
+    wait_seconds (default PUBLISH_WAIT_MS) lalu raise QueueFullError.
+    Event disimpan di queue dalam bentuk ringkas (CompactEvent), bukan model pydantic.
+    Jika ingest log aktif, baru kembali setelah batch di-fsync ke log (raise IngestLogError jika gagal).
+    """
+    if wait_seconds is None:
+        wait_seconds = config.PUBLISH_WAIT_MS / 1000
+    events = [CompactEvent.from_event(event) for event in events]
+    shard_ids = [shard_for(event.topic, event.event_id) for event in events]
+    needed: Dict[int, int] = {}
+    for shard_id in shard_ids:
+        needed[shard_id] = needed.get(shard_id, 0) + 1
+    for shard_id, count in needed.items():
+        if 0 < shard_queues[shard_id].maxsize < count:
+            raise BatchTooLargeError(f"Batch terlalu besar untuk kapasitas queue shard {shard_id} ({shard_queues[shard_id].maxsize} event)")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait_seconds
+    while not _try_enqueue_all(events, shard_ids, needed):
+        if loop.time() >= deadline:
+            stats["rejected_events"] += len(events)
+            stats["rejected_requests"] += 1
+            raise QueueFullError(f"Queue penuh, {len(events)} event ditolak")
+        await asyncio.sleep(0.005)
+    stats["received"] += len(events)
+    record = events[0].log_record if events else None
+    if record is not None:
+        started = time.perf_counter()
+        await record.log.wait_durable(record.seq)
+        metrics.INGEST_LOG_SYNC.observe(time.perf_counter() - started)
+
+def _is_forwarded(request: Request) -> bool:
+    """Batch hasil forward peer cluster (header dengan secret yang cocok), bukan dari publisher."""
+    return cluster is not None and cluster.is_forwarded(request.headers.get(FORWARDED_HEADER))
+
+async def dispatch_events(events: List[Event], wait_seconds: float = None, forwarded: bool = False):
+    """
+    Mode cluster: event milik node lain (menurut hash ring) diteruskan ke pemiliknya, sisanya
+    di-enqueue lokal, bersamaan. Batch hasil forward selalu diproses lokal (tidak diteruskan lagi).
+    Jika satu bagian gagal, exception-nya diteruskan walaupun bagian lain mungkin sudah diterima;
+    mengirim ulang seluruh batch aman karena dedup.
+    """
+    if cluster is None or forwarded:
+        if cluster is not None:
+            cluster.counters["received_forwarded_events"] += len(events)
+        await enqueue_events(events, wait_seconds)
+        return
+    local, remote = cluster.split(events)
+    jobs = [enqueue_events(local, wait_seconds)] if local else []
+    jobs += [cluster.forwarders[node].submit([event_to_json(event) for event in node_events])
+             for node, node_events in remote.items()]
+    errors = [result for result in await asyncio.gather(*jobs, return_exceptions=True) if isinstance(result, BaseException)]
+    if errors:
+        # Penolakan permanen (413/400) didahulukan: mengulang tidak akan berhasil. Setelah itu
+        # backpressure (429): publisher cukup menunggu Retry-After lalu mengulang
+        raise next((e for e in errors if isinstance(e, (BatchTooLargeError, PeerRejectedError))),
+                   next((e for e in errors if isinstance(e, (QueueFullError, PeerBusyError))), errors[0]))
+    cluster.counters["local_events"] += len(local)
+    cluster.counters["forwarded_events"] += len(events) - len(local)
+
+# --- Statistik ---
+def _apply_stats_deltas(deltas: Dict[tuple, List[int]]):
+    """Menerapkan perubahan statistik (yang sudah di-commit ke DB) ke salinan di memori."""
+    now_us = datetime_to_us(datetime.utcnow())
+    for key, (received, unique, duplicate) in deltas.items():
+        entry = event_stats.setdefault(key, {"received": 0, "unique": 0, "duplicate": 0, "last_seen_us": None})
+        entry["received"] += received
+        entry["unique"] += unique
+        entry["duplicate"] += duplicate
+        entry["last_seen_us"] = now_us
+
+def _summarize_stats(group_index: int, source: Dict[tuple, Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """Merangkum event_stats (atau source, mis. hasil baca DB) per topic (group_index=0) atau per source (group_index=1)."""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for key, entry in (event_stats if source is None else source).items():
+        item = summary.setdefault(key[group_index], {"received": 0, "unique": 0, "duplicate": 0, "last_seen_us": None})
+        item["received"] += entry["received"]
+        item["unique"] += entry["unique"]
+        item["duplicate"] += entry["duplicate"]
+        if entry["last_seen_us"] is not None and (item["last_seen_us"] is None or entry["last_seen_us"] > item["last_seen_us"]):
+            item["last_seen_us"] = entry["last_seen_us"]
+    for item in summary.values():
+        last_seen_us = item.pop("last_seen_us")
+        item["last_seen"] = us_to_datetime(last_seen_us).isoformat() + "Z" if last_seen_us else None
+    return summary
+
+# --- Background Consumer Task (Group Commit) ---
+async def drain_batch(queue: asyncio.Queue, max_items: int, flush_interval: float) -> List[Event]:
+    """
+    Menunggu minimal 1 event, lalu mengambil event berikutnya sampai
+    max_items terkumpul atau flush_interval (detik) habis.
+    """
+    loop = asyncio.get_running_loop()
+    batch = [await queue.get()]
+    deadline = loop.time() + flush_interval
+    while len(batch) < max_items:
+        try:
+            batch.append(queue.get_nowait())
+            continue
+        except asyncio.QueueEmpty:
+            pass
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+async def _store_batch(loop: asyncio.AbstractEventLoop, executor: ThreadPoolExecutor, shard_id: int,
+                       to_store: list, known_duplicates: list, on_stored) -> List[bool]:
+    """
+    Menulis batch ke SQLite. Jika gagal (mis. "database is locked" di mode multi-worker), batch
+    yang sama dicoba lagi dengan jeda eksponensial (maksimal CONSUMER_RETRY_MAX_SECONDS), bukan
+    dibuang: event-nya sudah di-ack dan checkpoint ingest log baru maju setelah tersimpan.
+    Partisi yang sudah commit tidak ditulis ulang. Saat shutdown task ini dibatalkan; event yang
+    belum tersimpan di-replay dari ingest log saat startup berikutnya.
+    """
+    committed: Dict[int, List[bool]] = {}
+    delay = 0.1
     while True:
         try:
-            event = await queue.get() 
-            is_unique = check_and_insert_event(event)
+            return await loop.run_in_executor(
+                executor, insert_events_batch, to_store, known_duplicates, on_stored, committed
+            )
+        except Exception as e:
+            logging.error(f"Gagal menulis batch shard {shard_id} ({len(to_store) + len(known_duplicates)} event), "
+                          f"dicoba lagi dalam {delay:.1f} detik: {e}", exc_info=True)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, config.CONSUMER_RETRY_MAX_SECONDS)
+
+async def consumer_task(queue: asyncio.Queue, shard_id: int = 0, executor: ThreadPoolExecutor = None): 
+    """
+    Consumer untuk satu shard. Penulisan ke SQLite dijalankan di thread pool
+    (executor) agar event loop tetap bebas melayani /publish, /stats, /events.
+    """
+    logging.info(f"Consumer task (shard {shard_id}) dimulai...")
+    loop = asyncio.get_running_loop()
+    flush_interval = config.CONSUMER_FLUSH_INTERVAL_MS / 1000
+    # Mode multi-worker: event worker lain hanya terlihat lewat DB, jadi semua subscriber dilayani tail DB
+    on_stored = None if MULTI_WORKER else _subscription_notifier(loop)
+    while True:
+        batch = []
+        written = False
+        try:
+            batch = await drain_batch(queue, config.CONSUMER_BATCH_SIZE, flush_interval)
+            metrics.CONSUMER_BATCH.observe(len(batch))
+
+            # Duplikat yang pasti (LRU / berulang di batch) tidak perlu ke SQLite
+            started = time.perf_counter()
+            verdicts = dedup_cache.classify(batch)
+            metrics.DEDUP_LOOKUP.observe(time.perf_counter() - started)
+            to_store = [event for event, verdict in zip(batch, verdicts) if verdict != DUPLICATE]
+            known_duplicates = [event for event, verdict in zip(batch, verdicts) if verdict == DUPLICATE]
+            # Duplikat dari cache tetap dikirim agar statistik durable ikut tercatat di transaksi yang sama
+            started = time.perf_counter()
+            stored_results = await _store_batch(loop, executor, shard_id, to_store, known_duplicates, on_stored)
+            written = True
+            metrics.STORAGE_WRITE.observe(time.perf_counter() - started)
+            _apply_stats_deltas(compute_stats_deltas(to_store, stored_results, known_duplicates))
+
+            results = []
+            stored_iter = iter(stored_results)
+            for event, verdict in zip(batch, verdicts):
+                if verdict == DUPLICATE:
+                    results.append(False)
+                else:
+                    is_unique = next(stored_iter)
+                    dedup_cache.record(event.topic, event.event_id, verdict, is_unique)
+                    results.append(is_unique)
             
-            if is_unique:
-                logging.info(f"Event UNIK diproses: (Topic: {event.topic}, ID: {event.event_id})")
-                stats["unique_processed"] += 1
-                stats["topics"].add(event.topic)
-                unique_events_storage.append(event) 
-            else:
-                logging.info(f"Event DUPLIKAT terdeteksi: (Topic: {event.topic}, ID: {event.event_id})")
-                stats["duplicate_dropped"] += 1
+            for event, is_unique in zip(batch, results):
+                if is_unique:
+                    stats["unique_processed"] += 1
+                    stats["topics"].add(event.topic)
+                else:
+                    stats["duplicate_dropped"] += 1
+            event_log.record(batch, results)
             
-            queue.task_done() 
+            # Checkpoint ingest log hanya maju setelah event tersimpan. Batch yang gagal (di bawah)
+            # tidak ditandai, jadi di-replay lagi dari log saat startup berikutnya.
+            mark_done(batch)
+            _record_shard_progress(shard_id, len(batch))
+            for _ in batch:
+                queue.task_done() 
 
         except asyncio.CancelledError:
-            logging.info("Consumer task dihentikan.")
+            logging.info(f"Consumer task (shard {shard_id}) dihentikan.")
             break
         except Exception as e:
             if "is bound to a different event loop" in str(e):
                  logging.error(f"FATAL: Consumer task mendeteksi masalah event loop dengan queue!")
             else:
                  logging.error(f"Error di consumer task: {e}", exc_info=True)
+            # Gagal setelah batch tersimpan: checkpoint ingest log tetap boleh maju.
+            # (Gagal tulis tidak sampai ke sini, karena _store_batch mencoba lagi sampai berhasil.)
+            if written:
+                mark_done(batch)
+            # Tandai batch yang gagal sebagai selesai agar queue.join() tidak menggantung
+            for _ in batch:
+                queue.task_done()
             await asyncio.sleep(1) 
 
+# --- Subscription (/subscribe) ---
+def _subscription_notifier(loop: asyncio.AbstractEventLoop):
+    """
+    Callback on_stored untuk insert_events_batch (dipanggil di thread writer setelah COMMIT):
+    event unik diteruskan ke hub di event loop, berurutan sesuai commit per partisi.
+    Tanpa subscriber, JSON event tidak dibuat sama sekali.
+    """
+    def on_stored(partition: int, stored: list):
+        if not subscriptions.active:
+            return
+        items = [(partition, rowid, event.topic, event_to_json(event)) for event, rowid in stored]
+        loop.call_soon_threadsafe(subscriptions.publish, items)
+    return on_stored
+
+async def _tail_start_positions(loop: asyncio.AbstractEventLoop) -> List[int]:
+    """Mode multi-worker: posisi tail DB saat ini (diisi MAX(rowid) jika tail belum berjalan)."""
+    if subscription_tail["lock"] is None:
+        subscription_tail["lock"] = asyncio.Lock()
+    async with subscription_tail["lock"]:
+        if subscription_tail["positions"] is None:
+            subscription_tail["positions"] = await loop.run_in_executor(None, max_rowids)
+        return list(subscription_tail["positions"])
+
+async def _subscription_tail_step(loop: asyncio.AbstractEventLoop):
+    """Satu putaran tail DB: event baru (dari worker mana pun) sejak putaran sebelumnya ke hub."""
+    if not subscriptions.active:
+        subscription_tail["positions"] = None
+        return
+    positions = await _tail_start_positions(loop)
+    items = await loop.run_in_executor(None, read_events_after, positions, None, config.SUBSCRIBE_BACKFILL_BATCH)
+    if subscription_tail["positions"] is None:
+        return # semua subscriber pergi selama query
+    for partition, rowid, _, _ in items:
+        subscription_tail["positions"][partition] = max(subscription_tail["positions"][partition], rowid)
+    if items:
+        subscriptions.publish(items)
+
+async def _subscription_tail_loop(loop: asyncio.AbstractEventLoop):
+    while True:
+        try:
+            await _subscription_tail_step(loop)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Gagal membaca event baru untuk subscriber: {e}", exc_info=True)
+        await asyncio.sleep(config.SUBSCRIBE_POLL_MS / 1000)
+
+def _sse(data: str, event: str = None, event_id: str = None) -> str:
+    return (f"event: {event}\n" if event else "") + (f"id: {event_id}\n" if event_id else "") + f"data: {data}\n\n"
+
+async def _subscription_stream(subscriber: Subscriber, positions: List[int], limit: int = None):
+    """
+    Stream SSE satu subscriber. Subscriber sudah terdaftar sebelum posisi awal dibaca, jadi
+    event baru tidak ada yang terlewat: backfill dari DB sampai mengejar event terbaru, lalu
+    event live dari buffer; yang rowid-nya tidak melewati posisi terakhir dilewati (sudah terkirim).
+    id tiap event = cursor untuk resume (?after= atau header Last-Event-ID).
+    """
+    loop = asyncio.get_running_loop()
+    sent = 0
+
+    def frame(item) -> str:
+        nonlocal sent
+        positions[item[0]] = item[1]
+        sent += 1
+        subscriptions.counters["delivered"] += 1
+        return _sse(item[3], event_id=format_subscription_cursor(positions))
+
+    try:
+        while limit is None or sent < limit:
+            # Event yang terbuang dari buffer selama query ini ada di DB: baca ulang di putaran berikutnya
+            subscriber.pending_gap = 0
+            items = await loop.run_in_executor(
+                None, read_events_after, list(positions), subscriber.topic, config.SUBSCRIBE_BACKFILL_BATCH
+            )
+            counts: Dict[int, int] = {}
+            for item in items:
+                counts[item[0]] = counts.get(item[0], 0) + 1
+                if item[1] > positions[item[0]] and (limit is None or sent < limit):
+                    yield frame(item)
+            if subscriber.pending_gap == 0 and all(count < config.SUBSCRIBE_BACKFILL_BATCH for count in counts.values()):
+                break
+        subscriber.backfilling = False
+        subscriber.pending_gap = 0
+
+        while limit is None or sent < limit:
+            if not await subscriber.wait(config.SUBSCRIBE_HEARTBEAT_SECONDS):
+                yield ": keep-alive\n\n"
+                continue
+            if subscriber.closed_reason is not None:
+                yield _sse(json.dumps({"reason": subscriber.closed_reason,
+                                       "resume_after": format_subscription_cursor(positions)}), event="error")
+                break
+            if subscriber.pending_gap:
+                # drop_oldest: event di antara resume_after dan event berikutnya terlewat,
+                # bisa diambil ulang dengan subscribe baru ?after=resume_after
+                yield _sse(json.dumps({"dropped": subscriber.pending_gap,
+                                       "resume_after": format_subscription_cursor(positions)}), event="gap")
+                subscriber.pending_gap = 0
+            for item in subscriber.take_all():
+                if item[1] > positions[item[0]]:
+                    yield frame(item)
+                    if limit is not None and sent >= limit:
+                        break
+    finally:
+        subscriptions.unsubscribe(subscriber)
+
+async def _warm_up_dedup_cache(loop: asyncio.AbstractEventLoop, topic_counts: Dict[str, int]):
+    """Membangun Bloom filter dari key lama di thread terpisah, lalu memasangnya di event loop."""
+    try:
+        dedup_cache.begin_warm_up()
+        blooms = await loop.run_in_executor(None, dedup_cache.build_blooms, topic_counts, iter_event_keys())
+        dedup_cache.install_blooms(blooms)
+        logging.info(f"Dedup cache siap: {len(blooms)} Bloom filter, {dedup_cache.bloom_bytes} byte.")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logging.error(f"Gagal menyiapkan Bloom filter: {e}", exc_info=True)
+
+async def _run_in_background(loop: asyncio.AbstractEventLoop, func, description: str):
+    """Menjalankan fungsi sync di thread pool sebagai tugas background, error hanya dicatat."""
+    try:
+        await loop.run_in_executor(None, func)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logging.error(f"Gagal menjalankan {description}: {e}", exc_info=True)
+
+async def _retention_round(loop: asyncio.AbstractEventLoop, stop: threading.Event):
+    """
+    Menghapus event yang melewati jendela retensi, lalu incremental vacuum.
+    Dijalankan di thread pool per batch kecil, jadi event loop dan ingest tidak terblokir.
+    """
+    started = time.perf_counter()
+    try:
+        deleted = await loop.run_in_executor(None, lambda: purge_expired_events(stop=stop))
+        freed = 0
+        if config.RETENTION_VACUUM_PAGES:
+            freed = await loop.run_in_executor(
+                None, lambda: incremental_vacuum(config.RETENTION_VACUUM_PAGES, stop=stop)
+            )
+        retention_stats["runs"] += 1
+        retention_stats["deleted_total"] += deleted
+        retention_stats["vacuumed_pages_total"] += freed
+        retention_stats["last_run"] = datetime.utcnow().isoformat()
+        retention_stats["last_deleted"] = deleted
+        retention_stats["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logging.error(f"Gagal menjalankan pembersihan retensi: {e}", exc_info=True)
+
+async def _maintenance_loop(loop: asyncio.AbstractEventLoop, stop: threading.Event):
+    """
+    Pemeliharaan (migrasi timestamp lama, lalu retensi dan pembersihan bucket rollup lama)
+    hanya dijalankan oleh satu worker: pemegang maintenance_lock. Worker lain mencoba mengambil
+    alih setiap interval retensi, jadi jika pemegangnya mati (lock dilepas OS), pemeliharaan
+    dilanjutkan worker lain.
+    """
+    while not maintenance_lock.acquire(blocking=False):
+        await asyncio.sleep(config.RETENTION_INTERVAL_SECONDS)
+    await _run_in_background(loop, backfill_compact_timestamps, "migrasi timestamp")
+    while True:
+        if retention_enabled():
+            await _retention_round(loop, stop)
+        await _run_in_background(loop, lambda: purge_expired_rollups(stop=stop), "pembersihan rollup")
+        await asyncio.sleep(config.RETENTION_INTERVAL_SECONDS)
+
+async def _event_log_summary_loop():
+    """Ringkasan log UNIK/DUPLIKAT per topic setiap EVENT_LOG_SUMMARY_SECONDS."""
+    while True:
+        await asyncio.sleep(config.EVENT_LOG_SUMMARY_SECONDS)
+        event_log.flush_summary()
+
+async def _replay_ingest_log(log: IngestLog):
+    """Memasukkan kembali event di ingest log yang belum tersimpan saat proses berhenti (dengan backpressure queue)."""
+    replayed = 0
+    try:
+        for events in log.iter_unconsumed():
+            for event in events:
+                await shard_queues[shard_for(event.topic, event.event_id)].put(event)
+            stats["received"] += len(events)
+            replayed += len(events)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logging.error(f"Gagal me-replay ingest log '{log.folder}': {e}", exc_info=True)
+    logging.info(f"Replay ingest log '{log.folder}' selesai: {replayed} event.")
+
+def _ingest_log_stats() -> Dict[str, Any]:
+    if ingest_log is None:
+        return {"enabled": False}
+    return {"enabled": True, "folder": ingest_log.folder, **ingest_log.stats(), "adopted_logs": len(adopted_logs)}
+
+# --- Status Worker (mode multi-worker) ---
+def _shard_summary() -> List[Dict[str, Any]]:
+    return [
+        {
+            "shard": shard_id,
+            "queue_depth": queue.qsize(),
+            "queue_capacity": queue.maxsize,
+            "queue_high_water": shard_stats[shard_id]["high_water"],
+            "processed": shard_stats[shard_id]["processed"],
+            # Laju dianggap 0 jika shard tidak memproses apa pun selama 2 window
+            "rate_per_sec": round(shard_stats[shard_id]["rate"], 2)
+                if time.time() - shard_stats[shard_id]["window_start"] < 2 * RATE_WINDOW_SECONDS else 0.0,
+        }
+        for shard_id, queue in enumerate(shard_queues)
+    ]
+
+def _worker_snapshot() -> Dict[str, Any]:
+    """State sementara worker ini (tidak ada di DB) dalam bentuk JSON, untuk diagregasi worker lain."""
+    return {
+        "started_at": stats["start_time"],
+        "maintenance": maintenance_lock.held,
+        "rejected_events": stats["rejected_events"],
+        "rejected_requests": stats["rejected_requests"],
+        "dedup_cache": dedup_cache.stats(),
+        "retention": dict(retention_stats),
+        "shards": _shard_summary(),
+        "histograms": {"stage_seconds": metrics.STAGE_SECONDS.snapshot(), "batch_events": metrics.BATCH_SIZE.snapshot()},
+    }
+
+async def _publish_worker_status(loop: asyncio.AbstractEventLoop):
+    """Menulis snapshot worker ini ke tabel worker_status (snapshot diambil di event loop, ditulis di thread)."""
+    await loop.run_in_executor(
+        None, write_worker_status, WORKER_ID, os.getpid(), _worker_snapshot(), 10 * WORKER_STATUS_MAX_AGE
+    )
+
+async def _worker_status_loop(loop: asyncio.AbstractEventLoop):
+    while True:
+        try:
+            await _publish_worker_status(loop)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Gagal menulis status worker: {e}", exc_info=True)
+        await asyncio.sleep(config.WORKER_STATUS_INTERVAL_SECONDS)
+
+async def _cluster_state() -> Dict[str, Any]:
+    """
+    Gabungan state semua worker: statistik durable dibaca dari DB (selalu akurat),
+    state sementara (queue, penolakan, cache, latensi) dari snapshot terbaru tiap worker.
+    Snapshot worker ini sendiri selalu diambil langsung dari memori.
+    """
+    loop = asyncio.get_running_loop()
+    db_stats, workers = await loop.run_in_executor(
+        None, lambda: (get_event_stats(), read_worker_statuses(WORKER_STATUS_MAX_AGE))
+    )
+    own = {"worker_id": WORKER_ID, "pid": os.getpid(), "updated_at": time.time(), **_worker_snapshot()}
+    workers = sorted([w for w in workers if w["worker_id"] != WORKER_ID] + [own], key=lambda w: w["worker_id"])
+    dedup: Dict[str, Any] = {}
+    for worker in workers:
+        for name, value in worker["dedup_cache"].items():
+            dedup[name] = (dedup.get(name, False) or value) if isinstance(value, bool) else dedup.get(name, 0) + value
+    leader = next((w for w in workers if w["maintenance"]), own)
+    return {
+        "event_stats": db_stats,
+        "workers": workers,
+        "queued": sum(shard["queue_depth"] for w in workers for shard in w["shards"]),
+        "rejected_events": sum(w["rejected_events"] for w in workers),
+        "rejected_requests": sum(w["rejected_requests"] for w in workers),
+        "dedup_cache": dedup,
+        "retention": leader["retention"],
+        "stage_seconds": metrics.STAGE_SECONDS.merged(w["histograms"]["stage_seconds"] for w in workers),
+        "batch_events": metrics.BATCH_SIZE.merged(w["histograms"]["batch_events"] for w in workers),
+    }
+
 # --- Lifespan (Startup & Shutdown) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global ingest_log, cluster
     logging.info("Server startup... Menyiapkan database.")
-    setup_database()
-    
-    # --- PERUBAHAN UTAMA DI SINI ---
-    logging.info("Memuat data event yang sudah diproses dari database...")
-    # 1. Baca semua event lama dari DB
-    loaded_events = get_all_processed_events() 
-    # 2. Isi kembali state di memori
-    unique_events_storage.extend(loaded_events)
-    stats["unique_processed"] = len(loaded_events)
-    stats["topics"] = set(event.topic for event in loaded_events)
-    logging.info(f"Startup selesai. {stats['unique_processed']} event unik dimuat.")
-    # -----------------------------
+    # Worker lain menunggu sampai setup/migrasi worker pertama selesai, lalu setup-nya no-op
+    with setup_lock:
+        setup_database()
     
-    consumer = asyncio.create_task(consumer_task(event_queue)) 
-    logging.info("Consumer task telah dijadwalkan.")
+    # Startup hanya membaca metadata (jumlah per topic), tidak memuat seluruh event ke RAM.
+    # /events dibaca langsung dari SQLite.
+    # Statistik durable dibaca dari tabel event_stats (sebanding jumlah topic/source, bukan jumlah event)
+    event_stats.clear()
+    event_stats.update(get_event_stats())
+    topic_counts = get_topic_counts()
+    stats["received"] = sum(entry["received"] for entry in event_stats.values())
+    stats["unique_processed"] = sum(entry["unique"] for entry in event_stats.values())
+    stats["duplicate_dropped"] = sum(entry["duplicate"] for entry in event_stats.values())
+    stats["topics"] = set(topic_counts)
+    logging.info(f"Startup selesai. {stats['unique_processed']} event unik di {len(topic_counts)} topic.")
+
+    # Ingest log: slot milik worker ini (+ log yatim), event yang belum tersimpan di-replay di background
+    replay_tasks = []
+    if config.INGEST_LOG_ENABLED:
+        ingest_log, orphans = open_worker_logs(
+            config.INGEST_LOG_FOLDER, config.INGEST_LOG_SEGMENT_BYTES, config.INGEST_LOG_FSYNC
+        )
+        adopted_logs[:] = orphans
+        for log in [ingest_log] + orphans:
+            pending = log.open()
+            log.start()
+            if pending:
+                logging.info(f"Ingest log '{log.folder}': {pending} event belum tersimpan, di-replay.")
+                replay_tasks.append(asyncio.create_task(_replay_ingest_log(log)))
+
+    # Bloom filter per topic diisi di background agar startup tidak menunggu scan key
+    loop = asyncio.get_running_loop()
+    dedup_cache.clear()
+    warm_up = asyncio.create_task(_warm_up_dedup_cache(loop, topic_counts))
+    # Migrasi timestamp lama ke format ringkas (jika ada) dan pembersihan event kedaluwarsa
+    # (jika ada jendela retensi), di background dan hanya oleh satu worker
+    retention_stop = threading.Event()
+    background_tasks = [warm_up, asyncio.create_task(_maintenance_loop(loop, retention_stop)), *replay_tasks]
+    if config.EVENT_LOG_SUMMARY_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(_event_log_summary_loop()))
+    if MULTI_WORKER:
+        background_tasks.append(asyncio.create_task(_worker_status_loop(loop)))
+        background_tasks.append(asyncio.create_task(_subscription_tail_loop(loop)))
+        logging.info(f"Mode multi-worker ({config.WORKERS} worker), worker ini: {WORKER_ID}.")
+
+    if len(config.CLUSTER_NODES) > 1:
+        cluster = Cluster(
+            config.CLUSTER_NODES, config.CLUSTER_SELF, config.CLUSTER_VNODES, config.CLUSTER_FORWARD_BATCH_SIZE,
+            config.CLUSTER_FORWARD_FLUSH_MS / 1000, config.CLUSTER_FORWARD_MAX_IN_FLIGHT, config.CLUSTER_TIMEOUT_SECONDS,
+            secret=config.CLUSTER_SECRET,
+        )
+        if not config.CLUSTER_SECRET:
+            logging.warning("AGGREGATOR_CLUSTER_SECRET kosong: batch forward dari peer diproses lewat ring seperti request biasa.")
+        logging.info(f"Mode cluster: node ini {cluster.self_url} dari {len(cluster.nodes)} node.")
+
+    # Thread pool khusus untuk operasi SQLite, satu thread per shard
+    db_executor = ThreadPoolExecutor(max_workers=config.CONSUMER_SHARDS, thread_name_prefix="db-writer")
+    consumers = [
+        asyncio.create_task(consumer_task(queue, shard_id, db_executor))
+        for shard_id, queue in enumerate(shard_queues)
+    ]
+    logging.info(f"{len(consumers)} consumer task telah dijadwalkan.")
     
     yield 
     
     logging.info("Server shutdown...")
-    consumer.cancel()
+    if cluster is not None:
+        # Request yang sedang menunggu forward diselesaikan dulu, baru pool koneksi ditutup
+        await cluster.close()
+        cluster = None
+    retention_stop.set() # batch retensi yang sedang berjalan di thread berhenti setelah batch itu
+    for task in background_tasks:
+        task.cancel()
+    # Backlog diproses dulu, baru consumer dihentikan
     try:
-        await asyncio.wait_for(event_queue.join(), timeout=5.0) 
+        await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in shard_queues)), timeout=5.0) 
     except asyncio.TimeoutError:
-        logging.warning("Timeout saat menunggu queue kosong, shutdown paksa.")
+        logging.warning("Timeout saat menunggu queue kosong, shutdown paksa (sisa event di-replay dari ingest log).")
+    for consumer in consumers:
+        consumer.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+    db_executor.shutdown(wait=True)
+    if config.EVENT_LOG_SUMMARY_SECONDS > 0:
+        event_log.flush_summary() # sisa ringkasan sejak interval terakhir
+    for log in ([ingest_log] if ingest_log is not None else []) + adopted_logs:
+        await log.close()
+    ingest_log = None
+    adopted_logs.clear()
+    if MULTI_WORKER:
+        try:
+            delete_worker_status(WORKER_ID)
+        except Exception as e:
+            logging.warning(f"Gagal menghapus status worker: {e}")
+    close_database()
+    maintenance_lock.release()
     logging.info("Shutdown selesai.")
 
 # --- Aplikasi FastAPI (Sama) ---
@@ -97,38 +753,491 @@ app = FastAPI(
 )
 
 # --- Endpoint API (Sama) ---
-@app.post("/publish", status_code=202)
-async def publish_events(payload: Union[Event, List[Event]]):
-    events_to_process = []
-    if isinstance(payload, Event):
-        events_to_process.append(payload)
-    else:
-        events_to_process = payload
+@app.post(
+    "/publish",
+    status_code=202,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": PUBLISH_BODY_SCHEMA},
+        MSGPACK_MEDIA_TYPE: {"schema": PUBLISH_BODY_SCHEMA},
+    }}},
+)
+async def publish_events(request: Request):
+    # Fast path: body divalidasi langsung dari bytes dalam satu langkah (TypeAdapter),
+    # bukan json -> dict -> validasi Union[Event, List[Event]] per event.
+    # Body boleh gzip/deflate (Content-Encoding) dan/atau MessagePack (Content-Type: application/msgpack).
+    started = time.perf_counter()
+    body = await request.body()
+    try:
+        body = decode_body(body, request.headers.get("content-encoding"), config.PUBLISH_MAX_DECODED_BYTES)
+        if is_msgpack(request.headers.get("content-type")):
+            events_to_process = parse_events_msgpack(body)
+        else:
+            events_to_process = parse_events_json(body)
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)])
+    except (UnsupportedEncodingError, UnsupportedMediaTypeError) as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except BodyTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Body gzip rusak: {e}")
+    except InvalidBodyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    parsed = time.perf_counter()
+    metrics.PUBLISH_PARSE.observe(parsed - started)
     
-    for event in events_to_process:
-        stats["received"] += 1
-        await event_queue.put(event) 
+    try:
+        await dispatch_events(events_to_process, forwarded=_is_forwarded(request))
+        finished = time.perf_counter()
+        metrics.PUBLISH_ENQUEUE.observe(finished - parsed)
+        metrics.PUBLISH_TOTAL.observe(finished - started)
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PeerRejectedError as e:
+        # Ditolak permanen oleh node pemilik: bukan 503, publisher tidak perlu mengulang
+        raise HTTPException(status_code=413 if e.status_code == 413 else 400, detail=str(e))
+    except QueueFullError as e:
+        # Backpressure: publisher diminta mengulang (dengan event_id yang sama, aman karena dedup)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)})
+    except PeerBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e),
+                            headers={"Retry-After": e.retry_after or str(config.RETRY_AFTER_SECONDS)})
+    except (IngestLogError, PeerUnavailableError) as e:
+        # Belum durable: jangan di-ack, publisher mengulang (aman karena dedup)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)})
     
     return {"message": f"{len(events_to_process)} event(s) diterima untuk diproses"}
 
+@app.post("/publish/stream", status_code=202)
+async def publish_stream(request: Request):
+    """
+    Bulk ingest NDJSON (satu event per baris, opsional Content-Encoding: gzip).
+    Body di-parse dan di-enqueue bertahap per chunk, jadi memori dibatasi ukuran chunk,
+    bukan ukuran body. Baris yang tidak valid dilewati dan dilaporkan posisinya.
+    Jika queue tetap penuh lebih dari STREAM_ENQUEUE_WAIT_MS, stream dihentikan dengan 429;
+    semua baris sampai committed_line sudah ditangani, kirim ulang mulai baris berikutnya.
+    """
+    # Batch enqueue tidak boleh melebihi kapasitas satu shard
+    group_size = config.CONSUMER_BATCH_SIZE
+    if SHARD_QUEUE_SIZE > 0:
+        group_size = min(group_size, SHARD_QUEUE_SIZE)
+    wait_seconds = config.STREAM_ENQUEUE_WAIT_MS / 1000
+    forwarded = _is_forwarded(request)
+
+    accepted = 0
+    rejected = 0
+    committed_rejected = 0 # baris ditolak sampai committed_line (yang lain akan dikirim ulang)
+    errors = []
+    pending: List[Event] = []
+    committed_line = 0 # semua baris <= ini sudah diterima atau ditolak
+    current_line = 0
+
+    def reject(line_no: int, message: str):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < config.STREAM_MAX_ERRORS:
+            errors.append({"line": line_no, "error": message})
+
+    async def flush():
+        nonlocal accepted, pending, committed_line, committed_rejected
+        if pending:
+            await dispatch_events(pending, wait_seconds=wait_seconds, forwarded=forwarded)
+            accepted += len(pending)
+            pending = []
+        committed_line = current_line
+        committed_rejected = rejected
+
+    def summary() -> Dict[str, Any]:
+        # Hanya baris sampai committed_line: baris ditolak setelahnya ikut dikirim ulang dan
+        # dilaporkan lagi oleh request berikutnya, jadi jangan dihitung dua kali
+        return {"accepted": accepted, "rejected": committed_rejected, "committed_line": committed_line,
+                "errors": [error for error in errors if error["line"] <= committed_line]}
+
+    try:
+        chunks = iter_decoded_chunks(request.stream(), request.headers.get("content-encoding"))
+        async for line_no, line in iter_ndjson_lines(chunks, config.STREAM_MAX_LINE_BYTES):
+            current_line = line_no
+            if isinstance(line, Exception):
+                reject(line_no, str(line))
+            else:
+                try:
+                    pending.append(Event.model_validate_json(line))
+                except ValidationError as e:
+                    reject(line_no, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            if len(pending) >= group_size:
+                await flush()
+        await flush()
+    except UnsupportedEncodingError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail={"message": f"Body gzip rusak: {e}", **summary()})
+    except PeerRejectedError as e:
+        return JSONResponse(
+            status_code=413 if e.status_code == 413 else 400,
+            content={"message": f"{e}. Baris sampai {committed_line} sudah ditangani.", **summary()},
+        )
+    except (IngestLogError, PeerUnavailableError) as e:
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)},
+            content={"message": f"{e}. Kirim ulang mulai baris {committed_line + 1}.", **summary()},
+        )
+    except (QueueFullError, PeerBusyError):
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)},
+            content={"message": f"Queue penuh, stream dihentikan. Kirim ulang mulai baris {committed_line + 1}.", **summary()},
+        )
+
+    return summary()
+
 @app.get("/stats", response_model=Dict[str, Any])
-async def get_stats():
-    # 'received' dan 'duplicate_dropped' mungkin tidak akurat setelah restart
-    # tapi 'unique_processed' dan 'topics' akan akurat dari DB
-    return {
+async def get_stats(scope: str = Query("cluster", pattern="^(cluster|local)$")):
+    # received/unique/duplicate disimpan durable di DB (tabel event_stats) dan
+    # di-update bersama penulisan event, jadi tetap akurat setelah restart.
+    # Dibaca dari salinan di memori: tidak ada scan tabel event.
+    result = {
         "uptime_seconds": round(time.time() - stats["start_time"], 2),
-        "received_total (since_restart)": stats["received"], # Ganti nama agar jelas
-        "unique_processed (total)": stats["unique_processed"], # Ini dari DB
-        "duplicate_dropped (since_restart)": stats["duplicate_dropped"], # Ganti nama
-        "topics_list (total)": list(stats["topics"]) # Ini dari DB
+        "received": stats["received"],
+        "unique_processed": stats["unique_processed"],
+        "duplicate_dropped": stats["duplicate_dropped"],
+        "topics_list": list(stats["topics"]),
+        "by_topic": _summarize_stats(0),
+        "by_source": _summarize_stats(1),
+        "rejected_events (since_restart)": stats["rejected_events"],
+        "rejected_requests (since_restart)": stats["rejected_requests"],
+        "dedup_cache": dedup_cache.stats(),
+        "retention": {"enabled": retention_enabled(), **retention_stats},
+        "ingest_log": _ingest_log_stats(),
+        "payload_compression": payload_compression_stats(),
+        "subscriptions": subscriptions.stats(),
+        "latency_ms": {stage: hist.summary(scale=1000) for stage, hist in metrics.STAGE_SECONDS.children.items()},
+        "shards": _shard_summary(),
     }
+    if MULTI_WORKER:
+        # Tiap worker hanya melihat statistik miliknya sendiri di memori, jadi angka gabungan
+        # diambil dari DB (durable) dan snapshot worker lain. "shards" tetap milik worker ini.
+        shared = await _cluster_state()
+        db_stats = shared["event_stats"]
+        result.update({
+            # received = sudah diproses (DB) + masih mengantre di semua worker
+            "received": sum(entry["received"] for entry in db_stats.values()) + shared["queued"],
+            "unique_processed": sum(entry["unique"] for entry in db_stats.values()),
+            "duplicate_dropped": sum(entry["duplicate"] for entry in db_stats.values()),
+            "topics_list": sorted({topic for (topic, _), entry in db_stats.items() if entry["unique"]}),
+            "by_topic": _summarize_stats(0, db_stats),
+            "by_source": _summarize_stats(1, db_stats),
+            "rejected_events (since_restart)": shared["rejected_events"],
+            "rejected_requests (since_restart)": shared["rejected_requests"],
+            "dedup_cache": shared["dedup_cache"],
+            "retention": {"enabled": retention_enabled(), **shared["retention"]},
+            "latency_ms": {stage: hist.summary(scale=1000) for stage, hist in shared["stage_seconds"].children.items()},
+            "worker_id": WORKER_ID,
+            "workers": [
+                {
+                    "worker_id": worker["worker_id"],
+                    "pid": worker["pid"],
+                    "uptime_seconds": round(time.time() - worker["started_at"], 2),
+                    "status_age_seconds": round(time.time() - worker["updated_at"], 2),
+                    "maintenance": worker["maintenance"],
+                    "queue_depth": sum(shard["queue_depth"] for shard in worker["shards"]),
+                    "processed": sum(shard["processed"] for shard in worker["shards"]),
+                    "rate_per_sec": round(sum(shard["rate_per_sec"] for shard in worker["shards"]), 2),
+                    "rejected_events": worker["rejected_events"],
+                }
+                for worker in shared["workers"]
+            ],
+        })
+    if cluster is not None:
+        result["cluster"] = cluster.stats()
+        if scope == "cluster":
+            await _merge_cluster_stats(result)
+    return result
+
+async def _merge_cluster_stats(result: Dict[str, Any]):
+    """
+    /stats gabungan semua node cluster (scope=local di setiap peer): counter, topics_list,
+    by_topic, dan by_source dijumlah; bagian lain (queue, cache, latensi) tetap milik node ini.
+    Peer yang tidak menjawab dilewati dan ditandai (partial).
+    """
+    peers = [node for node in cluster.nodes if node != cluster.self_url]
+    answers = await asyncio.gather(
+        *(cluster.get_json(node, "/stats", {"scope": "local"}) for node in peers), return_exceptions=True
+    )
+    results = [result]
+    members = [{"node": cluster.self_url, "ok": True, "unique_processed": result["unique_processed"]}]
+    for node, answer in zip(peers, answers):
+        if isinstance(answer, Exception):
+            members.append({"node": node, "ok": False, "error": str(answer)})
+        else:
+            results.append(answer)
+            members.append({"node": node, "ok": True, "unique_processed": answer["unique_processed"]})
+    result.update(merge_stats(results))
+    result["cluster"]["members"] = members
+    result["cluster"]["partial"] = len(results) < len(cluster.nodes)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Metrik format teks Prometheus: histogram latensi per tahap, counter event, dan gauge queue.
+    Mode multi-worker: nilai gabungan semua worker (scrape bisa jatuh ke worker mana pun).
+    """
+    stage_seconds, batch_events = metrics.STAGE_SECONDS, metrics.BATCH_SIZE
+    received, unique, duplicate = stats["received"], stats["unique_processed"], stats["duplicate_dropped"]
+    rejected, retention_deleted = stats["rejected_events"], retention_stats["deleted_total"]
+    dedup_counters = dedup_cache.counters
+    queue_depths = [({"shard": shard_id}, queue.qsize()) for shard_id, queue in enumerate(shard_queues)]
+    if MULTI_WORKER:
+        shared = await _cluster_state()
+        db_stats = shared["event_stats"]
+        stage_seconds, batch_events = shared["stage_seconds"], shared["batch_events"]
+        received = sum(entry["received"] for entry in db_stats.values()) + shared["queued"]
+        unique = sum(entry["unique"] for entry in db_stats.values())
+        duplicate = sum(entry["duplicate"] for entry in db_stats.values())
+        rejected, retention_deleted = shared["rejected_events"], shared["retention"]["deleted_total"]
+        dedup_counters = {name: shared["dedup_cache"][name] for name in dedup_cache.counters}
+        queue_depths = [
+            ({"worker": worker["worker_id"], "shard": shard["shard"]}, shard["queue_depth"])
+            for worker in shared["workers"] for shard in worker["shards"]
+        ]
+    lines = stage_seconds.render() + batch_events.render()
+    lines += metrics.render_sample("aggregator_events_received_total", "Event diterima.", "counter", [(None, received)])
+    lines += metrics.render_sample("aggregator_events_unique_total", "Event unik diproses.", "counter", [(None, unique)])
+    lines += metrics.render_sample("aggregator_events_duplicate_total", "Event duplikat dibuang.", "counter", [(None, duplicate)])
+    lines += metrics.render_sample("aggregator_events_rejected_total", "Event ditolak karena queue penuh.", "counter", [(None, rejected)])
+    lines += metrics.render_sample("aggregator_retention_deleted_total", "Event kedaluwarsa yang dihapus retensi.", "counter",
+                                   [(None, retention_deleted)])
+    lines += metrics.render_sample("aggregator_dedup_cache_total", "Counter dedup front-cache.", "counter",
+                                   [({"result": name}, value) for name, value in dedup_counters.items()])
+    lines += metrics.render_sample("aggregator_queue_depth", "Jumlah event mengantre per shard.", "gauge", queue_depths)
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
 @app.get("/events", response_model=List[Event])
-async def get_events(topic: str = None):
-    # Sekarang list ini diisi dari DB saat startup
-    if topic:
-        return [event for event in unique_events_storage if event.topic == topic]
-    return unique_events_storage
+async def get_events(
+    request: Request,
+    response: Response,
+    topic: str = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    after: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    source: str = None,
+    time_field: str = Query("processed_at", pattern="^(processed_at|timestamp)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    format: str = Query(None, pattern="^(json|ndjson|msgpack)$"),
+    scope: str = Query("cluster", pattern="^(cluster|local)$"),
+):
+    """
+    Event unik dibaca langsung dari SQLite (keyset pagination).
+    Jika masih ada halaman berikutnya, cursor-nya dikirim di header X-Next-Cursor
+    dan dipakai sebagai parameter ?after= (dengan time_field/order yang sama).
+    since/until (UTC) memfilter berdasarkan time_field: waktu diproses (processed_at, default)
+    atau timestamp event; hasil diurutkan menurut kolom yang sama (order=asc|desc).
+    Filter topic (+ source) dengan rentang waktu dilayani index komposit, jadi hanya baris
+    yang cocok yang dibaca.
+
+    Mode NDJSON (?format=ndjson atau Accept: application/x-ndjson) men-stream
+    SEMUA event yang cocok langsung dari cursor SQLite (tanpa limit, memori konstan).
+    ?format=msgpack atau Accept: application/msgpack: halaman sebagai array MessagePack.
+    Dengan Accept-Encoding: gzip, respons (termasuk stream NDJSON) dikompresi gzip.
+
+    Mode cluster: halaman dari setiap node digabung sesuai urutan yang sama (cursor berisi
+    posisi tiap node); scope=local hanya membaca node ini.
+    """
+    accept = request.headers.get("accept", "")
+    if format is None:
+        format = "ndjson" if NDJSON_MEDIA_TYPE in accept else "msgpack" if accepts_msgpack(accept) else "json"
+    if format == "msgpack" and wire.msgpack is None:
+        raise HTTPException(status_code=406, detail="Respons MessagePack butuh paket msgpack di server")
+    use_gzip = config.RESPONSE_GZIP_MIN_BYTES > 0 and accepts_gzip(request.headers.get("accept-encoding"))
+    filters = dict(topic=topic, since=since, until=until, source=source, time_field=time_field, descending=order == "desc")
+    try:
+        if cluster is not None and scope == "cluster":
+            if format == "ndjson":
+                decode_cursor(after, len(cluster.nodes)) # cursor tidak valid: 400 sebelum stream dimulai
+                return _ndjson_response(_cluster_events_ndjson(filters, after), use_gzip)
+            events, next_cursor = await _cluster_events_page(filters, after, limit)
+            return await run_in_threadpool(_events_response, events, format, next_cursor, use_gzip)
+        if format == "ndjson":
+            return _ndjson_response(stream_events_ndjson(after=after, **filters), use_gzip)
+        events, next_cursor = await run_in_threadpool(get_events_page, after=after, limit=limit, **filters)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Cursor tidak valid: {after}")
+    except PeerUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)})
+    if format == "msgpack" or use_gzip:
+        return await run_in_threadpool(_events_response, events, format, next_cursor, use_gzip)
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return events
+
+def _events_response(events: list, format: str, next_cursor: str, use_gzip: bool) -> Response:
+    """
+    Satu halaman /events sebagai JSON atau MessagePack, di-gzip jika diminta dan cukup besar.
+    events berisi Event (mode lokal) atau teks JSON event (hasil gabungan cluster).
+    """
+    as_text = bool(events) and isinstance(events[0], str)
+    if format == "msgpack":
+        body = pack_events([json.loads(event) for event in events] if as_text
+                           else [event.model_dump(mode="json") for event in events])
+    else:
+        body = ("[" + ",".join(events) + "]").encode("utf-8") if as_text else EVENT_LIST_ADAPTER.dump_json(events)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if use_gzip and len(body) >= config.RESPONSE_GZIP_MIN_BYTES:
+        body = gzip_bytes(body, config.RESPONSE_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type=MSGPACK_MEDIA_TYPE if format == "msgpack" else "application/json", headers=headers)
+
+def _ndjson_response(chunks, use_gzip: bool) -> StreamingResponse:
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if use_gzip:
+        chunks = gzip_chunks(chunks, config.RESPONSE_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+def _peer_query(filters: Dict[str, Any], after: str, limit: int) -> Dict[str, Any]:
+    """Filter /events sebagai query string untuk /cluster/events di peer."""
+    params = {"limit": limit, "time_field": filters["time_field"], "order": "desc" if filters["descending"] else "asc"}
+    for name in ("topic", "source"):
+        if filters[name]:
+            params[name] = filters[name]
+    for name in ("since", "until"):
+        if filters[name]:
+            params[name] = filters[name].isoformat()
+    if after:
+        params["after"] = after
+    return params
+
+async def _cluster_events_page(filters: Dict[str, Any], after: str, limit: int):
+    """
+    Satu halaman /events gabungan: setiap node membaca maksimal limit event dari cursor-nya
+    (bersamaan), lalu hasilnya digabung dan dipotong ke limit. Cursor node yang halamannya
+    hanya terpakai sebagian maju sampai event terakhir yang terpakai. Seperti mode satu node,
+    halaman yang belum penuh tidak punya cursor berikutnya.
+    Raise ValueError (cursor tidak valid) / PeerUnavailableError (peer tidak menjawab).
+    """
+    node_cursors = decode_cursor(after, len(cluster.nodes))
+
+    async def fetch(node: str, node_after: str):
+        if node == cluster.self_url:
+            items, _ = await run_in_threadpool(get_events_page_keyed, after=node_after or None, limit=limit, **filters)
+        else:
+            items = (await cluster.get_json(node, "/cluster/events", _peer_query(filters, node_after, limit)))["items"]
+        return {"items": items, "after": node_after}
+
+    pages = await asyncio.gather(*(fetch(node, node_after) for node, node_after in zip(cluster.nodes, node_cursors)))
+    events, cursors = merge_pages(pages, limit, filters["descending"])
+    next_cursor = encode_cursor(cursors) if len(events) == limit else None
+    return events, next_cursor
+
+async def _cluster_events_ndjson(filters: Dict[str, Any], after: str, page_size: int = 1000):
+    """Export NDJSON gabungan semua node: halaman gabungan berturut-turut (memori sebatas satu halaman per node)."""
+    while True:
+        events, after = await _cluster_events_page(filters, after, page_size)
+        if events:
+            yield "\n".join(events) + "\n"
+        if not after:
+            break
+
+@app.get("/cluster/events", include_in_schema=False)
+def get_cluster_events(
+    topic: str = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    after: str = None,
+    since: datetime = None,
+    until: datetime = None,
+    source: str = None,
+    time_field: str = Query("processed_at", pattern="^(processed_at|timestamp)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+):
+    """Halaman lokal dengan key urutan dan cursor per event, untuk penggabungan /events di node lain."""
+    try:
+        items, more = get_events_page_keyed(topic=topic, after=after, limit=limit, since=since, until=until,
+                                            source=source, time_field=time_field, descending=order == "desc")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Cursor tidak valid: {after}")
+    return {"items": items, "more": more}
+
+@app.get("/rollups")
+def rollups(
+    tier: str = Query("minute", pattern="^(minute|hour|day)$"),
+    since: datetime = None,
+    until: datetime = None,
+    topic: str = None,
+    source: str = None,
+    group_by: str = Query("topic_source", pattern="^(topic_source|topic|source|all)$"),
+):
+    """
+    Jumlah event per bucket waktu diproses (UTC): received, unique, duplicate, duplicate_rate,
+    payload_bytes, per tier minute/hour/day dan dikelompokkan per group_by.
+    Dibaca dari tabel rollup yang di-update bersama penulisan event, jadi biayanya sebanding
+    jumlah bucket, bukan jumlah event. Default: 60 bucket terakhir sampai sekarang.
+    """
+    width = ROLLUP_TIERS[tier]
+    # Waktu ber-timezone (mis. ...Z) dinormalisasi ke UTC tanpa tzinfo, sama seperti processed_at
+    until = us_to_datetime(datetime_to_us(until)) if until is not None else datetime.utcnow()
+    since = us_to_datetime(datetime_to_us(since)) if since is not None else until - timedelta(seconds=60 * width)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since harus sebelum until")
+    if (until - since).total_seconds() / width > config.ROLLUP_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Rentang terlalu panjang untuk tier {tier} "
+                                                    f"(maksimal {config.ROLLUP_MAX_BUCKETS} bucket), pakai tier lebih kasar")
+    return {
+        "tier": tier,
+        "bucket_seconds": width,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "group_by": list(ROLLUP_GROUPS[group_by]),
+        "buckets": get_rollups(tier, since, until, topic=topic, source=source, group_by=group_by),
+    }
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+@app.get("/subscribe")
+async def subscribe(
+    request: Request,
+    topic: str = None,
+    after: str = None,
+    policy: str = Query(None, pattern="^(drop_oldest|disconnect)$"),
+    limit: int = Query(None, ge=1),
+):
+    """
+    Push event unik (setelah dedup dan tersimpan) sebagai Server-Sent Events, per topic
+    (tanpa topic = semua). Tanpa cursor, hanya event setelah subscribe yang dikirim;
+    dengan ?after= atau header Last-Event-ID (id event terakhir yang diterima), event
+    setelah cursor dikirim dulu dari SQLite lalu berlanjut live tanpa celah.
+    Subscriber lambat: buffer SUBSCRIBE_BUFFER_SIZE event, lalu sesuai policy
+    (drop_oldest = event tertua dibuang + event "gap"; disconnect = event "error" lalu putus).
+    limit = tutup stream setelah sekian event.
+    """
+    cursor = after if after is not None else request.headers.get("last-event-id")
+    if cursor:
+        try:
+            positions = parse_subscription_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Cursor tidak valid: {cursor}")
+    if subscriptions.count >= config.SUBSCRIBE_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Terlalu banyak subscriber",
+                            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)})
+    # Daftar dulu, baru baca posisi awal: event yang tersimpan di antaranya ikut terkirim
+    subscriber = subscriptions.subscribe(topic, config.SUBSCRIBE_BUFFER_SIZE, policy or config.SUBSCRIBE_SLOW_POLICY)
+    if not cursor:
+        loop = asyncio.get_running_loop()
+        try:
+            positions = await (_tail_start_positions(loop) if MULTI_WORKER else loop.run_in_executor(None, max_rowids))
+        except BaseException:
+            subscriptions.unsubscribe(subscriber)
+            raise
+    return StreamingResponse(
+        _subscription_stream(subscriber, positions, limit),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/")
 async def root():
@@ -0,0 +1,169 @@
+# src/metrics.py
+# Instrumentasi ringan: histogram latensi dengan bucket tetap + format teks Prometheus.
+# Semua observe() dipanggil dari event loop (tidak perlu lock).
+
+import asyncio
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+
+from . import config
+
+# Bucket default (detik): 50us .. 10s
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Bucket ukuran batch consumer (jumlah event)
+BATCH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Histogram bucket tetap (kumulatif saat dirender), dengan estimasi kuantil."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1) # slot terakhir = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float, count: int = 1):
+        if not config.METRICS_ENABLED:
+            return
+        self.counts[bisect_left(self.bounds, value)] += count
+        self.sum += value * count
+        self.count += count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimasi kuantil dengan interpolasi linear di dalam bucket (seperti histogram_quantile)."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count > 0:
+                if i == len(self.bounds):
+                    return self.bounds[-1] # jatuh di +Inf: kembalikan batas atas terakhir
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.bounds[-1]
+
+    def summary(self, scale: float = 1.0) -> Dict[str, Optional[float]]:
+        """Ringkasan count/p50/p95/p99 (dikalikan scale, mis. 1000 untuk milidetik)."""
+        result: Dict[str, Optional[float]] = {"count": self.count}
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            value = self.quantile(q)
+            result[name] = round(value * scale, 4) if value is not None else None
+        return result
+
+    def snapshot(self) -> Dict[str, object]:
+        """Isi histogram dalam bentuk JSON (untuk digabung lintas proses worker)."""
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+    def merge(self, snapshot: Dict[str, object]):
+        """Menambahkan isi snapshot() histogram lain dengan bucket yang sama."""
+        for i, bucket_count in enumerate(snapshot["counts"][:len(self.counts)]):
+            self.counts[i] += bucket_count
+        self.sum += snapshot["sum"]
+        self.count += snapshot["count"]
+
+
+class HistogramFamily:
+    """Satu nama metrik Prometheus dengan satu label (mis. stage) -> Histogram."""
+
+    def __init__(self, name: str, help_text: str, label: str, bounds: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.bounds = tuple(bounds)
+        self.children: Dict[str, Histogram] = {}
+
+    def labels(self, value: str) -> Histogram:
+        child = self.children.get(value)
+        if child is None:
+            child = self.children[value] = Histogram(self.bounds)
+        return child
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        return {value: hist.snapshot() for value, hist in self.children.items()}
+
+    def merged(self, snapshots) -> "HistogramFamily":
+        """Family baru berisi gabungan beberapa snapshot() (mis. dari semua worker)."""
+        family = HistogramFamily(self.name, self.help_text, self.label, self.bounds)
+        for snapshot in snapshots:
+            for value, hist in snapshot.items():
+                family.labels(value).merge(hist)
+        return family
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for value, hist in self.children.items():
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds, hist.counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {hist.count}')
+            lines.append(f"{self.name}_sum{{{label}}} {hist.sum:.9g}")
+            lines.append(f"{self.name}_count{{{label}}} {hist.count}")
+        return lines
+
+
+def render_sample(name: str, help_text: str, metric_type: str, samples) -> List[str]:
+    """Render counter/gauge. samples = list of (labels_dict_or_None, value)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        if labels:
+            label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}")
+        else:
+            lines.append(f"{name} {value}")
+    return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# --- Metrik global ---
+STAGE_SECONDS = HistogramFamily(
+    "aggregator_stage_seconds", "Latensi per tahap pipeline ingest (detik).", "stage", LATENCY_BUCKETS
+)
+BATCH_SIZE = HistogramFamily(
+    "aggregator_consumer_batch_events", "Jumlah event per batch yang ditulis consumer.", "kind", BATCH_SIZE_BUCKETS
+)
+
+# Histogram per tahap (diambil sekali agar observe() tidak perlu lookup dict)
+PUBLISH_PARSE = STAGE_SECONDS.labels("publish_parse")
+PUBLISH_ENQUEUE = STAGE_SECONDS.labels("publish_enqueue")
+PUBLISH_TOTAL = STAGE_SECONDS.labels("publish_total")
+QUEUE_WAIT = STAGE_SECONDS.labels("queue_wait")
+DEDUP_LOOKUP = STAGE_SECONDS.labels("dedup_lookup")
+STORAGE_WRITE = STAGE_SECONDS.labels("storage_write")
+INGEST_LOG_SYNC = STAGE_SECONDS.labels("ingest_log_sync")
+CONSUMER_BATCH = BATCH_SIZE.labels("drained")
+
+
+class TimedQueue(asyncio.Queue):
+    """
+    asyncio.Queue yang mencatat lama tiap item berada di antrean (queue residence time)
+    ke histogram QUEUE_WAIT. Memakai hook internal _put/_get sehingga FIFO tetap sama.
+    """
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._enqueued_at = deque()
+        self._timed = config.METRICS_ENABLED
+
+    def _put(self, item):
+        self._queue.append(item)
+        if self._timed:
+            self._enqueued_at.append(time.perf_counter())
+
+    def _get(self):
+        if self._timed and self._enqueued_at:
+            QUEUE_WAIT.observe(time.perf_counter() - self._enqueued_at.popleft())
+        return self._queue.popleft()
@@ -1,11 +1,28 @@
 # src/models.py
 # VERSI FINAL (FIXED 2) - dengan perbaikan 'ConfigDict'
 
-from pydantic import BaseModel, Field, ConfigDict # <- Impor ConfigDict
-from datetime import datetime
-from typing import Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter # <- Impor ConfigDict
+from pydantic_core import to_json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List
+from functools import cached_property
+import sys
 import uuid
 
+# Timestamp disimpan ringkas sebagai integer mikrodetik sejak epoch (UTC)
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+def datetime_to_us(value: datetime) -> int:
+    """datetime -> mikrodetik sejak epoch. Datetime tanpa timezone dianggap UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _ONE_MICROSECOND
+
+def us_to_datetime(value: int) -> datetime:
+    """Mikrodetik sejak epoch -> datetime UTC (tanpa tzinfo, sama seperti default utcnow)."""
+    return _EPOCH + timedelta(microseconds=value)
+
 class Event(BaseModel):
     """
     Model data Pydantic untuk event log.
@@ -28,4 +45,64 @@ class Event(BaseModel):
     # Mengganti 'class Config' yang usang dengan 'model_config'
     model_config = ConfigDict(
         from_attributes=True
-    )
\ No newline at end of file
+    )
+
+    # Payload dalam bentuk JSON, diserialisasi sekali saja lalu dipakai ulang untuk storage
+    @cached_property
+    def payload_json(self) -> str:
+        """Payload sebagai teks JSON ringkas (pydantic-core, bukan json.dumps). Nilai biner (bin MessagePack) jadi base64."""
+        return to_json(self.payload, bytes_mode="base64").decode("utf-8")
+
+    @property
+    def timestamp_us(self) -> int:
+        """Timestamp dalam bentuk ringkas (mikrodetik sejak epoch, UTC)."""
+        return datetime_to_us(self.timestamp)
+
+
+class CompactEvent:
+    """
+    Bentuk ringkas event selama menunggu di queue shard (hot set di memori, dibatasi
+    AGGREGATOR_MAX_QUEUE_SIZE). Memakai __slots__, topic/source di-intern (satu objek
+    string per nilai unik), dan payload disimpan sebagai teks JSON, bukan dict.
+    Atributnya sama dengan yang dipakai jalur tulis/dedup: topic, event_id, source,
+    timestamp_us, payload_json. log_record menunjuk record ingest log batch-nya (None jika
+    ingest log tidak aktif), dipakai consumer untuk memajukan checkpoint.
+    """
+    __slots__ = ("topic", "event_id", "source", "timestamp_us", "payload_json", "log_record")
+
+    def __init__(self, topic: str, event_id: str, source: str, timestamp_us: int, payload_json: str):
+        self.topic = sys.intern(topic)
+        self.event_id = event_id
+        self.source = sys.intern(source)
+        self.timestamp_us = timestamp_us
+        self.payload_json = payload_json
+        self.log_record = None
+
+    @classmethod
+    def from_event(cls, event: Event) -> "CompactEvent":
+        return cls(event.topic, event.event_id, event.source, event.timestamp_us, event.payload_json)
+
+    def __repr__(self) -> str:
+        return f"CompactEvent(topic={self.topic!r}, event_id={self.event_id!r})"
+
+
+# --- Fast-path validasi batch ---
+# Adapter dibangun sekali; validate_json mem-parsing + memvalidasi seluruh batch dalam satu langkah
+EVENT_LIST_ADAPTER = TypeAdapter(List[Event])
+
+def parse_events_json(body: bytes) -> List[Event]:
+    """
+    Parse body JSON (satu event atau array event) langsung dari bytes.
+    Raise pydantic.ValidationError jika JSON/skema tidak valid.
+    """
+    if body.lstrip()[:1] == b"[":
+        return EVENT_LIST_ADAPTER.validate_json(body)
+    return [Event.model_validate_json(body)]
+
+# Skema body /publish untuk dokumentasi OpenAPI (body dibaca manual, bukan lewat parameter FastAPI)
+PUBLISH_BODY_SCHEMA = {
+    "anyOf": [
+        Event.model_json_schema(),
+        {"type": "array", "items": Event.model_json_schema()},
+    ]
+}
\ No newline at end of file
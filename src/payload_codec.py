@@ -0,0 +1,172 @@
+# src/payload_codec.py
+# Kompresi payload di SQLite: deflate mentah (zlib) per baris, memakai dictionary per topic
+# yang dilatih dari sampel payload topic itu. Baris lama (teks JSON) tetap terbaca apa adanya.
+# Modul ini tidak menyentuh DB: penyimpanan dictionary ada di database.py.
+
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+# Nilai kolom payload_fmt
+FORMAT_JSON = 0    # teks JSON apa adanya (baris lama: NULL)
+FORMAT_DEFLATE = 1 # deflate mentah tanpa header zlib; kolom payload_dict = id dictionary (NULL = tanpa)
+
+# Penghitung untuk stats()
+COUNTERS = ("rows_plain", "rows_compressed", "bytes_in", "bytes_out", "compress_attempts", "compress_ns",
+            "rows_decompressed", "decompress_ns")
+# Payload sampai ukuran ini dikompresi dengan window kecil (lihat compress)
+SMALL_PAYLOAD_BYTES = 2048
+
+# Token string JSON (key beserta ':' atau nilai string), kandidat isi dictionary
+_STRING_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"\s*:?')
+
+
+def train_dictionary(samples: list[bytes], max_bytes: int) -> bytes:
+    """
+    Melatih dictionary deflate dari sampel payload: token string/key yang muncul di banyak
+    sampel, diurutkan dari yang paling jarang ke paling sering (referensi ke byte di akhir
+    dictionary paling murah), ditutup satu sampel utuh sebagai contoh struktur dan angka.
+    """
+    document_counts = Counter()
+    for sample in samples:
+        document_counts.update(set(_STRING_TOKEN.findall(sample)))
+    min_count = max(2, len(samples) // 10)
+    tokens = [token for token, count in document_counts.items() if count >= min_count]
+    tokens.sort(key=lambda token: (document_counts[token], len(token)))
+    return (b"".join(tokens) + samples[-1])[-max_bytes:]
+
+
+def compress(data: bytes, level: int, zdict: bytes | None = None) -> bytes:
+    # Payload kecil cukup dengan window 4 KB (zlib otomatis hanya memakai 4 KB terakhir
+    # dictionary) dan memLevel 4: state deflate ~24 KB, bukan ~320 KB per baris, jadi alokasinya
+    # murah. Decompressor window 32 KB tetap bisa membaca keduanya.
+    wbits, mem_level = (-12, 4) if len(data) <= SMALL_PAYLOAD_BYTES else (-15, 8)
+    compressor = (zlib.compressobj(level, zlib.DEFLATED, wbits, mem_level, zdict=zdict) if zdict
+                  else zlib.compressobj(level, zlib.DEFLATED, wbits, mem_level))
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(blob: bytes, zdict: bytes | None = None) -> bytes:
+    decompressor = zlib.decompressobj(-15, zdict=zdict) if zdict else zlib.decompressobj(-15)
+    return decompressor.decompress(blob) + decompressor.flush()
+
+
+class PayloadCodec:
+    """
+    State kompresi satu proses: cache dictionary (topic, id) -> bytes untuk baca dan tulis,
+    dictionary aktif per topic untuk penulisan, sampel topic yang belum punya dictionary,
+    dan penghitung rasio/biaya CPU untuk /stats.
+    Penulisan satu topic selalu di bawah lock writer partisinya; lock di sini hanya menjaga
+    penghitung dan cache yang juga diakses jalur baca.
+    """
+
+    def __init__(self):
+        self.dictionaries: dict[tuple[str, int], bytes] = {}
+        self._active: dict[str, tuple[int, bytes] | None] = {}
+        self._samples: dict[str, list[bytes]] = {}
+        self._sample_bytes: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def clear(self):
+        """Melupakan semua state dan penghitung (DB ditutup/dihapus)."""
+        with self._lock:
+            self.dictionaries.clear()
+            self._active.clear()
+            self._samples.clear()
+            self._sample_bytes.clear()
+            self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def forget(self, topics):
+        """Dictionary aktif topic dimuat ulang dari DB (transaksi yang menyimpannya di-rollback)."""
+        for topic in topics:
+            self._active.pop(topic, None)
+
+    def has_active(self, topic: str) -> bool:
+        return topic in self._active
+
+    def active(self, topic: str) -> tuple[int, bytes] | None:
+        return self._active.get(topic)
+
+    def set_active(self, topic: str, dictionary: tuple[int, bytes] | None):
+        self._active[topic] = dictionary
+        if dictionary is not None:
+            self._samples.pop(topic, None)
+            self._sample_bytes.pop(topic, None)
+            with self._lock:
+                self.dictionaries[(topic, dictionary[0])] = dictionary[1]
+
+    def add_sample(self, topic: str, data: bytes, needed: int, max_bytes: int) -> list[bytes] | None:
+        """
+        Menyimpan sampel; mengembalikan semua sampel jika sudah cukup untuk melatih dictionary
+        (needed sampel, atau total max_bytes agar memori per topic yang menunggu tetap kecil).
+        """
+        samples = self._samples.setdefault(topic, [])
+        samples.append(data)
+        self._sample_bytes[topic] = self._sample_bytes.get(topic, 0) + len(data)
+        if len(samples) >= needed or self._sample_bytes[topic] >= max_bytes:
+            return samples
+        return None
+
+    def encode(self, text: str, level: int, min_bytes: int, dictionary: tuple[int, bytes] | None):
+        """
+        (nilai kolom payload, payload_fmt, payload_dict). Payload di bawah min_bytes, atau yang
+        tidak mengecil setelah dikompresi, disimpan sebagai teks JSON.
+        """
+        data = text.encode("utf-8")
+        if len(data) < min_bytes:
+            self._count_write("rows_plain", len(data), len(data))
+            return text, None, None
+        started = time.perf_counter()
+        blob = compress(data, level, dictionary[1] if dictionary else None)
+        elapsed_ns = int((time.perf_counter() - started) * 1e9)
+        if len(blob) >= len(data):
+            self._count_write("rows_plain", len(data), len(data), elapsed_ns)
+            return text, None, None
+        self._count_write("rows_compressed", len(data), len(blob), elapsed_ns)
+        return blob, FORMAT_DEFLATE, dictionary[0] if dictionary else None
+
+    def decode(self, topic: str, value, fmt: int | None, dict_id: int | None) -> str:
+        """Teks JSON payload dari nilai kolom (dictionary harus sudah ada di cache)."""
+        if not fmt:
+            return value or "{}"
+        if fmt != FORMAT_DEFLATE:
+            raise ValueError(f"Format payload tidak dikenal: {fmt}")
+        started = time.perf_counter()
+        text = decompress(value, self.dictionaries[(topic, dict_id)] if dict_id is not None else None).decode("utf-8")
+        elapsed_ns = int((time.perf_counter() - started) * 1e9)
+        with self._lock:
+            self._counters["rows_decompressed"] += 1
+            self._counters["decompress_ns"] += elapsed_ns
+        return text
+
+    def _count_write(self, row_kind: str, bytes_in: int, bytes_out: int, compress_ns: int | None = None):
+        with self._lock:
+            counters = self._counters
+            counters[row_kind] += 1
+            counters["bytes_in"] += bytes_in
+            counters["bytes_out"] += bytes_out
+            if compress_ns is not None:
+                counters["compress_attempts"] += 1
+                counters["compress_ns"] += compress_ns
+
+    def stats(self) -> dict:
+        """Ringkasan untuk /stats: rasio (byte asli / byte tersimpan) dan biaya CPU per baris."""
+        with self._lock:
+            counters = dict(self._counters)
+            dictionaries = len(self.dictionaries)
+        attempts, rows_decompressed = counters["compress_attempts"], counters["rows_decompressed"]
+        bytes_in, bytes_out = counters["bytes_in"], counters["bytes_out"]
+        return {
+            "rows_compressed": counters["rows_compressed"],
+            "rows_plain": counters["rows_plain"],
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "ratio": round(bytes_in / bytes_out, 3) if bytes_out else None,
+            "compress_us_per_row": round(counters["compress_ns"] / attempts / 1000, 2) if attempts else None,
+            "rows_decompressed": rows_decompressed,
+            "decompress_us_per_row": round(counters["decompress_ns"] / rows_decompressed / 1000, 2) if rows_decompressed else None,
+            "dictionaries": dictionaries,
+        }
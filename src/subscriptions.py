@@ -0,0 +1,118 @@
+# src/subscriptions.py
+# Fan-out event unik ke subscriber /subscribe (Server-Sent Events). Setiap subscriber punya
+# ring buffer terbatas dan kebijakan subscriber lambat. Modul ini hanya di memori (event loop);
+# backfill dari cursor dan format baris dibaca dari SQLite oleh main.py / database.py.
+
+import asyncio
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+# Kebijakan jika ring buffer subscriber penuh
+DROP_OLDEST = "drop_oldest" # event tertua dibuang, client diberi tahu lewat event "gap"
+DISCONNECT = "disconnect"   # koneksi diputus, client resume dari cursor terakhirnya
+POLICIES = (DROP_OLDEST, DISCONNECT)
+
+# Satu event siap kirim: (partisi, rowid, topic, JSON event)
+Item = Tuple[int, int, str, str]
+
+
+class Subscriber:
+    """Satu koneksi /subscribe: filter topic (None = semua), ring buffer, dan status drop/putus."""
+
+    def __init__(self, topic: Optional[str], buffer_size: int, policy: str):
+        self.topic = topic
+        self.buffer: deque = deque()
+        self.buffer_size = max(1, buffer_size)
+        self.policy = policy
+        # Selama backfill dari DB (sejak terdaftar sampai mengejar event terbaru), event yang
+        # terbuang bisa dibaca ulang dari DB, jadi kebijakan disconnect baru berlaku setelahnya
+        self.backfilling = True
+        self.dropped = 0     # total event dibuang (drop_oldest)
+        self.pending_gap = 0 # dibuang sejak terakhir dilaporkan ke client
+        self.closed_reason: Optional[str] = None
+        self._wakeup = asyncio.Event()
+
+    def offer(self, item: Item):
+        if self.closed_reason is not None:
+            return
+        if len(self.buffer) >= self.buffer_size:
+            if self.policy == DISCONNECT and not self.backfilling:
+                self.closed_reason = "slow_consumer"
+                self.buffer.clear()
+                self._wakeup.set()
+                return
+            self.buffer.popleft()
+            self.dropped += 1
+            self.pending_gap += 1
+        self.buffer.append(item)
+        self._wakeup.set()
+
+    def take_all(self) -> List[Item]:
+        items = list(self.buffer)
+        self.buffer.clear()
+        return items
+
+    async def wait(self, timeout: float) -> bool:
+        """Menunggu event baru (atau penutupan); False jika timeout."""
+        if self.buffer or self.closed_reason is not None:
+            return True
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class SubscriptionHub:
+    """
+    Daftar subscriber per topic. publish() dipanggil di event loop (lewat call_soon_threadsafe
+    dari thread writer, berurutan sesuai commit per partisi), biayanya O(event baru x subscriber
+    yang cocok); tanpa subscriber, consumer tidak menyiapkan apa pun.
+    """
+
+    def __init__(self):
+        self._by_topic: Dict[Optional[str], Set[Subscriber]] = {}
+        self.count = 0
+        self.counters = {"published": 0, "delivered": 0, "dropped": 0, "disconnected": 0}
+
+    @property
+    def active(self) -> bool:
+        return self.count > 0
+
+    def subscribe(self, topic: Optional[str], buffer_size: int, policy: str) -> Subscriber:
+        subscriber = Subscriber(topic, buffer_size, policy)
+        self._by_topic.setdefault(topic, set()).add(subscriber)
+        self.count += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._by_topic.get(subscriber.topic)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._by_topic[subscriber.topic]
+        self.count -= 1
+        self.counters["dropped"] += subscriber.dropped
+        if subscriber.closed_reason is not None:
+            self.counters["disconnected"] += 1
+
+    def publish(self, items: List[Item]):
+        self.counters["published"] += len(items)
+        everything = self._by_topic.get(None, ())
+        for item in items:
+            for subscriber in self._by_topic.get(item[2], ()):
+                subscriber.offer(item)
+            for subscriber in everything:
+                subscriber.offer(item)
+
+    def stats(self) -> Dict[str, int]:
+        subscribers = [subscriber for group in self._by_topic.values() for subscriber in group]
+        return {
+            "subscribers": self.count,
+            "buffered": sum(len(subscriber.buffer) for subscriber in subscribers),
+            **self.counters,
+            # dropped = subscriber yang sudah selesai + yang masih terhubung
+            "dropped": self.counters["dropped"] + sum(subscriber.dropped for subscriber in subscribers),
+        }
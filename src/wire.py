@@ -0,0 +1,149 @@
+# src/wire.py
+# Format body di jalur HTTP: Content-Encoding gzip/deflate untuk body /publish (dibaca utuh,
+# dengan batas ukuran hasil dekompresi), MessagePack untuk /publish dan /events, serta
+# kompresi gzip respons /events sesuai Accept-Encoding.
+# MessagePack opsional: tanpa paket msgpack, body msgpack ditolak 415 dan /events 406.
+
+import zlib
+from typing import Any, AsyncIterator, Iterable, List, Optional, Union
+
+from .ingest_stream import UnsupportedEncodingError
+from .models import Event, EVENT_LIST_ADAPTER
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+
+class BodyTooLargeError(Exception):
+    """Body melebihi batas ukuran setelah didekompresi."""
+
+
+class InvalidBodyError(Exception):
+    """Body bukan MessagePack yang valid."""
+
+
+class UnsupportedMediaTypeError(Exception):
+    """Format body/respons tidak tersedia (paket msgpack tidak terpasang)."""
+
+
+def media_type(header: Optional[str]) -> str:
+    """Bagian media type header Content-Type/Accept, tanpa parameter (mis. charset)."""
+    return (header or "").split(";", 1)[0].strip().lower()
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return media_type(content_type) in MSGPACK_MEDIA_TYPES
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    return any(media_type(item) in MSGPACK_MEDIA_TYPES for item in (accept or "").split(","))
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """True jika Accept-Encoding berisi gzip (atau *) dengan q > 0."""
+    for item in (accept_encoding or "").lower().split(","):
+        token, _, params = item.partition(";")
+        if token.strip() not in ("gzip", "x-gzip", "*"):
+            continue
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def decode_body(body: bytes, content_encoding: Optional[str], max_bytes: int) -> bytes:
+    """
+    Body request setelah Content-Encoding (identity, gzip, atau deflate) dibuka. Body gzip boleh
+    berisi beberapa member yang disambung; batas max_bytes berlaku untuk total hasil dekompresi.
+    Raise UnsupportedEncodingError, BodyTooLargeError (melebihi max_bytes setelah dekompresi,
+    melindungi dari "gzip bomb"), atau zlib.error (body rusak/terpotong).
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        return body
+    if encoding in ("gzip", "x-gzip"):
+        wbits = 16 + zlib.MAX_WBITS
+    elif encoding == "deflate":
+        wbits = zlib.MAX_WBITS
+    else:
+        raise UnsupportedEncodingError(f"Content-Encoding tidak didukung: {content_encoding}")
+    parts = []
+    remaining = max_bytes
+    data = body
+    while True:
+        decompressor = zlib.decompressobj(wbits=wbits)
+        decoded = decompressor.decompress(data, remaining + 1)
+        if len(decoded) > remaining or decompressor.unconsumed_tail:
+            raise BodyTooLargeError(f"Body lebih dari {max_bytes} byte setelah didekompresi")
+        if not decompressor.eof:
+            raise zlib.error("data terpotong")
+        parts.append(decoded)
+        remaining -= len(decoded)
+        data = decompressor.unused_data
+        if not data:
+            return b"".join(parts)
+        if wbits == zlib.MAX_WBITS:
+            raise zlib.error("data setelah akhir stream deflate")
+
+
+def parse_events_msgpack(body: bytes) -> List[Event]:
+    """
+    Body MessagePack (satu map event atau array map) langsung divalidasi menjadi Event,
+    tanpa lewat teks JSON. Timestamp boleh string ISO 8601 atau ext timestamp MessagePack.
+    Raise UnsupportedMediaTypeError, InvalidBodyError, atau pydantic.ValidationError (skema).
+    """
+    if msgpack is None:
+        raise UnsupportedMediaTypeError("Body MessagePack butuh paket msgpack (pip install msgpack)")
+    try:
+        data = msgpack.unpackb(body, raw=False, timestamp=3)
+    except (ValueError, TypeError, msgpack.UnpackException) as e:
+        raise InvalidBodyError(f"Body MessagePack tidak valid: {e}")
+    if isinstance(data, list):
+        return EVENT_LIST_ADAPTER.validate_python(data)
+    return [Event.model_validate(data)]
+
+
+def pack_events(events: List[Any]) -> bytes:
+    """Daftar event (dict dengan bentuk sama seperti JSON /events) sebagai array MessagePack."""
+    if msgpack is None:
+        raise UnsupportedMediaTypeError("Respons MessagePack butuh paket msgpack (pip install msgpack)")
+    return msgpack.packb(events, use_bin_type=True)
+
+
+def gzip_bytes(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def gzip_chunks(chunks: Union[Iterable, AsyncIterator], level: int):
+    """Membungkus iterator chunk (str/bytes, sync atau async) menjadi aliran gzip untuk StreamingResponse."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(chunk) -> bytes:
+        return compressor.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+
+    if hasattr(chunks, "__aiter__"):
+        async def async_stream():
+            async for chunk in chunks:
+                out = compress(chunk)
+                if out:
+                    yield out
+            yield compressor.flush()
+        return async_stream()
+
+    def sync_stream():
+        for chunk in chunks:
+            out = compress(chunk)
+            if out:
+                yield out
+        yield compressor.flush()
+    return sync_stream()
@@ -0,0 +1,65 @@
+# src/workers.py
+# Dukungan multi-proses (uvicorn --workers N): lock antar proses dan identitas worker.
+# State bersama (event, dedup, statistik durable) ada di SQLite; di sini hanya koordinasi.
+
+import logging
+import os
+import socket
+
+try:
+    import fcntl
+except ImportError: # Windows: tidak ada flock, mode multi-worker tidak didukung
+    fcntl = None
+
+# Identitas worker ini (unik per proses, juga antar host yang berbagi volume data)
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+
+class InterProcessLock:
+    """
+    Lock eksklusif antar proses berbasis flock() pada file di folder data.
+    Dilepas otomatis oleh OS jika proses pemegangnya mati, jadi tidak ada lock yatim.
+    Tanpa fcntl (non-POSIX) lock selalu berhasil: aman untuk satu worker saja.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Mengambil lock; dengan blocking=False mengembalikan False jika dipegang proses lain."""
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        handle = open(self.path, "a+")
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                handle.close()
+                return False
+        self._file = handle
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+if fcntl is None:
+    logging.warning("fcntl tidak tersedia: lock antar worker dinonaktifkan, jalankan dengan satu worker saja.")
@@ -5,36 +5,34 @@ import pytest
 import pytest_asyncio
 import os
 import asyncio
-import anyio 
 import logging # <- Tambahkan logging
+import json
+import gzip
 from httpx import AsyncClient, ASGITransport
 
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# Impor app untuk transport, stats & storage untuk reset, consumer_task untuk dijalankan
-from src.main import app, stats, unique_events_storage, consumer_task 
-from src.database import setup_database, DB_NAME
+# Impor app untuk transport, stats untuk reset, consumer_task untuk dijalankan
+from src import main as main_module
+from src.main import app, stats, consumer_task, shard_for, shard_queues
+from src.database import setup_database, close_database, delete_database_files, insert_events_batch
 from src.models import Event
 
 # JANGAN impor event_queue global lagi
 
-# --- Fungsi Helper (Masih Sama) ---
+# --- Fungsi Helper ---
 async def wait_for_queue(q: asyncio.Queue, timeout=2.0): # Timeout dinaikkan sedikit
-    """Menunggu sampai queue kosong atau timeout."""
-    start_time = asyncio.get_event_loop().time()
-    processed_count = 0 # Tambahan logging
-    while not q.empty():
-        processed_in_loop = q.qsize() # Logging tambahan
-        if asyncio.get_event_loop().time() - start_time > timeout:
-            logging.error(f"TIMEOUT! Queue masih berisi {q.qsize()} item setelah {timeout} detik.")
-            raise asyncio.TimeoutError("Queue tidak kosong dalam batas waktu.")
-        await asyncio.sleep(0.05) # Tidur sedikit lebih lama
-        # Logging tambahan: cek apakah item berkurang
-        if q.qsize() < processed_in_loop:
-             processed_count += (processed_in_loop - q.qsize())
-             # logging.info(f"Consumer memproses {processed_in_loop - q.qsize()} item, sisa {q.qsize()}")
-    # logging.info(f"Queue kosong setelah memproses total {processed_count} item.")
+    """
+    Menunggu sampai semua event di queue SELESAI diproses atau timeout.
+    Pakai q.join() (bukan q.empty()) karena consumer mengambil event dalam batch,
+    sehingga queue bisa kosong sebelum batch selesai ditulis ke DB.
+    """
+    try:
+        await asyncio.wait_for(q.join(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logging.error(f"TIMEOUT! Queue masih berisi {q.qsize()} item setelah {timeout} detik.")
+        raise asyncio.TimeoutError("Queue tidak selesai diproses dalam batas waktu.")
 
 
 # --- Fixture (Setup Tes) ---
@@ -42,8 +40,7 @@ async def wait_for_queue(q: asyncio.Queue, timeout=2.0): # Timeout dinaikkan sed
 async def test_app_with_consumer(): # Nama diubah agar lebih jelas
     """Fixture yang menjalankan consumer di background DENGAN queue tes lokal."""
     
-    if os.path.exists(DB_NAME):
-        os.remove(DB_NAME)
+    delete_database_files()
     setup_database()
 
     # Reset state global (kecuali queue)
@@ -51,39 +48,34 @@ async def test_app_with_consumer(): # Nama diubah agar lebih jelas
     stats["unique_processed"] = 0
     stats["duplicate_dropped"] = 0
     stats["topics"].clear()
-    unique_events_storage.clear()
+    stats["rejected_events"] = 0
+    stats["rejected_requests"] = 0
+    main_module.dedup_cache.clear()
+    main_module.event_stats.clear()
+    for shard in main_module.shard_stats:
+        shard.update(processed=0, window_count=0, high_water=0)
     
-    # --- PERUBAHAN UTAMA DI SINI ---
     # Buat queue BARU khusus untuk tes ini
     test_queue = asyncio.Queue()
-    # -----------------------------
-
-    consumer_task_handle = None # Inisialisasi handle
 
+    # Mulai consumer task dengan queue TES.
+    # Pakai asyncio.create_task (bukan anyio task group) karena setup & teardown
+    # fixture async bisa berjalan di task yang berbeda.
+    consumer_task_handle = asyncio.create_task(consumer_task(test_queue))
     try:
-        async with anyio.create_task_group() as tg:
-            # --- PERUBAHAN UTAMA DI SINI ---
-            # Mulai consumer task dengan queue TES
-            consumer_task_handle = tg.start_soon(consumer_task, test_queue)
-            # -----------------------------
-            
-            # Siapkan HTTP client (tetap pakai 'app' global untuk routing)
-            transport = ASGITransport(app=app)
-            async with AsyncClient(transport=transport, base_url="http://test") as client:
-                # --- PERUBAHAN UTAMA DI SINI ---
-                # Berikan client DAN queue tes ke fungsi tes
-                yield client, test_queue 
-                # -----------------------------
-            
-            # Setelah tes selesai, batalkan consumer task
-            if consumer_task_handle: # Pastikan handle ada
-                 tg.cancel_scope.cancel()
-
-    except asyncio.CancelledError:
-        pass # Normal saat cancel
-    except Exception as e:
-         logging.error(f"Error dalam fixture test_app_with_consumer: {e}", exc_info=True)
-         pytest.fail(f"Fixture setup failed: {e}")
+        # Siapkan HTTP client (tetap pakai 'app' global untuk routing)
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            # Berikan client DAN queue tes ke fungsi tes
+            yield client, test_queue 
+    finally:
+        # Setelah tes selesai, batalkan consumer task
+        consumer_task_handle.cancel()
+        try:
+            await consumer_task_handle
+        except asyncio.CancelledError:
+            pass # Normal saat cancel
+        close_database()
 
 
 # --- Tes (Dimodifikasi sedikit untuk menerima queue) ---
@@ -143,7 +135,7 @@ async def test_3_get_stats_and_events_consistency(test_app_with_consumer):
 
     await wait_for_queue(test_queue)
     
-    # API GET tetap bisa dipakai karena membaca state global
+    # API GET tetap bisa dipakai: /stats membaca state global, /events membaca SQLite
     response_stats = await client.get("/stats")
     assert response_stats.status_code == 200
     stats_data = response_stats.json()
@@ -218,4 +210,1159 @@ async def test_6_schema_validation_fail(test_app_with_consumer):
     invalid_data = {"event_id": "e-invalid", "source": "pytest", "payload": "salah"}
     # API POST HARUS gagal karena skema salah
     response = await client.post("/publish", json=invalid_data)
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_7_batch_insert_per_row_outcome(test_app_with_consumer):
+    # Satu transaksi: hasil per baris harus sejajar dengan input,
+    # termasuk duplikat di dalam batch yang sama dan duplikat dari batch sebelumnya.
+    event_a = Event(**{"topic": "bulk", "event_id": "x1", "source": "pytest", "payload": {"n": 1}})
+    event_b = Event(**{"topic": "bulk", "event_id": "x2", "source": "pytest", "payload": {"n": 2}})
+    assert insert_events_batch([event_a, event_b, event_a]) == [True, True, False]
+    assert insert_events_batch([event_b, Event(**{"topic": "other", "event_id": "x2", "source": "pytest", "payload": {}})]) == [False, True]
+
+@pytest.mark.asyncio
+async def test_8_sharding_and_shard_stats(test_app_with_consumer):
+    client, _ = test_app_with_consumer
+    # Hash stabil: key yang sama selalu masuk shard yang sama (urutan & dedup per key terjaga)
+    assert shard_for("topic-a", "id-1") == shard_for("topic-a", "id-1")
+    assert all(0 <= shard_for("t", f"id-{i}") < len(shard_queues) for i in range(100))
+    # Lebih dari satu partisi: shard = partisi topic, jadi satu batch consumer hanya menyentuh satu partisi
+    from src import config
+    from src.database import partition_for
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(config, "STORAGE_PARTITIONS", 3)
+        topics = [f"topic-{i}" for i in range(20)]
+        assert all(shard_for(t, f"id-{i}", 3) == partition_for(t, 3) for t in topics for i in range(5))
+
+    response = await client.get("/stats")
+    shards = response.json()["shards"]
+    assert len(shards) == len(shard_queues)
+    assert {"shard", "queue_depth", "processed", "rate_per_sec"} <= set(shards[0])
+
+@pytest.mark.asyncio
+async def test_9_backpressure_all_or_nothing(test_app_with_consumer, monkeypatch):
+    client, _ = test_app_with_consumer
+    # Ganti queue global dengan queue kecil (tidak ada consumer, jadi cepat penuh)
+    small_queues = [asyncio.Queue(maxsize=2) for _ in shard_queues]
+    monkeypatch.setattr(main_module, "shard_queues", small_queues)
+
+    first = {"topic": "bp", "event_id": "bp-0", "source": "pytest", "payload": {}}
+    assert (await client.post("/publish", json=first)).status_code == 202
+
+    # Isi sampai ada shard yang penuh, lalu batch berikutnya harus ditolak utuh
+    for i in range(1, 100):
+        event = {"topic": "bp", "event_id": f"bp-{i}", "source": "pytest", "payload": {}}
+        response = await client.post("/publish", json=event)
+        if response.status_code == 429:
+            break
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    depth_before = [q.qsize() for q in small_queues]
+    batch = [{"topic": "bp", "event_id": f"bp-batch-{i}", "source": "pytest", "payload": {}} for i in range(4)]
+    response = await client.post("/publish", json=batch)
+    assert response.status_code in (413, 429)
+    assert [q.qsize() for q in small_queues] == depth_before # tidak ada event yang masuk sebagian
+    assert stats["received"] == sum(depth_before)
+
+    stats_data = (await client.get("/stats")).json()
+    assert stats_data["rejected_events (since_restart)"] >= 1
+    assert max(shard["queue_high_water"] for shard in stats_data["shards"]) == 2
+
+@pytest.mark.asyncio
+async def test_10_dedup_cache_front_layer(test_app_with_consumer):
+    client, test_queue = test_app_with_consumer
+    cache = main_module.dedup_cache
+    event = Event(**{"topic": "cache", "event_id": "c1", "source": "pytest", "payload": {}})
+
+    # Pertama: Bloom bilang pasti baru -> ditulis ke SQLite
+    await test_queue.put(event)
+    await wait_for_queue(test_queue)
+    assert cache.counters["bloom_definitely_new"] == 1
+
+    # Retry: dijawab LRU tanpa menyentuh SQLite
+    lookups_before = cache.counters["sqlite_lookups"]
+    await test_queue.put(event)
+    await wait_for_queue(test_queue)
+    assert cache.counters["lru_hits"] == 1
+    assert cache.counters["sqlite_lookups"] == lookups_before
+    assert stats["unique_processed"] == 1
+    assert stats["duplicate_dropped"] == 1
+
+    # Setelah cache dikosongkan (mis. restart), SQLite tetap sumber kebenaran
+    cache.clear()
+    await test_queue.put(event)
+    await wait_for_queue(test_queue)
+    assert stats["duplicate_dropped"] == 2
+    assert cache.counters["sqlite_lookups"] == 1
+
+    stats_data = (await client.get("/stats")).json()
+    assert stats_data["dedup_cache"]["lru_entries"] == 1
+
+
+def test_11_bloom_filter_no_false_negatives():
+    from src.dedup_cache import BloomFilter
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"id-{i}")
+    assert all(f"id-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300 # ~1% target, beri ruang
+
+    # Budget memori dipatuhi
+    assert BloomFilter(capacity=10**7, error_rate=0.01, max_bytes=1024).size_bytes <= 1024
+
+@pytest.mark.asyncio
+async def test_12_events_keyset_pagination(test_app_with_consumer):
+    client, test_queue = test_app_with_consumer
+    for i in range(5):
+        await test_queue.put(Event(**{"topic": "page", "event_id": f"p{i}", "source": "pytest", "payload": {"i": i}}))
+    await test_queue.put(Event(**{"topic": "other", "event_id": "o1", "source": "pytest", "payload": {}}))
+    await wait_for_queue(test_queue)
+
+    seen = []
+    response = await client.get("/events?topic=page&limit=2")
+    while True:
+        assert response.status_code == 200
+        seen.extend(event["event_id"] for event in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        response = await client.get(f"/events?topic=page&limit=2&after={cursor}")
+    assert sorted(seen) == [f"p{i}" for i in range(5)]
+    assert len(seen) == 5
+
+    assert (await client.get("/events?after=bukan-cursor")).status_code == 400
+    # Angka cursor harus digit saja: int() menerima "_", spasi dan "+", cursor ini tetap ditolak
+    partitions = len((await client.get("/events?limit=1")).headers["X-Next-Cursor"].split(","))
+    for bad in ["1_2_3", " 1_2", "1_+2", "1_-2", "1_2 "]:
+        response = await client.get("/events", params={"after": ",".join([bad] * partitions)})
+        assert response.status_code == 400, bad
+    assert (await client.get("/events", params={"after": ",".join(["-5_0"] * partitions)})).status_code == 200
+
+@pytest.mark.asyncio
+async def test_13_events_ndjson_stream(test_app_with_consumer):
+    client, test_queue = test_app_with_consumer
+    for i in range(3):
+        await test_queue.put(Event(**{"topic": "nd", "event_id": f"n{i}", "source": "pytest", "payload": {"i": i, "s": "a\"b"}}))
+    await test_queue.put(Event(**{"topic": "other", "event_id": "x", "source": "pytest", "payload": {}}))
+    await wait_for_queue(test_queue)
+
+    response = await client.get("/events?topic=nd", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["event_id"] for line in lines] == ["n0", "n1", "n2"]
+    assert lines[0]["payload"] == {"i": 0, "s": "a\"b"}
+    # Hasilnya tetap valid sebagai Event
+    Event(**lines[0])
+
+    # Filter waktu: semua event diproses sebelum "besok"
+    response = await client.get("/events?format=ndjson&until=2999-01-01T00:00:00")
+    assert len(response.text.splitlines()) == 4
+    response = await client.get("/events?format=ndjson&since=2999-01-01T00:00:00")
+    assert response.text == ""
+
+@pytest.mark.asyncio
+async def test_14_publish_stream_ndjson(test_app_with_consumer, monkeypatch):
+    client, _ = test_app_with_consumer
+    captured = []
+    async def fake_enqueue(events, wait_seconds=None):
+        captured.extend(events)
+    monkeypatch.setattr(main_module, "enqueue_events", fake_enqueue)
+
+    lines = [
+        json.dumps({"topic": "s", "event_id": "s1", "source": "pytest", "payload": {}}),
+        "",                                     # baris kosong dilewati
+        "{bukan json",                          # baris 3 rusak
+        json.dumps({"topic": "s", "event_id": "s2", "source": "pytest", "payload": "salah"}), # baris 4 skema salah
+        json.dumps({"topic": "s", "event_id": "s3", "source": "pytest", "payload": {"k": 1}}),
+    ]
+    body = ("\n".join(lines)).encode()
+
+    async def chunked():
+        # Kirim dalam potongan kecil agar baris terpotong di tengah chunk
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    response = await client.post("/publish/stream", content=chunked())
+    assert response.status_code == 202
+    result = response.json()
+    assert result["accepted"] == 2
+    assert result["rejected"] == 2
+    assert [error["line"] for error in result["errors"]] == [3, 4]
+    assert [event.event_id for event in captured] == ["s1", "s3"]
+
+    # Body gzip
+    captured.clear()
+    response = await client.post("/publish/stream", content=gzip.compress(body), headers={"Content-Encoding": "gzip"})
+    assert response.json()["accepted"] == 2
+    assert len(captured) == 2
+
+    # Beberapa member gzip yang disambung: semua member dibaca
+    captured.clear()
+    parts = [gzip.compress((line + "\n").encode()) for line in (lines[0], lines[4], lines[0].replace("s1", "s4"))]
+    response = await client.post("/publish/stream", content=b"".join(parts), headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 202 and response.json()["accepted"] == 3
+    assert [event.event_id for event in captured] == ["s1", "s3", "s4"]
+
+    # gzip terpotong: 400 dengan ringkasan, bukan 202
+    response = await client.post("/publish/stream", content=gzip.compress(body)[:-8], headers={"Content-Encoding": "gzip"})
+    assert response.status_code == 400 and "committed_line" in response.json()["detail"]
+
+    response = await client.post("/publish/stream", content=body, headers={"Content-Encoding": "br"})
+    assert response.status_code == 415
+
+def test_15_fast_path_codec():
+    from datetime import datetime, timezone, timedelta
+    from pydantic import ValidationError
+    from src.models import parse_events_json, datetime_to_us, us_to_datetime
+
+    single = parse_events_json(b'{"topic": "c", "event_id": "1", "source": "s", "payload": {"a": [1, 2]}}')
+    batch = parse_events_json(b' [{"topic": "c", "source": "s", "payload": {}}, {"topic": "c", "source": "s", "payload": {}}]')
+    assert len(single) == 1 and len(batch) == 2
+    assert json.loads(single[0].payload_json) == {"a": [1, 2]}
+    with pytest.raises(ValidationError):
+        parse_events_json(b'[{"topic": "c"}]')
+
+    # Timestamp ringkas: round-trip presisi mikrodetik, timezone dinormalisasi ke UTC
+    naive = datetime(2024, 5, 1, 10, 2, 3, 456789)
+    assert us_to_datetime(datetime_to_us(naive)) == naive
+    aware = datetime(2024, 5, 1, 17, 2, 3, 456789, tzinfo=timezone(timedelta(hours=7)))
+    assert us_to_datetime(datetime_to_us(aware)) == naive
+
+@pytest.mark.asyncio
+async def test_16_durable_stats(test_app_with_consumer):
+    client, test_queue = test_app_with_consumer
+    from src.database import get_event_stats
+    event = Event(**{"topic": "durable", "event_id": "d1", "source": "svc-a", "payload": {}})
+    other = Event(**{"topic": "durable", "event_id": "d2", "source": "svc-b", "payload": {}})
+    for e in (event, event, other):
+        await test_queue.put(e)
+    await wait_for_queue(test_queue)
+
+    # Tersimpan di DB, termasuk duplikat yang dijawab cache tanpa menyentuh tabel event
+    persisted = get_event_stats()
+    assert persisted[("durable", "svc-a")]["received"] == 2
+    assert persisted[("durable", "svc-a")]["unique"] == 1
+    assert persisted[("durable", "svc-a")]["duplicate"] == 1
+    assert persisted[("durable", "svc-b")]["unique"] == 1
+    assert persisted[("durable", "svc-a")]["last_seen_us"] is not None
+
+    stats_data = (await client.get("/stats")).json()
+    assert stats_data["by_topic"]["durable"]["unique"] == 2
+    assert stats_data["by_topic"]["durable"]["duplicate"] == 1
+    assert stats_data["by_source"]["svc-a"]["received"] == 2
+    assert stats_data["by_source"]["svc-b"]["last_seen"] is not None
+
+@pytest.mark.asyncio
+async def test_17_metrics_endpoint(test_app_with_consumer):
+    client, test_queue = test_app_with_consumer
+    from src.metrics import Histogram, TimedQueue, QUEUE_WAIT
+
+    # Estimasi kuantil dari bucket tetap
+    hist = Histogram((0.001, 0.01, 0.1))
+    for _ in range(90):
+        hist.observe(0.0005)
+    for _ in range(10):
+        hist.observe(0.05)
+    assert hist.quantile(0.5) <= 0.001
+    assert 0.01 < hist.quantile(0.99) <= 0.1
+
+    # TimedQueue mencatat lama antre
+    before = QUEUE_WAIT.count
+    timed = TimedQueue()
+    await timed.put("x")
+    assert await timed.get() == "x"
+    assert QUEUE_WAIT.count == before + 1
+
+    await test_queue.put(Event(**{"topic": "m", "event_id": "m1", "source": "pytest", "payload": {}}))
+    await wait_for_queue(test_queue)
+    await client.post("/publish", json={"topic": "m", "event_id": "m2", "source": "pytest", "payload": {}})
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    text = response.text
+    assert '# TYPE aggregator_stage_seconds histogram' in text
+    assert 'aggregator_stage_seconds_count{stage="storage_write"}' in text
+    assert 'aggregator_stage_seconds_bucket{stage="publish_parse",le="+Inf"}' in text
+    assert 'aggregator_events_unique_total 1' in text
+
+    latency = (await client.get("/stats")).json()["latency_ms"]
+    assert latency["storage_write"]["count"] >= 1
+    assert latency["storage_write"]["p50"] is not None
+
+@pytest.mark.asyncio
+async def test_18_compact_queued_events(test_app_with_consumer, monkeypatch):
+    from src.models import CompactEvent
+    client, test_queue = test_app_with_consumer
+    # Queue tanpa consumer agar isi queue bisa diperiksa
+    idle_queues = [asyncio.Queue() for _ in shard_queues]
+    monkeypatch.setattr(main_module, "shard_queues", idle_queues)
+
+    batch = [{"topic": "compact", "event_id": f"k{i}", "source": "pytest", "payload": {"i": i}} for i in range(4)]
+    assert (await client.post("/publish", json=batch)).status_code == 202
+    queued = [q.get_nowait() for q in idle_queues for _ in range(q.qsize())]
+    assert len(queued) == 4 and all(isinstance(event, CompactEvent) for event in queued)
+    assert not hasattr(queued[0], "__dict__")
+    assert all(event.topic is queued[0].topic for event in queued) # topic di-intern
+    assert json.loads(queued[0].payload_json) == {"i": int(queued[0].event_id[1:])}
+
+    # Jalur tulis menerima bentuk ringkas apa adanya
+    await test_queue.put(queued[0])
+    await test_queue.put(queued[0])
+    await wait_for_queue(test_queue)
+    events = (await client.get("/events?topic=compact")).json()
+    assert [event["event_id"] for event in events] == [queued[0].event_id]
+    assert stats["unique_processed"] == 1 and stats["duplicate_dropped"] == 1
+
+@pytest.mark.asyncio
+async def test_19_retention_purge(test_app_with_consumer, monkeypatch):
+    from src import config, database
+    monkeypatch.setattr(config, "RETENTION_SECONDS", 3600)
+    monkeypatch.setattr(config, "RETENTION_TOPICS", {"keep.*": 0})
+    assert database.retention_window("old") == 3600 and database.retention_window("keep.audit") == 0
+
+    old = [Event(topic="old", event_id=f"o{i}", source="pytest", payload={}) for i in range(5)]
+    kept = [Event(topic="keep.audit", event_id=f"k{i}", source="pytest", payload={}) for i in range(3)]
+    insert_events_batch(old + kept)
+    # Semua baris di atas seolah diproses 2 jam lalu
+    for partition in range(len(database._partitions)):
+        with database._writer(partition) as conn:
+            conn.execute("UPDATE processed_events SET processed_at = datetime('now', '-2 hours')")
+    fresh = Event(topic="old", event_id="fresh", source="pytest", payload={})
+    insert_events_batch([fresh])
+    counts_before = database.get_topic_counts()
+
+    assert database.purge_expired_events(batch_size=2, pause_seconds=0) == 5
+    client, _ = test_app_with_consumer
+    remaining = {event["event_id"] for event in (await client.get("/events")).json()}
+    assert remaining == {"k0", "k1", "k2", "fresh"}
+    assert database.get_topic_counts() == counts_before # statistik historis tidak berubah
+
+    # Di luar jendela retensi event yang sama dianggap baru lagi
+    assert insert_events_batch([old[0], fresh]) == [True, False]
+
+    # DB baru memakai auto_vacuum INCREMENTAL
+    with database._writer() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert database.incremental_vacuum(1000) >= 0
+
+@pytest.mark.asyncio
+async def test_20_storage_partitions_and_migration(test_app_with_consumer, monkeypatch):
+    from src import database
+    client, _ = test_app_with_consumer
+    topics = [f"part-{i}" for i in range(6)]
+    events = [Event(topic=topic, event_id=f"e{i}", source="pytest", payload={"i": i}) for topic in topics for i in range(3)]
+    insert_events_batch(events)
+    stats_before = database.get_event_stats()
+
+    # DB satu file dimigrasi ke 3 partisi saat startup
+    close_database()
+    monkeypatch.setattr(database, "_partitions", [database._Partition(i) for i in range(3)])
+    setup_database()
+    assert database.get_event_stats() == stats_before
+    assert len({database.partition_for(topic) for topic in topics}) > 1
+    for topic in topics:
+        conn = database._open_read_connection(database.partition_for(topic))
+        assert conn.execute("SELECT COUNT(*) FROM processed_events WHERE topic = ?", (topic,)).fetchone()[0] == 3
+        conn.close()
+        assert len((await client.get(f"/events?topic={topic}")).json()) == 3
+
+    # Pagination lintas partisi: cursor komposit, setiap event muncul tepat sekali
+    seen, cursor = [], None
+    while True:
+        response = await client.get("/events", params={"limit": 4, **({"after": cursor} if cursor else {})})
+        seen += [(event["topic"], event["event_id"]) for event in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        assert len(cursor.split(",")) == 3
+    assert sorted(seen) == sorted((event.topic, event.event_id) for event in events)
+    ndjson = await client.get("/events?format=ndjson")
+    assert len(ndjson.text.splitlines()) == len(events)
+    assert (await client.get("/events?after=1")).status_code == 400
+
+    # Dedup tetap berlaku setelah migrasi
+    assert insert_events_batch(events[:4]) == [False] * 4
+
+    # Kembali ke satu partisi: file partisi sisa digabung lalu dihapus
+    close_database()
+    monkeypatch.setattr(database, "_partitions", [database._Partition(0)])
+    setup_database()
+    assert not os.path.exists(database.partition_path(1))
+    assert len((await client.get("/events")).json()) == len(events)
+    assert database.get_topic_counts() == {topic: 3 for topic in topics}
+
+@pytest.mark.asyncio
+async def test_21_multi_worker_shared_stats(test_app_with_consumer, monkeypatch, tmp_path):
+    from src import database
+    from src.workers import InterProcessLock
+    client, test_queue = test_app_with_consumer
+    monkeypatch.setattr(main_module, "MULTI_WORKER", True)
+
+    # Worker ini memproses 1 event; "worker lain" menulis 2 event (1 duplikat) langsung ke DB bersama
+    await test_queue.put(Event(topic="mw", event_id="a", source="w1", payload={}))
+    await wait_for_queue(test_queue)
+    other = [Event(topic="mw", event_id="a", source="w2", payload={}), Event(topic="mw", event_id="b", source="w2", payload={})]
+    assert insert_events_batch(other) == [False, True]
+    snapshot = main_module._worker_snapshot()
+    snapshot.update(rejected_events=7, maintenance=True)
+    snapshot["shards"] = [{**shard, "queue_depth": 3 if shard["shard"] == 0 else 0} for shard in snapshot["shards"]]
+    snapshot["histograms"]["stage_seconds"] = {"publish_total": {"counts": [5] + [0] * 17, "sum": 0.0002, "count": 5}}
+    database.write_worker_status("other-host-1", 1, snapshot, 60)
+
+    data = (await client.get("/stats")).json()
+    assert data["unique_processed"] == 2 and data["duplicate_dropped"] == 1
+    local_queued = sum(queue.qsize() for queue in shard_queues)
+    assert data["received"] == 3 + 3 + local_queued # diproses + masih mengantre di semua worker
+    assert data["by_source"]["w2"]["unique"] == 1
+    assert data["rejected_events (since_restart)"] == 7
+    assert data["latency_ms"]["publish_total"]["count"] >= 5
+    assert [w["worker_id"] for w in data["workers"]] == sorted(["other-host-1", main_module.WORKER_ID])
+    metrics_text = (await client.get("/metrics")).text
+    assert "aggregator_events_unique_total 2" in metrics_text
+    assert 'aggregator_queue_depth{worker="other-host-1",shard="0"} 3' in metrics_text
+
+    # Snapshot worker yang tidak diperbarui lagi (mati) diabaikan
+    with database._writer(0) as conn:
+        conn.execute("UPDATE worker_status SET updated_at = updated_at - 3600 WHERE worker_id = 'other-host-1'")
+    data = (await client.get("/stats")).json()
+    assert [w["worker_id"] for w in data["workers"]] == [main_module.WORKER_ID]
+    assert data["received"] == 3 + local_queued
+
+    # Lock pemeliharaan: hanya satu pemegang, bisa diambil alih setelah dilepas
+    first, second = InterProcessLock(str(tmp_path / "m.lock")), InterProcessLock(str(tmp_path / "m.lock"))
+    assert first.acquire(blocking=False) and not second.acquire(blocking=False)
+    first.release()
+    assert second.acquire(blocking=False)
+    second.release()
+
+@pytest.mark.asyncio
+async def test_22_ingest_log_replay_and_truncation(test_app_with_consumer, monkeypatch, tmp_path):
+    from src.ingest_log import IngestLog, mark_done, SEGMENT_PREFIX
+    from src.models import CompactEvent
+    client, test_queue = test_app_with_consumer
+
+    def batch(prefix, n):
+        return [CompactEvent("wal", f"{prefix}{i}", "pytest", 1_700_000_000_000_000 + i, '{"i":%d}' % i) for i in range(n)]
+
+    folder = str(tmp_path / "slot-0")
+    log = IngestLog(folder, segment_bytes=64 * 1024)
+    assert log.open() == 0
+    log.start()
+    first, second = batch("a", 3), batch("b", 2)
+    records = [log.append(first), log.append(second)]
+    await asyncio.gather(*(log.wait_durable(record.seq) for record in records))
+    mark_done(first) # batch pertama tersimpan di SQLite, batch kedua belum
+    await log.close()
+
+    # "Crash": ekor terpotong (append setengah jalan) dibuang, hanya batch yang belum selesai di-replay
+    segment = sorted(p for p in os.listdir(folder) if p.startswith(SEGMENT_PREFIX))[-1]
+    with open(os.path.join(folder, segment), "ab") as f:
+        f.write(b"\x10\x00\x00\x00garbage")
+    log = IngestLog(folder, segment_bytes=64 * 1024)
+    assert log.open() == 2
+    log.start()
+    replayed = [event for events in log.iter_unconsumed() for event in events]
+    assert [(e.event_id, e.payload_json) for e in replayed] == [(e.event_id, e.payload_json) for e in second]
+
+    # Segmen yang seluruh isinya sudah tersimpan dihapus setelah checkpoint maju
+    later = [batch(f"c{i}-", 100) for i in range(30)]
+    for events in later:
+        await log.wait_durable(log.append(events).seq)
+    assert log.stats()["segments"] > 2
+    for events in [replayed] + later:
+        mark_done(events)
+    await log.close()
+    assert len([p for p in os.listdir(folder) if p.startswith(SEGMENT_PREFIX)]) == 1
+    log = IngestLog(folder, segment_bytes=64 * 1024)
+    assert log.open() == 0
+
+    # /publish baru di-ack setelah batch durable di log; checkpoint maju setelah consumer selesai
+    log.start()
+    idle_queues = [asyncio.Queue() for _ in shard_queues]
+    monkeypatch.setattr(main_module, "shard_queues", idle_queues)
+    monkeypatch.setattr(main_module, "ingest_log", log)
+    body = [{"topic": "wal", "event_id": f"p{i}", "source": "pytest", "payload": {}} for i in range(5)]
+    assert (await client.post("/publish", json=body)).status_code == 202
+    assert log.stats()["durable_seq"] == log.stats()["pending_records"] + log.stats()["checkpoint"]
+    queued = [q.get_nowait() for q in idle_queues for _ in range(q.qsize())]
+    for event in queued:
+        await test_queue.put(event)
+    await wait_for_queue(test_queue)
+    assert log.stats()["pending_records"] == 0
+    assert (await client.get("/stats")).json()["ingest_log"]["appended_events"] == 5
+
+    # Gagal tulis sementara: batch dicoba lagi (bukan dibuang), checkpoint maju setelah tersimpan
+    from src import database
+    real_insert, failures = database.insert_events_batch, []
+    def flaky_insert(*args):
+        if len(failures) < 2:
+            failures.append(1)
+            raise RuntimeError("database is locked")
+        return real_insert(*args)
+    monkeypatch.setattr(main_module, "insert_events_batch", flaky_insert)
+    unique_before = stats["unique_processed"]
+    body = [{"topic": "wal", "event_id": f"r{i}", "source": "pytest", "payload": {}} for i in range(3)]
+    assert (await client.post("/publish", json=body)).status_code == 202
+    assert log.stats()["pending_records"] == 1
+    for event in [q.get_nowait() for q in idle_queues for _ in range(q.qsize())]:
+        await test_queue.put(event)
+    await wait_for_queue(test_queue)
+    assert len(failures) == 2 and stats["unique_processed"] == unique_before + 3
+    assert log.stats()["pending_records"] == 0
+    await log.close()
+
+    # Retry setelah sebagian partisi commit: partisi itu tidak ditulis ulang (tidak jadi duplikat)
+    events = [Event(topic=f"retry.{i}", event_id="x", source="pytest", payload={}) for i in range(8)]
+    committed, calls = {}, []
+    real_partition_insert = database._insert_partition_batch
+    def fail_second_partition(partition, *args):
+        calls.append(partition)
+        if len(calls) == 2:
+            raise RuntimeError("database is locked")
+        return real_partition_insert(partition, *args)
+    monkeypatch.setattr(database, "_insert_partition_batch", fail_second_partition)
+    if len({database.partition_for(event.topic) for event in events}) > 1:
+        with pytest.raises(RuntimeError):
+            database.insert_events_batch(events, committed=committed)
+        assert len(committed) == 1
+    assert database.insert_events_batch(events, committed=committed) == [True] * 8
+
+@pytest.mark.asyncio
+async def test_23_events_time_range_source_and_order(test_app_with_consumer):
+    from datetime import datetime, timedelta
+    from src import database
+    client, _ = test_app_with_consumer
+    base = datetime(2024, 5, 1, 10, 0, 0)
+    events = [
+        Event(topic=topic, event_id=f"{topic}-{i}", source=f"svc-{i % 2}", timestamp=base + timedelta(minutes=i), payload={"i": i})
+        for topic in ("inc.a", "inc.b") for i in range(10)
+    ]
+    insert_events_batch(events)
+
+    # topic + source + rentang timestamp event (10:02 - 10:07)
+    params = {"topic": "inc.a", "source": "svc-0", "time_field": "timestamp",
+              "since": "2024-05-01T10:02:00", "until": "2024-05-01T10:07:00"}
+    response = await client.get("/events", params=params)
+    assert [e["event_id"] for e in response.json()] == ["inc.a-2", "inc.a-4", "inc.a-6"]
+    # Urutan terbalik + pagination keyset tanpa topic (lintas partisi jika ada)
+    seen, cursor = [], None
+    while True:
+        page = await client.get("/events", params={"time_field": "timestamp", "order": "desc", "limit": 3,
+                                                   "since": "2024-05-01T10:05:00", **({"after": cursor} if cursor else {})})
+        seen += [(e["timestamp"], e["event_id"]) for e in page.json()]
+        cursor = page.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    timestamps = [timestamp for timestamp, _ in seen]
+    assert len(set(seen)) == 10 and timestamps == sorted(timestamps, reverse=True)
+    ndjson = await client.get("/events", params={**params, "format": "ndjson", "order": "desc"})
+    assert [json.loads(line)["event_id"] for line in ndjson.text.splitlines()] == ["inc.a-6", "inc.a-4", "inc.a-2"]
+    assert (await client.get("/events?time_field=ingest")).status_code == 422
+
+    # processed_at: sebagian event diproses "kemarin"
+    for partition in range(len(database._partitions)):
+        with database._writer(partition) as conn:
+            conn.execute("UPDATE processed_events SET processed_at = datetime('now', '-1 day') WHERE event_id LIKE '%-1'")
+    recent = (await client.get("/events", params={"since": (datetime.utcnow() - timedelta(hours=1)).isoformat()})).json()
+    assert len(recent) == 18 and all(not e["event_id"].endswith("-1") for e in recent)
+
+    # Query dilayani index komposit: range scan tanpa sort tambahan
+    query, query_params = database._build_events_query(
+        "inc.a", (0, 0), base, base + timedelta(minutes=5), 100, "svc-0", "timestamp", True)
+    conn = database._open_read_connection(database.partition_for("inc.a"))
+    plan = " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, query_params))
+    conn.close()
+    assert "idx_events_topic_source_ts" in plan and "TEMP B-TREE" not in plan
+
+@pytest.mark.asyncio
+async def test_24_payload_compression(test_app_with_consumer, monkeypatch):
+    from src import config, database
+    client, _ = test_app_with_consumer
+    monkeypatch.setattr(config, "PAYLOAD_COMPRESSION", True)
+    monkeypatch.setattr(config, "PAYLOAD_COMPRESS_MIN_BYTES", 64)
+    monkeypatch.setattr(config, "PAYLOAD_DICT_SAMPLES", 5)
+    topics = [f"zip-{i}" for i in range(4)]
+
+    def payload(i):
+        return {"level": "INFO", "service": "checkout", "message": f"order {i} accepted for user-{i % 7}",
+                "http": {"method": "POST", "path": "/api/v1/orders", "status": 201}}
+    events = [Event(topic=topic, event_id=f"z{i}", source="pytest", payload=payload(i)) for topic in topics for i in range(12)]
+    small = Event(topic=topics[0], event_id="small", source="pytest", payload={"n": 1})
+    assert all(insert_events_batch(events + [small]))
+    # Baris lama teks JSON (payload_fmt NULL) tetap terbaca
+    insert_events_batch([Event(topic="legacy", event_id="l1", source="pytest", payload={})])
+    with database._writer(database.partition_for("legacy")) as conn:
+        conn.execute("UPDATE processed_events SET payload = '{\"old\": true}', payload_fmt = NULL WHERE topic = 'legacy'")
+
+    conn = database._open_read_connection(database.partition_for(topics[0]))
+    formats = dict(conn.execute(
+        "SELECT event_id, COALESCE(payload_fmt, 0) || ':' || COALESCE(payload_dict, '-') FROM processed_events WHERE topic = ?", (topics[0],)
+    ).fetchall())
+    stored, raw = conn.execute(
+        "SELECT SUM(LENGTH(payload)), COUNT(*) FROM processed_events WHERE topic = ? AND payload_fmt = 1", (topics[0],)
+    ).fetchone()
+    conn.close()
+    assert formats["small"] == "0:-" and formats["z0"] == "1:-" and formats["z11"] == "1:1"
+    assert stored < sum(len(events[i].payload_json) for i in range(raw)) / 2
+    compression = (await client.get("/stats")).json()["payload_compression"]
+    assert compression["rows_compressed"] == len(events) and compression["dictionaries"] == len(topics)
+    assert compression["ratio"] > 1
+
+    async def check_reads():
+        database._payload_codec.clear() # seperti proses lain: dictionary dimuat dari DB
+        for topic in topics:
+            page = (await client.get("/events", params={"topic": topic})).json()
+            assert {e["event_id"]: e["payload"] for e in page if e["event_id"] != "small"} == {
+                e.event_id: e.payload for e in events if e.topic == topic
+            }
+        lines = (await client.get("/events?format=ndjson")).text.splitlines()
+        assert len(lines) == len(events) + 2
+        assert {"old": True} in [json.loads(line)["payload"] for line in lines]
+    await check_reads()
+
+    # Topic dan dictionary-nya ikut pindah saat jumlah partisi berubah
+    for count in (2, 1):
+        close_database()
+        monkeypatch.setattr(database, "_partitions", [database._Partition(i) for i in range(count)])
+        setup_database()
+        await check_reads()
+    # Dictionary yang sama dipakai lagi setelah restart (tidak dilatih ulang)
+    insert_events_batch([Event(topic=topics[1], event_id="after", source="pytest", payload=payload(99))])
+    conn = database._open_read_connection(database.partition_for(topics[1]))
+    assert conn.execute("SELECT payload_dict FROM processed_events WHERE event_id = 'after'").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM payload_dicts WHERE topic = ?", (topics[1],)).fetchone()[0] == 1
+    conn.close()
+
+@pytest.mark.asyncio
+async def test_25_subscribe_sse(test_app_with_consumer, monkeypatch):
+    from src import config, database
+    client, test_queue = test_app_with_consumer
+    hub = main_module.subscriptions
+
+    def parse_sse(text):
+        frames = []
+        for block in text.split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            if fields:
+                frames.append(fields)
+        return frames
+
+    async def subscribed(query, headers=None):
+        """Request /subscribe sebagai task; kembali setelah subscriber selesai backfill (live)."""
+        count = hub.count
+        task = asyncio.create_task(client.get("/subscribe?" + query, headers=headers or {}))
+        while hub.count == count or any(s.backfilling for group in hub._by_topic.values() for s in group):
+            await asyncio.sleep(0.01)
+        return task
+
+    # Live: hanya event unik topic yang diminta, dalam urutan commit
+    task = await subscribed("topic=sub.a&limit=3")
+    for event_id in ["a1", "a2", "a1", "a3"]:
+        await test_queue.put(Event(topic="sub.a", event_id=event_id, source="pytest", payload={"id": event_id}))
+    await test_queue.put(Event(topic="sub.b", event_id="b1", source="pytest", payload={}))
+    await wait_for_queue(test_queue)
+    response = await task
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/event-stream")
+    frames = parse_sse(response.text)
+    assert [json.loads(f["data"])["event_id"] for f in frames] == ["a1", "a2", "a3"]
+    assert json.loads(frames[0]["data"])["payload"] == {"id": "a1"}
+    assert hub.count == 0
+
+    # Resume dari cursor (?after= atau Last-Event-ID): event yang terlewat dikirim dari DB dulu
+    insert_events_batch([Event(topic="sub.a", event_id=f"a{i}", source="pytest", payload={}) for i in (4, 5)])
+    response = await client.get(f"/subscribe?topic=sub.a&limit=4&after={frames[0]['id']}")
+    assert [json.loads(f["data"])["event_id"] for f in parse_sse(response.text)] == ["a2", "a3", "a4", "a5"]
+    response = await client.get("/subscribe?topic=sub.a&limit=1", headers={"Last-Event-ID": frames[2]["id"]})
+    assert json.loads(parse_sse(response.text)[0]["data"])["event_id"] == "a4"
+    assert (await client.get("/subscribe?after=xyz")).status_code == 400
+    assert (await client.get("/subscribe", params={"after": ",".join(["1_0"] * len(frames[0]["id"].split(",")))})).status_code == 400
+
+    # Rowid tidak dipakai ulang setelah baris terbaru dihapus (retensi): cursor lama tetap melihat event baru
+    insert_events_batch([Event(topic="sub.r", event_id="r1", source="pytest", payload={})])
+    positions = database.max_rowids()
+    partition = database.partition_for("sub.r", len(positions))
+    with database._writer(partition) as conn:
+        conn.execute("DELETE FROM processed_events WHERE topic = 'sub.r'")
+    insert_events_batch([Event(topic="sub.r", event_id="r2", source="pytest", payload={})])
+    assert database.max_rowids()[partition] > positions[partition]
+    assert [json.loads(item[3])["event_id"] for item in database.read_events_after(positions, "sub.r")] == ["r2"]
+    assert (await client.get("/subscribe?policy=block")).status_code == 422
+
+    # Subscriber lambat: buffer 2, lima event tersimpan sekaligus
+    monkeypatch.setattr(config, "SUBSCRIBE_BUFFER_SIZE", 2)
+    loop = asyncio.get_running_loop()
+    burst = lambda prefix: insert_events_batch(
+        [Event(topic="sub.c", event_id=f"{prefix}{i}", source="pytest", payload={}) for i in range(5)],
+        on_stored=main_module._subscription_notifier(loop))
+    task = await subscribed("topic=sub.c&limit=2&policy=drop_oldest")
+    burst("d")
+    frames = parse_sse((await task).text)
+    assert frames[0]["event"] == "gap" and json.loads(frames[0]["data"])["dropped"] == 3
+    assert [json.loads(f["data"])["event_id"] for f in frames[1:]] == ["d3", "d4"]
+    task = await subscribed("topic=sub.c&policy=disconnect")
+    burst("x")
+    frames = parse_sse((await task).text)
+    assert frames == [{"event": "error", "data": frames[0]["data"]}]
+    assert json.loads(frames[0]["data"])["reason"] == "slow_consumer"
+    subscription_stats = (await client.get("/stats")).json()["subscriptions"]
+    assert subscription_stats["subscribers"] == 0 and subscription_stats["disconnected"] >= 1
+
+    # Multi-worker: event dibaca dari DB (tail), termasuk yang ditulis worker lain
+    monkeypatch.setattr(main_module, "MULTI_WORKER", True)
+    monkeypatch.setitem(main_module.subscription_tail, "positions", None)
+    subscriber = hub.subscribe("sub.d", 10, "drop_oldest")
+    try:
+        await main_module._tail_start_positions(loop)
+        insert_events_batch([Event(topic=topic, event_id="t1", source="pytest", payload={}) for topic in ("sub.d", "sub.e")])
+        await main_module._subscription_tail_step(loop)
+        assert [json.loads(item[3])["event_id"] for item in subscriber.take_all()] == ["t1"]
+    finally:
+        hub.unsubscribe(subscriber)
+    await main_module._subscription_tail_step(loop)
+    assert main_module.subscription_tail["positions"] is None
+
+@pytest.mark.asyncio
+async def test_26_rollups(test_app_with_consumer):
+    from datetime import datetime, timedelta
+    from src import database
+    client, test_queue = test_app_with_consumer
+    events = [Event(topic=topic, event_id=f"{topic}-{i}", source=f"svc-{i % 2}", payload={"i": i})
+              for topic in ("roll.a", "roll.b") for i in range(6)]
+    for event in events + events[:3]:
+        await test_queue.put(event)
+    await wait_for_queue(test_queue)
+
+    def by_key(buckets, *columns):
+        totals = {}
+        for bucket in buckets:
+            total = totals.setdefault(tuple(bucket[c] for c in columns), [0, 0, 0])
+            total[0] += bucket["unique"]
+            total[1] += bucket["duplicate"]
+            total[2] += bucket["payload_bytes"]
+        return totals
+
+    body = (await client.get("/rollups")).json()
+    assert body["tier"] == "minute" and body["group_by"] == ["topic", "source"]
+    sizes = {key: sum(len(e.payload_json) for e in events if (e.topic, e.source) == key) for key in
+             [(t, s) for t in ("roll.a", "roll.b") for s in ("svc-0", "svc-1")]}
+    assert by_key(body["buckets"], "topic", "source") == {
+        ("roll.a", "svc-0"): [3, 2, sizes[("roll.a", "svc-0")]], ("roll.a", "svc-1"): [3, 1, sizes[("roll.a", "svc-1")]],
+        ("roll.b", "svc-0"): [3, 0, sizes[("roll.b", "svc-0")]], ("roll.b", "svc-1"): [3, 0, sizes[("roll.b", "svc-1")]],
+    }
+    # Tier jam/hari = downsampling tier menit; filter topic/source dan pengelompokan
+    for tier in ("hour", "day"):
+        buckets = (await client.get("/rollups", params={"tier": tier, "group_by": "all"})).json()["buckets"]
+        assert by_key(buckets)[()][:2] == [12, 3]
+    buckets = (await client.get("/rollups", params={"topic": "roll.a", "group_by": "topic"})).json()["buckets"]
+    assert by_key(buckets, "topic") == {("roll.a",): [6, 3, sizes[("roll.a", "svc-0")] + sizes[("roll.a", "svc-1")]]}
+    assert all(b["duplicate_rate"] == round(b["duplicate"] / b["received"], 4) for b in buckets)
+    buckets = (await client.get("/rollups", params={"source": "svc-1", "group_by": "source", "tier": "hour"})).json()["buckets"]
+    assert by_key(buckets, "source") == {("svc-1",): [6, 1, sizes[("roll.a", "svc-1")] + sizes[("roll.b", "svc-1")]]}
+    old = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    assert (await client.get("/rollups", params={"until": old})).json()["buckets"] == []
+    assert (await client.get("/rollups", params={"since": "2020-01-01T00:00:00"})).status_code == 400
+    # Waktu ber-timezone (Z / offset), sendiri atau dicampur dengan waktu tanpa timezone
+    now = datetime.utcnow()
+    aware = (await client.get("/rollups", params={"since": (now - timedelta(hours=1)).isoformat() + "Z", "group_by": "all"})).json()
+    assert aware["since"] == (now - timedelta(hours=1)).isoformat() and by_key(aware["buckets"])[()][:2] == [12, 3]
+    mixed = await client.get("/rollups", params={"since": (now - timedelta(hours=1)).isoformat(),
+                                                 "until": (now + timedelta(hours=8)).isoformat() + "+07:00", "group_by": "all"})
+    assert mixed.status_code == 200 and by_key(mixed.json()["buckets"])[()][:2] == [12, 3]
+    assert (await client.get("/rollups?tier=week")).status_code == 422
+
+    # Query per topic + rentang waktu dilayani PRIMARY KEY, tanpa topic oleh idx_rollups_time
+    conn = database._open_read_connection(database.partition_for("roll.a"))
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM event_rollups WHERE tier = 60 AND topic = 'roll.a' AND bucket_us >= 0 AND bucket_us < 1"))
+    conn.close()
+    assert "PRIMARY KEY" in plan and "SCAN" not in plan
+
+    # Bucket menit yang lebih tua dari jendelanya dihapus, tier jam tetap ada
+    for partition in range(len(database._partitions)):
+        with database._writer(partition) as conn:
+            conn.execute("UPDATE event_rollups SET bucket_us = bucket_us - 30 * 86400 * 1000000 WHERE tier = 60 AND topic = 'roll.b'")
+    assert database.purge_expired_rollups() == 2
+    assert by_key((await client.get("/rollups", params={"tier": "hour", "group_by": "topic"})).json()["buckets"], "topic")[("roll.b",)][0] == 6
+
+    # DB lama tanpa tabel rollup: diisi dari event yang ada saat startup
+    for partition in range(len(database._partitions)):
+        with database._writer(partition) as conn:
+            conn.execute("DROP TABLE event_rollups")
+    close_database()
+    setup_database()
+    buckets = (await client.get("/rollups", params={"tier": "day", "group_by": "topic"})).json()["buckets"]
+    assert {b["topic"]: (b["unique"], b["duplicate"]) for b in buckets} == {"roll.a": (6, 0), "roll.b": (6, 0)}
+
+@pytest.mark.asyncio
+async def test_27_cluster_forward_and_fan_out(test_app_with_consumer, monkeypatch):
+    import httpx
+    from src.cluster import Cluster, HashRing, FORWARDED_HEADER
+    keys = [("t", f"e{i}") for i in range(6000)]
+    nodes = ["http://n1", "http://n2", "http://n3"]
+    ring = HashRing(nodes)
+    owners = [ring.owner(*key) for key in keys]
+    assert all(0.2 < owners.count(node) / len(keys) < 0.45 for node in nodes)
+    # Node baru hanya mengambil ~1/N key, dan key yang pindah semuanya ke node baru
+    grown = HashRing(nodes + ["http://n4"])
+    moved = [grown.owner(*key) for key, owner in zip(keys, owners) if grown.owner(*key) != owner]
+    assert 0 < len(moved) < 0.35 * len(keys) and set(moved) == {"http://n4"}
+
+    client, _ = test_app_with_consumer
+    forwarded, post_sizes, mode = [], [], {"publish": "ok"}
+    remote_events = [["0000", "1", json.dumps({"event_id": "r0"})],
+                     ["9999", "2", json.dumps({"event_id": "r1"})],
+                     ["9999", "3", json.dumps({"event_id": "r2"})]]
+
+    def peer(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/publish":
+            assert request.headers[FORWARDED_HEADER] == "rahasia"
+            if mode["publish"] == "down":
+                raise httpx.ConnectError("connection refused", request=request)
+            if mode["publish"] == "busy":
+                return httpx.Response(429, headers={"Retry-After": "7"})
+            if mode["publish"] in ("too_large", "invalid"):
+                return httpx.Response(413 if mode["publish"] == "too_large" else 422, json={"detail": "ditolak"})
+            post_sizes.append(len(json.loads(request.content)))
+            forwarded.extend(json.loads(request.content))
+            return httpx.Response(202, json={"status": "accepted"})
+        if request.url.path == "/cluster/events":
+            start, limit = int(request.url.params.get("after", "0")), int(request.url.params["limit"])
+            items = remote_events[start:start + limit]
+            return httpx.Response(200, json={"items": items, "more": start + limit < len(remote_events)})
+        if request.url.path == "/stats":
+            assert request.url.params["scope"] == "local"
+            return httpx.Response(200, json={
+                "received": 5, "unique_processed": 4, "duplicate_dropped": 1, "topics_list": ["remote"],
+                "by_topic": {"remote": {"received": 5, "unique": 4, "duplicate": 1, "last_seen": None}},
+                "by_source": {},
+            })
+        return httpx.Response(404)
+
+    node = Cluster(["http://node-a", "http://node-b"], "http://node-a", vnodes=64, batch_size=100,
+                   flush_seconds=0.001, max_in_flight=2, timeout_seconds=1, secret="rahasia",
+                   transport=httpx.MockTransport(peer))
+    monkeypatch.setattr(main_module, "cluster", node)
+    idle_queues = [asyncio.Queue() for _ in shard_queues]
+    monkeypatch.setattr(main_module, "shard_queues", idle_queues)
+    try:
+        # Event milik node-b diteruskan (satu POST), sisanya di-enqueue lokal
+        batch = [{"topic": "cl", "event_id": f"c{i}", "source": "pytest", "payload": {"i": i}} for i in range(40)]
+        assert (await client.post("/publish", json=batch)).status_code == 202
+        queued = {q.get_nowait().event_id for q in idle_queues for _ in range(q.qsize())}
+        remote_ids = {event["event_id"] for event in forwarded}
+        assert queued and remote_ids and queued | remote_ids == {e["event_id"] for e in batch}
+        assert all(node.ring.owner("cl", event_id) == "http://node-b" for event_id in remote_ids)
+        assert node.forwarders["http://node-b"].counters["requests"] == 1
+
+        # Batch hasil forward (header dengan secret cluster) tidak diteruskan lagi
+        response = await client.post("/publish", json=batch, headers={FORWARDED_HEADER: "rahasia"})
+        assert response.status_code == 202 and sum(q.qsize() for q in idle_queues) == len(batch)
+        assert node.counters["received_forwarded_events"] == len(batch)
+
+        # Header dari client luar (tanpa secret yang cocok) diabaikan: event tetap dirutekan lewat ring
+        for q in idle_queues:
+            while not q.empty():
+                q.get_nowait()
+        forwarded.clear()
+        for value in ("1", "salah"):
+            response = await client.post("/publish", json=batch, headers={FORWARDED_HEADER: value})
+            assert response.status_code == 202
+        assert sum(q.qsize() for q in idle_queues) == 2 * len(queued)
+        assert {event["event_id"] for event in forwarded} == remote_ids and len(forwarded) == 2 * len(remote_ids)
+        assert node.counters["received_forwarded_events"] == len(batch)
+        no_secret = Cluster(["http://a", "http://b"], "http://a", 8, 1, 0.001, 1, 1)
+        assert not no_secret.is_forwarded("1") and not no_secret.is_forwarded("")
+        await no_secret.close()
+
+        # Peer sibuk -> 429 dengan Retry-After dari peer; peer mati -> 503
+        mode["publish"] = "busy"
+        response = await client.post("/publish", json=batch)
+        assert response.status_code == 429 and response.headers["Retry-After"] == "7"
+        mode["publish"] = "down"
+        assert (await client.post("/publish", json=batch)).status_code == 503
+
+        # Penolakan permanen dari peer (413, 4xx lain) diteruskan tanpa Retry-After, bukan 503
+        mode["publish"] = "too_large"
+        response = await client.post("/publish", json=batch)
+        assert response.status_code == 413 and "retry-after" not in response.headers
+        mode["publish"] = "invalid"
+        assert (await client.post("/publish", json=batch)).status_code == 400
+        stream_body = "\n".join(json.dumps(event) for event in batch)
+        response = await client.post("/publish/stream", content=stream_body, headers={"Content-Type": "application/x-ndjson"})
+        assert response.status_code == 400 and "committed_line" in response.json()
+
+        # 413 lokal dan 429 dari peer bersamaan: 413 yang dilaporkan (mengulang tidak akan berhasil)
+        mode["publish"] = "busy"
+        async def too_large(events, wait_seconds=None):
+            raise main_module.BatchTooLargeError("terlalu besar")
+        enqueue = main_module.enqueue_events
+        monkeypatch.setattr(main_module, "enqueue_events", too_large)
+        assert (await client.post("/publish", json=batch)).status_code == 413
+        monkeypatch.setattr(main_module, "enqueue_events", enqueue)
+
+        # submit lebih besar dari batch_size dipecah menjadi beberapa POST
+        mode["publish"] = "ok"
+        post_sizes.clear()
+        await node.forwarders["http://node-b"].submit([json.dumps({"event_id": f"big{i}"}) for i in range(250)])
+        assert post_sizes == [100, 100, 50]
+
+        # /events gabungan: urut waktu lintas node, cursor membawa posisi setiap node
+        insert_events_batch([Event(topic="cl", event_id=f"l{i}", source="pytest", payload={}) for i in range(3)])
+        pages, after, last = [], None, None
+        while True:
+            response = await client.get("/events", params={"limit": 2, **({"after": after} if after else {})})
+            pages.append([event["event_id"] for event in response.json()])
+            last, after = after, response.headers.get("X-Next-Cursor")
+            if not after:
+                break
+        assert pages == [["r0", "l0"], ["l1", "l2"], ["r1", "r2"], []]
+        # Node yang halamannya sudah habis tidak dilewati: event baru tetap terbaca dari cursor terakhir
+        insert_events_batch([Event(topic="cl", event_id="l3", source="pytest", payload={})])
+        assert [event["event_id"] for event in (await client.get("/events", params={"after": last})).json()] == ["l3"]
+        lines = (await client.get("/events?format=ndjson")).text.splitlines()
+        assert [json.loads(line)["event_id"] for line in lines] == ["r0", "l0", "l1", "l2", "l3", "r1", "r2"]
+        local = (await client.get("/events", params={"scope": "local"})).json()
+        assert [event["event_id"] for event in local] == ["l0", "l1", "l2", "l3"]
+        assert (await client.get("/events", params={"after": "bukan-cursor"})).status_code == 400
+
+        # /stats gabungan menjumlah counter semua node
+        local_stats = (await client.get("/stats", params={"scope": "local"})).json()
+        stats_data = (await client.get("/stats")).json()
+        assert stats_data["received"] == local_stats["received"] + 5
+        assert stats_data["unique_processed"] == local_stats["unique_processed"] + 4
+        assert stats_data["by_topic"]["remote"]["unique"] == 4 and "remote" in stats_data["topics_list"]
+        assert [member["ok"] for member in stats_data["cluster"]["members"]] == [True, True]
+        assert "members" not in local_stats["cluster"]
+    finally:
+        await node.close()
+
+@pytest.mark.asyncio
+async def test_28_publisher_client(test_app_with_consumer, monkeypatch):
+    import httpx
+    from src.client import AsyncPublisher, Publisher, PublishError
+    from src import config
+    monkeypatch.setattr(config, "RETRY_AFTER_SECONDS", 0)
+    captured, calls = [], {"enqueue": 0, "busy": 0}
+    async def flaky_enqueue(events, wait_seconds=None):
+        # Enqueue ke-2 (bukan ke-1) menolak: stream terhenti di tengah, committed_line > 0
+        calls["enqueue"] += 1
+        if calls["enqueue"] == 2 and not calls["busy"]:
+            calls["busy"] += 1
+            raise main_module.QueueFullError("penuh")
+        captured.extend(events)
+    monkeypatch.setattr(main_module, "enqueue_events", flaky_enqueue)
+    monkeypatch.setattr(config, "CONSUMER_BATCH_SIZE", 4) # grup enqueue /publish/stream kecil
+
+    # gzip (NDJSON ke /publish/stream): 429 di tengah stream -> hanya sisa baris yang dikirim ulang
+    events = [{"topic": "cli", "source": "pytest", "payload": {"i": i}} for i in range(25)]
+    async with AsyncPublisher("http://test", batch_size=10, flush_interval=0.01, max_in_flight=2,
+                              transport=ASGITransport(app=app)) as publisher:
+        await publisher.publish_many(events)
+    assert publisher.stats["events"] == 25 and publisher.stats["accepted"] == 25
+    assert publisher.stats["retries_busy"] == 1 and publisher.stats["requests"] == 4
+    assert publisher.stats["bytes_sent"] < publisher.stats["bytes_raw"]
+    ids = [event.event_id for event in captured]
+    assert len(ids) == len(set(ids)) == 25 # event_id diisi klien, tidak ada baris yang terkirim dua kali
+    assert sorted(event.payload["i"] for event in captured) == list(range(25))
+
+    # Tanpa gzip (array JSON ke /publish): 429 -> seluruh batch dikirim ulang dengan event_id yang sama
+    captured.clear()
+    calls.update(enqueue=1, busy=0)
+    publisher = AsyncPublisher("http://test", batch_size=100, compress=False, transport=ASGITransport(app=app))
+    await publisher.publish_many(events[:5])
+    await publisher.aclose()
+    assert publisher.stats["retries_busy"] == 1 and len(captured) == 5
+
+    # Baris tidak valid sebelum dan sesudah titik 429: masing-masing dihitung sekali walaupun
+    # baris setelah committed_line dikirim (dan ditolak) lagi
+    captured.clear()
+    calls.update(enqueue=0, busy=0)
+    mixed = [{"topic": "cli", "source": "pytest", "payload": "bukan-objek" if i in (1, 8) else {"i": i}} for i in range(10)]
+    publisher = AsyncPublisher("http://test", batch_size=10, flush_interval=0.01, transport=ASGITransport(app=app))
+    await publisher.publish_many(mixed)
+    with pytest.raises(PublishError) as error:
+        await publisher.aclose()
+    assert publisher.stats["retries_busy"] == 1 and publisher.stats["requests"] == 2
+    assert error.value.failed == 2 and publisher.stats["rejected"] == 2 and len(error.value.errors) == 2
+    assert publisher.stats["accepted"] == 8 and sorted(event.payload["i"] for event in captured) == [0, 2, 3, 4, 5, 6, 7, 9]
+
+    # Event yang ditolak server dilaporkan lewat PublishError saat flush
+    publisher = AsyncPublisher("http://test", transport=ASGITransport(app=app))
+    await publisher.publish({"topic": "cli", "source": "pytest", "payload": "bukan-objek"})
+    with pytest.raises(PublishError) as error:
+        await publisher.aclose()
+    assert error.value.failed == 1
+
+    # Versi sync: Retry-After dipatuhi, event_id sama di setiap percobaan, body gzip
+    attempts = []
+    def handler(request: httpx.Request) -> httpx.Response:
+        lines = gzip.decompress(request.content).decode().splitlines()
+        attempts.append([json.loads(line)["event_id"] for line in lines])
+        if len(attempts) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"}, json={
+                "accepted": 0, "rejected": 0, "committed_line": 0, "errors": []})
+        return httpx.Response(202, json={"accepted": len(lines), "rejected": 0, "committed_line": len(lines), "errors": []})
+    with Publisher("http://test", batch_size=50, flush_interval=0.01, transport=httpx.MockTransport(handler)) as sync_publisher:
+        sync_publisher.publish_many({"topic": "cli", "source": "sync", "payload": {"i": i}} for i in range(3))
+    assert len(attempts) == 2 and attempts[0] == attempts[1] and len(attempts[0]) == 3
+    assert sync_publisher.stats["accepted"] == 3
+
+@pytest.mark.asyncio
+async def test_29_gzip_bodies_and_response_negotiation(test_app_with_consumer, monkeypatch):
+    from src import config, wire
+    client, _ = test_app_with_consumer
+    captured = []
+    async def fake_enqueue(events, wait_seconds=None):
+        captured.extend(events)
+    monkeypatch.setattr(main_module, "enqueue_events", fake_enqueue)
+    batch = [{"topic": "wire", "event_id": f"w{i}", "source": "pytest", "payload": {"i": i, "msg": "x" * 50}} for i in range(20)]
+
+    # JSON gzip
+    body = gzip.compress(json.dumps(batch).encode())
+    response = await client.post("/publish", content=body, headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 202 and [e.event_id for e in captured] == [e["event_id"] for e in batch]
+
+    # Beberapa member gzip yang disambung: event dari semua member diterima, batas ukuran untuk totalnya
+    captured.clear()
+    members = gzip.compress(b"[" + json.dumps(batch[0]).encode() + b",") + gzip.compress(json.dumps(batch[1]).encode() + b"]")
+    response = await client.post("/publish", content=members, headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+    assert response.status_code == 202 and [e.event_id for e in captured] == ["w0", "w1"]
+    assert wire.decode_body(gzip.compress(b"a" * 600) + gzip.compress(b"b" * 600), "gzip", 1200) == b"a" * 600 + b"b" * 600
+    with pytest.raises(wire.BodyTooLargeError):
+        wire.decode_body(gzip.compress(b"a" * 600) + gzip.compress(b"b" * 600), "gzip", 1000)
+
+    # Encoding tidak dikenal / gzip terpotong / melebihi batas dekompresi
+    async def post(content, content_type="application/json", encoding=None):
+        headers = {"Content-Type": content_type, **({"Content-Encoding": encoding} if encoding else {})}
+        return (await client.post("/publish", content=content, headers=headers)).status_code
+    plain_body = json.dumps(batch).encode()
+    assert await post(plain_body, encoding="br") == 415
+    assert await post(gzip.compress(plain_body)[:-8], encoding="gzip") == 400
+    monkeypatch.setattr(config, "PUBLISH_MAX_DECODED_BYTES", 1024)
+    assert await post(gzip.compress(b"[" + b" " * 100000 + b"]"), "application/json", "gzip") == 413
+
+    # /events: gzip lewat Accept-Encoding, juga untuk NDJSON
+    insert_events_batch([Event(**event) for event in batch])
+    plain = await client.get("/events?topic=wire", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and len(plain.json()) == 20
+    zipped = await client.get("/events?topic=wire", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["content-encoding"] == "gzip" and zipped.json() == plain.json()
+    stream = await client.get("/events?topic=wire&format=ndjson", headers={"Accept-Encoding": "gzip"})
+    assert stream.headers["content-encoding"] == "gzip" and [json.loads(line) for line in stream.text.splitlines()] == plain.json()
+
+    # Tanpa paket msgpack: body ditolak 415, respons 406
+    monkeypatch.setattr(wire, "msgpack", None)
+    assert await post(b"\x90", "application/msgpack") == 415
+    assert (await client.get("/events?format=msgpack")).status_code == 406
+
+
+@pytest.mark.asyncio
+async def test_30_queue_logging_and_event_sampling(test_app_with_consumer, monkeypatch, caplog):
+    import io
+    import threading
+    from src.log_pipeline import setup_logging, EventLogSampler
+    client, test_queue = test_app_with_consumer
+
+    # Record ditulis thread writer, bukan thread pemanggil; traceback tetap lengkap
+    class Stream(io.StringIO):
+        writers = set()
+        def write(self, text):
+            self.writers.add(threading.current_thread().name)
+            return super().write(text)
+    stream = Stream()
+    logger = logging.getLogger("test_30_pipeline")
+    logger.propagate = False
+    listener = setup_logging(logging.INFO, "%(message)s", stream, logger)
+    try:
+        assert setup_logging(logging.INFO, stream=stream, logger=logger) is None # sudah punya handler
+        args = {"n": 1}
+        logger.info("event %s", args)
+        args["n"] = 2 # pesan digabung saat log dipanggil, bukan saat ditulis
+        try:
+            raise ValueError("rusak")
+        except ValueError:
+            logger.error("Gagal", exc_info=True)
+    finally:
+        listener.stop()
+        logger.handlers.clear()
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == "event {'n': 1}" and threading.current_thread().name not in stream.writers
+    assert "ValueError: rusak" in stream.getvalue()
+
+    # Sampling 1 dari 3 lintas batch, ringkasan per topic (maksimal 1 topic + baris sisanya)
+    sampler = EventLogSampler(sample_every=3, summary_seconds=1.0, max_topics=1)
+    batch = [Event(topic="a" if i < 5 else "b", event_id=f"s{i}", source="pytest", payload={}) for i in range(7)]
+    with caplog.at_level(logging.INFO):
+        sampler.record(batch[:2], [True, True])
+        sampler.record(batch[2:], [True, False, True, False, True])
+        sampled = [r.getMessage() for r in caplog.records]
+        caplog.clear()
+        sampler.flush_summary()
+        summary = [r.getMessage() for r in caplog.records]
+        caplog.clear()
+        sampler.flush_summary()
+        assert caplog.records == [] # tidak ada event sejak ringkasan terakhir
+    assert sampled == ["Event UNIK diproses: (Topic: a, ID: s2)", "Event DUPLIKAT terdeteksi: (Topic: b, ID: s5)"]
+    assert len(summary) == 2
+    assert "(Topic: a): 4 UNIK, 1 DUPLIKAT" in summary[0] and "(1 topic lain): 1 UNIK, 1 DUPLIKAT" in summary[1]
+
+    # Consumer: log per event default hanya lewat ringkasan, error tetap ditulis
+    monkeypatch.setattr(main_module, "event_log", EventLogSampler(sample_every=0, summary_seconds=1.0))
+    with caplog.at_level(logging.INFO):
+        for i in range(4):
+            await test_queue.put(Event(topic="sampled", event_id=f"c{i % 2}", source="pytest", payload={}))
+        await wait_for_queue(test_queue)
+        assert not any("UNIK diproses" in r.getMessage() or "DUPLIKAT terdeteksi" in r.getMessage() for r in caplog.records)
+        main_module.event_log.flush_summary()
+        assert any("(Topic: sampled): 2 UNIK, 2 DUPLIKAT" in r.getMessage() for r in caplog.records)
+        real_insert = main_module.insert_events_batch
+        def fail_once(*args):
+            monkeypatch.setattr(main_module, "insert_events_batch", real_insert)
+            raise RuntimeError("database is locked")
+        monkeypatch.setattr(main_module, "insert_events_batch", fail_once) # batch berikutnya gagal sekali
+        await test_queue.put(Event(topic="sampled", event_id="c9", source="pytest", payload={}))
+        await wait_for_queue(test_queue)
+        assert any(r.levelno == logging.ERROR and "Gagal menulis batch" in r.getMessage() for r in caplog.records)
+
+@pytest.mark.asyncio
+async def test_31_msgpack_bodies_and_responses(test_app_with_consumer, monkeypatch):
+    msgpack = pytest.importorskip("msgpack")
+    from datetime import datetime, timezone
+    from src.models import datetime_to_us
+    client, _ = test_app_with_consumer
+    captured = []
+    async def fake_enqueue(events, wait_seconds=None):
+        captured.extend(events)
+    monkeypatch.setattr(main_module, "enqueue_events", fake_enqueue)
+    batch = [{"topic": "wire", "event_id": f"w{i}", "source": "pytest", "payload": {"i": i, "msg": "x" * 50}} for i in range(20)]
+
+    # MessagePack: array, satu event, ext timestamp, nilai biner, dan gabungan dengan gzip
+    packed = msgpack.packb(batch)
+    assert (await client.post("/publish", content=packed, headers={"Content-Type": "application/msgpack"})).status_code == 202
+    assert [e.payload for e in captured] == [e["payload"] for e in batch]
+    captured.clear()
+    single = {"topic": "wire", "event_id": "ts", "source": "pytest", "timestamp": datetime(2024, 5, 6, 7, 8, 9, tzinfo=timezone.utc),
+              "payload": {"raw": b"\x00\x01"}}
+    body = gzip.compress(msgpack.packb(single, datetime=True))
+    response = await client.post("/publish", content=body,
+                                 headers={"Content-Type": "application/x-msgpack", "Content-Encoding": "gzip"})
+    assert response.status_code == 202
+    assert captured[0].timestamp_us == datetime_to_us(datetime(2024, 5, 6, 7, 8, 9)) and captured[0].payload_json == '{"raw":"AAE="}'
+
+    # Body rusak / skema salah
+    async def post(content):
+        return (await client.post("/publish", content=content, headers={"Content-Type": "application/msgpack"})).status_code
+    assert await post(b"\xc1") == 400
+    assert await post(msgpack.packb({"topic": "wire", "source": "pytest", "payload": "bukan"})) == 422
+
+    # /events: format dinegosiasikan lewat Accept / ?format
+    insert_events_batch([Event(**event) for event in batch])
+    plain = (await client.get("/events?topic=wire")).json()
+    packed_page = await client.get("/events?topic=wire&limit=5", headers={"Accept": "application/msgpack"})
+    assert packed_page.headers["content-type"] == "application/msgpack" and "x-next-cursor" in packed_page.headers
+    assert msgpack.unpackb(packed_page.content) == plain[:5]
+    assert msgpack.unpackb((await client.get("/events?topic=wire&format=msgpack")).content) == plain
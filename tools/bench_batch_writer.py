@@ -0,0 +1,61 @@
+# Benchmark: jalur tulis per-event (check_and_insert_event) vs group commit (insert_events_batch)
+# Jalankan: python tools/bench_batch_writer.py [jumlah_event] [batch_size]
+
+import os
+import sys
+import time
+import tempfile
+
+# DB benchmark ditaruh di folder sementara agar tidak menyentuh data/dedup_store.db
+os.environ["AGGREGATOR_DB_FOLDER"] = tempfile.mkdtemp(prefix="bench_batch_")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import database
+from src.models import Event
+
+TOTAL_EVENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+BATCH_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+DUPLICATE_PERCENTAGE = 0.20
+
+
+def make_events(prefix: str) -> list[Event]:
+    """Membuat event dengan ~20% duplikat (event_id diulang)."""
+    num_unique = int(TOTAL_EVENTS * (1 - DUPLICATE_PERCENTAGE))
+    events = [
+        Event(topic="bench", event_id=f"{prefix}-{i % num_unique}", source="bench", payload={"index": i})
+        for i in range(TOTAL_EVENTS)
+    ]
+    return events
+
+
+def reset_db():
+    database.delete_database_files()
+    database.setup_database()
+
+
+def bench_per_event() -> float:
+    reset_db()
+    events = make_events("single")
+    start = time.perf_counter()
+    for event in events:
+        database.check_and_insert_event(event)
+    return time.perf_counter() - start
+
+
+def bench_batch() -> float:
+    reset_db()
+    events = make_events("batch")
+    start = time.perf_counter()
+    for i in range(0, len(events), BATCH_SIZE):
+        database.insert_events_batch(events[i:i + BATCH_SIZE])
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"--- Benchmark Writer ({TOTAL_EVENTS} event, batch {BATCH_SIZE}) ---")
+    elapsed_single = bench_per_event()
+    elapsed_batch = bench_batch()
+    database.close_database()
+    print(f"Per-event : {elapsed_single:.3f} detik ({TOTAL_EVENTS / elapsed_single:,.0f} events/detik)")
+    print(f"Batch     : {elapsed_batch:.3f} detik ({TOTAL_EVENTS / elapsed_batch:,.0f} events/detik)")
+    print(f"Speedup   : {elapsed_single / elapsed_batch:.1f}x")
@@ -0,0 +1,173 @@
+# Benchmark klien publisher (src/client.py) terhadap app yang dijalankan in-process: uvicorn
+# di thread latar proses ini (socket sungguhan, jadi keep-alive dan gzip ikut terukur), folder
+# data sementara. Mode yang dibandingkan:
+#   naive        pola lama tools/stress_test.py: batch dibuat manual, satu POST per 100
+#                event berurutan, koneksi baru per request, tanpa retry
+#   async        AsyncPublisher tanpa gzip (array JSON ke /publish)
+#   async-gzip   AsyncPublisher dengan gzip (NDJSON ke /publish/stream)
+#   sync-gzip    Publisher (thread) dengan gzip
+# Setiap mode mengirim workload baru yang sama bentuknya (tools/benchmark.py) dan menunggu
+# sampai semua event diproses (/stats), lalu jumlah unik/duplikat dicek.
+# Jalankan:
+#   python tools/bench_client.py
+#   python tools/bench_client.py --events 50000 --batch-size 500 --max-in-flight 4 --output hasil.json
+#   python tools/bench_client.py --url http://127.0.0.1:8080     # server yang sudah jalan
+#
+# Klien dan server berbagi proses (dan GIL) di mode in-process: angka absolut lebih rendah
+# daripada server terpisah, perbandingan antar mode tetap berlaku.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+
+MODES = ("naive", "async", "async-gzip", "sync-gzip")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark klien publisher vs POST manual.")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"daftar mode dipisah koma (default: {','.join(MODES)})")
+    parser.add_argument("--events", type=int, default=20000, help="jumlah event per mode (default: 20000)")
+    parser.add_argument("--dup-ratio", type=float, default=0.2, help="proporsi event duplikat (default: 0.2)")
+    parser.add_argument("--batch-size", type=int, default=500, help="event per batch klien (default: 500; naive: 100)")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="request bersamaan klien (default: 4)")
+    parser.add_argument("--payload-bytes", type=int, default=64, help="perkiraan ukuran payload per event (default: 64)")
+    parser.add_argument("--topics", type=int, default=3, help="jumlah topic berbeda (default: 3)")
+    parser.add_argument("--seed", type=int, default=42, help="seed workload (default: 42)")
+    parser.add_argument("--timeout", type=float, default=300, help="batas waktu menunggu event diproses, detik (default: 300)")
+    parser.add_argument("--url", default=None, help="base URL server yang sudah jalan; tanpa ini: in-process")
+    parser.add_argument("--output", default=None, help="tulis hasil JSON ke file ini (default: stdout)")
+    args = parser.parse_args(argv)
+    args.mode_list = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in args.mode_list if mode not in MODES]
+    if unknown:
+        parser.error(f"mode tidak dikenal: {', '.join(unknown)}")
+    return args
+
+
+class InProcessServer:
+    """App aggregator di uvicorn.Server pada thread latar (DB di folder sementara)."""
+
+    def __init__(self):
+        # Konfigurasi dibaca saat import, jadi env harus di-set sebelum src.main diimport
+        os.environ["AGGREGATOR_DB_FOLDER"] = tempfile.mkdtemp(prefix="bench_client_")
+        import uvicorn
+        from src.main import app
+        logging.getLogger().setLevel(logging.WARNING) # log per event ikut membebani proses
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, name="aggregator", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        deadline = time.monotonic() + 30
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Server in-process tidak siap")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+async def send_naive(url: str, workload, args) -> dict:
+    """Satu POST per 100 event, berurutan, koneksi baru per request (tanpa pool dan retry)."""
+    events = workload.events
+    counters = {"requests": 0, "failed": 0, "bytes_sent": 0}
+    for start in range(0, len(events), 100):
+        body = json.dumps(events[start:start + 100]).encode()
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            response = await client.post(url + "/publish", content=body, headers={"Content-Type": "application/json"})
+        counters["requests"] += 1
+        counters["bytes_sent"] += len(body)
+        if response.status_code != 202:
+            counters["failed"] += 100
+    return counters
+
+
+async def send_async(url: str, workload, args, compress: bool) -> dict:
+    from src.client import AsyncPublisher
+    async with AsyncPublisher(url, batch_size=args.batch_size, max_in_flight=args.max_in_flight,
+                              compress=compress) as publisher:
+        await publisher.publish_many(workload.events)
+    return publisher.stats
+
+
+def send_sync(url: str, workload, args) -> dict:
+    from src.client import Publisher
+    with Publisher(url, batch_size=args.batch_size, max_in_flight=args.max_in_flight) as publisher:
+        publisher.publish_many(workload.events)
+    return publisher.stats
+
+
+async def run_mode(mode: str, url: str, args) -> dict:
+    workload = benchmark.Workload(args, uuid.uuid4().hex[:8], mode, args.dup_ratio)
+    async with httpx.AsyncClient(base_url=url, timeout=60.0) as client:
+        before = await benchmark.get_stats(client)
+        started = time.perf_counter()
+        if mode == "naive":
+            sent = await send_naive(url, workload, args)
+        elif mode == "sync-gzip":
+            sent = await asyncio.to_thread(send_sync, url, workload, args)
+        else:
+            sent = await send_async(url, workload, args, compress=mode == "async-gzip")
+        acked = time.perf_counter() - started
+        after = await benchmark.wait_processed(client, benchmark.processed_count(before) + len(workload.events),
+                                               0.02, args.timeout)
+        processed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "events": len(workload.events),
+        "ack_throughput_eps": round(len(workload.events) / acked, 1),
+        "e2e_throughput_eps": round(len(workload.events) / processed, 1),
+        "requests": sent["requests"],
+        "retries": sent.get("retries", 0),
+        "failed": sent["failed"],
+        "bytes_sent_per_event": round(sent["bytes_sent"] / len(workload.events), 1),
+        "check": benchmark.check_counts(before, after, workload.num_unique, workload.num_duplicates),
+    }
+
+
+async def main(args, url: str) -> dict:
+    runs = []
+    for mode in args.mode_list:
+        benchmark.log(f"=== {mode} ===")
+        runs.append(await run_mode(mode, url, args))
+        benchmark.log(f"{mode}: ack {runs[-1]['ack_throughput_eps']:,.0f} ev/s, "
+                      f"diproses {runs[-1]['e2e_throughput_eps']:,.0f} ev/s, "
+                      f"{runs[-1]['bytes_sent_per_event']} byte/event")
+    return {"cpu_count": os.cpu_count(), "url": args.url or "in-process", "runs": runs}
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        server = InProcessServer()
+        server.start()
+        url = server.url
+    try:
+        results = asyncio.run(main(args, url))
+    finally:
+        if server is not None:
+            server.stop()
+    benchmark.write_results(results, args.output)
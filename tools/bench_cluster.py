@@ -0,0 +1,175 @@
+# Benchmark mode cluster: N node aggregator dijalankan sebagai proses uvicorn terpisah (port
+# berbeda, folder data sementara masing-masing) dengan daftar node yang sama, lalu:
+#   1. skenario ingest tools/benchmark.py dikirim ke node pertama (event milik node lain diteruskan),
+#   2. workload baru dikirim bergiliran ke semua node, dua kali: putaran kedua harus terdeteksi
+#      duplikat semua walaupun tiap batch masuk lewat node yang berbeda dari putaran pertama.
+# Hitungan dicek lewat /stats dan /events gabungan (scope=cluster) di node pertama.
+# Jalankan:
+#   python tools/bench_cluster.py                                  # N = 3
+#   python tools/bench_cluster.py --nodes 2 --events 20000 --concurrency 16 --output hasil.json
+# Argumen lain diteruskan ke benchmark.py (--events, --dup-ratio, --batch-size, --concurrency, ...).
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+from bench_workers import STARTUP_TIMEOUT_SECONDS, free_port, stop_server
+
+# Secret acak per run: hanya node benchmark yang dipercaya sebagai peer
+CLUSTER_SECRET = uuid.uuid4().hex
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dan uji dedup lintas node mode cluster.")
+    parser.add_argument("--nodes", type=int, default=3, help="jumlah node (default: 3)")
+    parser.add_argument("--output", default=None, help="tulis hasil JSON ke file ini (default: stdout)")
+    return parser.parse_known_args(argv)
+
+
+def start_node(port: int, nodes: list, db_folder: str, log_level: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "AGGREGATOR_DB_FOLDER": db_folder,
+        "AGGREGATOR_CLUSTER_NODES": ",".join(nodes),
+        "AGGREGATOR_CLUSTER_SELF": f"http://127.0.0.1:{port}",
+        "AGGREGATOR_CLUSTER_SECRET": CLUSTER_SECRET,
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", log_level.lower()],
+        cwd=benchmark.ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(url: str, processes: list):
+    """Menunggu sampai /stats gabungan di node pertama dijawab oleh semua node."""
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    async with httpx.AsyncClient(base_url=url, timeout=5.0) as client:
+        while time.monotonic() < deadline:
+            for process in processes:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Node berhenti saat startup (exit code {process.returncode})")
+            try:
+                stats = (await client.get("/stats")).json()
+                if not stats["cluster"]["partial"]:
+                    return
+            except (httpx.HTTPError, KeyError, ValueError):
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Cluster tidak siap dalam {STARTUP_TIMEOUT_SECONDS} detik")
+
+
+def split_round_robin(workload: "benchmark.Workload", parts: int) -> list:
+    """Workload dibagi per node: batch ke-i dikirim ke node i % parts."""
+    subsets = []
+    for offset in range(parts):
+        subset = copy.copy(workload)
+        subset.batches = workload.batches[offset::parts]
+        subset.bodies = workload.bodies[offset::parts]
+        subset.events = [event for batch in subset.batches for event in batch]
+        subsets.append(subset)
+    return subsets
+
+
+async def publish_round_robin(clients: list, workload, concurrency: int) -> dict:
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        benchmark.publish_all(client, subset, max(1, concurrency // len(clients)))
+        for client, subset in zip(clients, split_round_robin(workload, len(clients)))
+    ))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": sum(result["requests"] for result in results),
+        "retries_429": sum(result["retries_429"] for result in results),
+        "failed_requests": sum(result["failed_requests"] for result in results),
+        "elapsed_s": round(elapsed, 4),
+        "ack_throughput_eps": round(len(workload.events) / elapsed, 1) if elapsed else None,
+    }
+
+
+async def count_events(client) -> int:
+    """Jumlah event unik di seluruh cluster lewat export NDJSON gabungan."""
+    count = 0
+    async with client.stream("GET", "/events", params={"format": "ndjson"}, timeout=None) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            count += bool(line)
+    return count
+
+
+async def cross_node_dedup(urls: list, bench_args) -> dict:
+    clients = [httpx.AsyncClient(base_url=url, timeout=30.0) for url in urls]
+    try:
+        workload = benchmark.Workload(bench_args, uuid.uuid4().hex[:8], "cluster", bench_args.dup_ratio)
+        poll, timeout = bench_args.poll_ms / 1000, bench_args.timeout
+        before = await benchmark.get_stats(clients[0])
+        first = await publish_round_robin(clients, workload, bench_args.concurrency)
+        middle = await benchmark.wait_processed(clients[0], benchmark.processed_count(before) + len(workload.events), poll, timeout)
+        # Putaran kedua digeser satu node: setiap batch masuk lewat node yang berbeda
+        second = await publish_round_robin(clients[1:] + clients[:1], workload, bench_args.concurrency)
+        after = await benchmark.wait_processed(clients[0], benchmark.processed_count(middle) + len(workload.events), poll, timeout)
+        members = after["cluster"]["members"]
+        stored = await count_events(clients[0])
+        return {
+            "events": len(workload.events),
+            "first_pass": first,
+            "second_pass": second,
+            "check_first_pass": benchmark.check_counts(before, middle, workload.num_unique, workload.num_duplicates),
+            "check_second_pass": benchmark.check_counts(middle, after, 0, len(workload.events)),
+            "unique_per_node": {member["node"]: member.get("unique_processed") for member in members},
+            "forwarded": {url: (await benchmark.get_stats(client))["cluster"]["forwarded_events"]
+                          for url, client in zip(urls, clients)},
+            "stored_events": stored,
+            "stored_events_ok": stored == after["unique_processed"],
+        }
+    finally:
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+
+async def main(args, bench_argv) -> dict:
+    ports = [free_port() for _ in range(args.nodes)]
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    bench_args = benchmark.parse_args(["--scenario", "ingest"] + bench_argv + ["--url", urls[0]])
+    with tempfile.TemporaryDirectory(prefix="aggregator-cluster-") as root:
+        processes = []
+        try:
+            for index, port in enumerate(ports):
+                db_folder = os.path.join(root, f"node{index}")
+                os.makedirs(db_folder)
+                processes.append(start_node(port, urls, db_folder, bench_args.log_level))
+            await wait_ready(urls[0], processes)
+            benchmark.log(f"=== Cluster {args.nodes} node: ingest lewat node pertama ===")
+            ingest = (await benchmark.run(bench_args))["scenarios"]["ingest"]
+            benchmark.log("=== Dedup lintas node: workload dikirim bergiliran ke semua node ===")
+            dedup = await cross_node_dedup(urls, bench_args)
+            benchmark.log(json.dumps(dedup, indent=2))
+        finally:
+            for process in processes:
+                stop_server(process)
+    return {
+        "cpu_count": os.cpu_count(),
+        "nodes": args.nodes,
+        "ingest": {
+            "ack_throughput_eps": ingest["publish"]["ack_throughput_eps"],
+            "e2e_throughput_eps": ingest["e2e_throughput_eps"],
+            "e2e_latency_ms": ingest["e2e_latency_ms"],
+            "check": ingest["check"],
+        },
+        "cross_node_dedup": dedup,
+    }
+
+
+if __name__ == "__main__":
+    args, bench_argv = parse_args()
+    benchmark.write_results(asyncio.run(main(args, bench_argv)), args.output)
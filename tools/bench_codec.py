@@ -0,0 +1,72 @@
+# Micro-benchmark codec ingest: events/detik per core (CPU time) untuk validasi + serialisasi
+# Jalankan: python tools/bench_codec.py [jumlah_event_per_batch] [jumlah_ulangan]
+#
+# "Sebelum": body -> json.loads -> validasi Union[Event, List[Event]] (jalur parameter FastAPI)
+#            -> json.dumps(payload) + isoformat() per event (jalur storage lama)
+# "Sesudah": body -> TypeAdapter(List[Event]).validate_json (satu langkah)
+#            -> payload_json (pydantic-core, sekali) + timestamp_us per event
+
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import List, Union
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pydantic import TypeAdapter
+
+from src.models import Event, parse_events_json
+
+BATCH_SIZE = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+REPEAT = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+LEGACY_ADAPTER = TypeAdapter(Union[Event, List[Event]])
+
+
+def make_body() -> bytes:
+    events = [
+        {
+            "topic": "auth.prod",
+            "event_id": str(uuid.uuid4()),
+            "timestamp": datetime.utcnow().isoformat(),
+            "source": "bench",
+            "payload": {"index": i, "user": f"user-{i % 97}", "action": "login", "ok": True, "latency_ms": 12.5},
+        }
+        for i in range(BATCH_SIZE)
+    ]
+    return json.dumps(events).encode()
+
+
+def legacy_path(body: bytes):
+    events = LEGACY_ADAPTER.validate_python(json.loads(body))
+    for event in events:
+        json.dumps(event.payload)
+        event.timestamp.isoformat()
+
+
+def fast_path(body: bytes):
+    for event in parse_events_json(body):
+        event.payload_json
+        event.timestamp_us
+
+
+def bench(func, body: bytes) -> float:
+    func(body) # warm-up
+    start = time.process_time()
+    for _ in range(REPEAT):
+        func(body)
+    elapsed = time.process_time() - start
+    return BATCH_SIZE * REPEAT / elapsed
+
+
+if __name__ == "__main__":
+    body = make_body()
+    print(f"--- Benchmark Codec ({BATCH_SIZE} event/batch x {REPEAT}, {len(body) / BATCH_SIZE:.0f} byte/event) ---")
+    legacy = bench(legacy_path, body)
+    fast = bench(fast_path, body)
+    print(f"Sebelum : {legacy:,.0f} events/detik/core")
+    print(f"Sesudah : {fast:,.0f} events/detik/core")
+    print(f"Speedup : {fast / legacy:.2f}x")
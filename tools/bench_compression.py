@@ -0,0 +1,176 @@
+# Laporan kompresi payload: rasio dan biaya CPU per mode (teks JSON, deflate, deflate + dictionary
+# per topic) dan level zlib, lalu efek end-to-end di SQLite (ukuran file, throughput tulis,
+# latensi /events dan export NDJSON) dengan DB sementara per mode.
+# Jalankan:
+#   python tools/bench_compression.py
+#   python tools/bench_compression.py --events 200000 --levels 1,6,9 --output hasil.json
+#
+# Payload sintetis meniru log aplikasi yang berulang (access log HTTP, error dengan stack trace,
+# audit), ditentukan --seed agar run antar commit bisa dibandingkan.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# DB benchmark ditaruh di folder sementara agar tidak menyentuh data/dedup_store.db
+os.environ["AGGREGATOR_DB_FOLDER"] = tempfile.mkdtemp(prefix="bench_compression_")
+
+import benchmark
+from src import config, database, payload_codec
+from src.models import Event
+
+MODES = {
+    "json": {"PAYLOAD_COMPRESSION": False},
+    "deflate": {"PAYLOAD_COMPRESSION": True, "PAYLOAD_DICT_SAMPLES": 0},
+    "deflate_dict": {"PAYLOAD_COMPRESSION": True},
+}
+PATHS = ["/api/v1/orders", "/api/v1/users/{id}", "/api/v1/cart", "/health", "/api/v1/payments/{id}/capture"]
+AGENTS = ["Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+          "okhttp/4.12.0", "python-httpx/0.27.0"]
+FRAMES = ["app/handlers/orders.py", "app/services/payment.py", "app/db/session.py", "lib/retry.py"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rasio dan biaya CPU kompresi payload di SQLite.")
+    parser.add_argument("--events", type=int, default=50000, help="jumlah event per mode (default: 50000)")
+    parser.add_argument("--topics", type=int, default=4, help="jumlah topic (default: 4)")
+    parser.add_argument("--levels", default="1,6,9", help="level zlib untuk laporan codec (default: 1,6,9)")
+    parser.add_argument("--batch-size", type=int, default=500, help="event per transaksi tulis (default: 500)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="tulis hasil JSON ke file ini (default: stdout)")
+    args = parser.parse_args(argv)
+    args.level_list = [int(value) for value in args.levels.split(",") if value.strip()]
+    return args
+
+
+def make_payload(rng: random.Random, kind: int, i: int) -> dict:
+    if kind == 0:
+        path = rng.choice(PATHS).replace("{id}", str(rng.randrange(100000)))
+        return {"level": "INFO", "logger": "http.access", "method": rng.choice(["GET", "POST"]), "path": path,
+                "status": rng.choice([200, 200, 200, 201, 404, 500]), "duration_ms": round(rng.uniform(1, 900), 2),
+                "user_agent": rng.choice(AGENTS), "request_id": f"{rng.getrandbits(64):016x}", "bytes": rng.randrange(20000)}
+    if kind == 1:
+        frames = [f'  File "{rng.choice(FRAMES)}", line {rng.randrange(20, 400)}, in handle' for _ in range(rng.randrange(3, 7))]
+        return {"level": "ERROR", "logger": "app.worker", "message": f"Timeout while calling payment gateway (attempt {i % 5})",
+                "exception": "TimeoutError", "traceback": "Traceback (most recent call last):\n" + "\n".join(frames),
+                "order_id": f"ord-{rng.randrange(10 ** 6)}", "host": f"worker-{rng.randrange(12)}"}
+    return {"level": "INFO", "logger": "audit", "action": rng.choice(["login", "logout", "update_profile", "export"]),
+            "actor": f"user-{rng.randrange(5000)}", "ip": f"10.0.{rng.randrange(256)}.{rng.randrange(256)}",
+            "result": "success", "tenant": f"tenant-{rng.randrange(40)}"}
+
+
+def make_events(args) -> list[Event]:
+    rng = random.Random(args.seed)
+    base_time = datetime(2024, 1, 1)
+    events = []
+    for i in range(args.events):
+        topic = i % args.topics
+        events.append(Event(topic=f"logs.t{topic}", event_id=f"c{i}", source=f"svc-{topic}",
+                            timestamp=base_time + timedelta(milliseconds=i), payload=make_payload(rng, topic % 3, i)))
+    return events
+
+
+def codec_report(events: list[Event], levels: list[int]) -> dict:
+    """Rasio dan µs/baris kompresi + dekompresi murni (tanpa SQLite) per topic, per level."""
+    by_topic: dict[str, list[bytes]] = {}
+    for event in events:
+        by_topic.setdefault(event.topic, []).append(event.payload_json.encode("utf-8"))
+    raw_bytes = sum(len(data) for rows in by_topic.values() for data in rows)
+    report = {"rows": len(events), "raw_bytes": raw_bytes, "avg_payload_bytes": round(raw_bytes / len(events), 1)}
+    for level in levels:
+        for use_dict in (False, True):
+            stored = compress_seconds = decompress_seconds = 0.0
+            for rows in by_topic.values():
+                zdict = payload_codec.train_dictionary(rows[:config.PAYLOAD_DICT_SAMPLES], config.PAYLOAD_DICT_BYTES) if use_dict else None
+                started = time.perf_counter()
+                blobs = [payload_codec.compress(data, level, zdict) for data in rows]
+                compress_seconds += time.perf_counter() - started
+                started = time.perf_counter()
+                for blob in blobs:
+                    payload_codec.decompress(blob, zdict)
+                decompress_seconds += time.perf_counter() - started
+                stored += sum(len(blob) for blob in blobs)
+            report[f"level{level}{'_dict' if use_dict else ''}"] = {
+                "ratio": round(raw_bytes / stored, 2),
+                "compress_us_per_row": round(compress_seconds / len(events) * 1e6, 2),
+                "decompress_us_per_row": round(decompress_seconds / len(events) * 1e6, 2),
+            }
+    return report
+
+
+def storage_report(events: list[Event], args, overrides: dict) -> dict:
+    """Tulis semua event ke DB baru dengan konfigurasi mode ini, lalu ukur file dan jalur baca."""
+    original = {name: getattr(config, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    try:
+        database.delete_database_files()
+        database.setup_database()
+        started = time.perf_counter()
+        for i in range(0, len(events), args.batch_size):
+            database.insert_events_batch(events[i:i + args.batch_size])
+        write_seconds = time.perf_counter() - started
+        with database._writer(0) as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            stored_payload_bytes = conn.execute("SELECT SUM(LENGTH(payload)) FROM processed_events").fetchone()[0]
+        file_bytes = os.path.getsize(database.DB_NAME)
+
+        write_stats = database.payload_compression_stats()
+        database._payload_codec.clear() # baca dingin: dictionary dimuat dari DB seperti proses baru
+        page_ms = []
+        for topic in sorted({event.topic for event in events}):
+            after = None
+            for _ in range(5):
+                started = time.perf_counter()
+                _, after = database.get_events_page(topic=topic, after=after, limit=1000)
+                page_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        exported = sum(chunk.count("\n") for chunk in database.stream_events_ndjson())
+        export_seconds = time.perf_counter() - started
+        return {
+            "write_events_per_sec": round(len(events) / write_seconds, 1),
+            "file_bytes": file_bytes,
+            "file_bytes_per_event": round(file_bytes / len(events), 1),
+            "payload_bytes_stored": stored_payload_bytes,
+            "events_page_1000_ms": benchmark.summarize(page_ms),
+            "ndjson_export_events_per_sec": round(exported / export_seconds, 1),
+            "codec": {**write_stats, **{key: value for key, value in database.payload_compression_stats().items()
+                                        if key.startswith(("rows_decompressed", "decompress"))}},
+        }
+    finally:
+        database.delete_database_files()
+        for name, value in original.items():
+            setattr(config, name, value)
+
+
+def run(args) -> dict:
+    events = make_events(args)
+    results = {
+        "meta": {
+            "commit": benchmark.git_commit(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "level_list")},
+            "config": {name: getattr(config, name) for name in (
+                "PAYLOAD_COMPRESS_MIN_BYTES", "PAYLOAD_COMPRESS_LEVEL", "PAYLOAD_DICT_SAMPLES", "PAYLOAD_DICT_BYTES")},
+        },
+        "codec": codec_report(events, args.level_list),
+        "storage": {},
+    }
+    benchmark.log(json.dumps(results["codec"], indent=2))
+    for mode, overrides in MODES.items():
+        benchmark.log(f"--- Mode: {mode} ---")
+        results["storage"][mode] = storage_report(events, args, overrides)
+        benchmark.log(json.dumps({k: v for k, v in results["storage"][mode].items() if k != "codec"}, indent=2))
+    return results
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    benchmark.write_results(run(args), args.output)
@@ -0,0 +1,188 @@
+# Benchmark logging di jalur consumer: throughput consumer_task (dedup + tulis SQLite, shard dan
+# thread pool seperti di lifespan) untuk event yang sudah ada di queue, per konfigurasi log:
+#   off              tanpa log per event (hanya log start/stop consumer)
+#   per-event-sync   pola lama: satu logging.info per event, StreamHandler langsung di event loop
+#   per-event-queue  satu log per event, lewat queue + thread writer (src/log_pipeline.py)
+#   sample-1000      1 dari 1000 event ditulis, lewat queue
+#   summary          ringkasan per topic setiap detik, lewat queue (default layanan)
+# Log ditulis ke file di folder sementara (seperti stderr yang dialihkan Docker ke file).
+# --write-latency-us menambah jeda per write untuk meniru stderr yang tersendat (pipe/terminal
+# yang lambat dibaca): di situ bedanya write di event loop dan di thread writer terlihat.
+# Jalankan:
+#   python tools/bench_logging.py
+#   python tools/bench_logging.py --events 100000 --repeat 3 --output hasil.json
+#   python tools/bench_logging.py --modes off,per-event-sync,per-event-queue,summary --write-latency-us 50
+#
+# Kolom hasil:
+#   throughput_eps       event/detik sampai semua queue shard selesai (queue.join)
+#   cpu_us_per_event     CPU proses (semua thread) selama periode yang sama
+#   writer_drain_s       sisa waktu thread writer menulis record yang masih antre setelah itu
+#   log_lines, log_bytes isi file log run terakhir
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# DB dan file log benchmark ditaruh di folder sementara agar tidak menyentuh data/dedup_store.db
+WORK_FOLDER = tempfile.mkdtemp(prefix="bench_logging_")
+os.environ["AGGREGATOR_DB_FOLDER"] = WORK_FOLDER
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+from src import config, database
+from src import main as aggregator
+from src.log_pipeline import LOG_FORMAT, EventLogSampler, setup_logging
+from src.models import CompactEvent, Event
+
+MODES = ("off", "per-event-sync", "per-event-queue", "sample-1000", "summary")
+SAMPLERS = {
+    "off": lambda: EventLogSampler(),
+    "per-event-sync": lambda: EventLogSampler(sample_every=1),
+    "per-event-queue": lambda: EventLogSampler(sample_every=1),
+    "sample-1000": lambda: EventLogSampler(sample_every=1000),
+    "summary": lambda: EventLogSampler(summary_seconds=1.0),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput consumer dengan logging per event, sampling, ringkasan, dan tanpa log.")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"daftar mode dipisah koma (default: {','.join(MODES)})")
+    parser.add_argument("--events", type=int, default=50000, help="event per run (default: 50000)")
+    parser.add_argument("--dup-ratio", type=float, default=0.2, help="proporsi event duplikat (default: 0.2)")
+    parser.add_argument("--topics", type=int, default=3, help="jumlah topic berbeda (default: 3)")
+    parser.add_argument("--write-latency-us", type=float, default=0, help="jeda per write ke file log, mikrodetik (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="run per mode, yang tercepat dilaporkan (default: 3)")
+    parser.add_argument("--output", default=None, help="tulis hasil JSON ke file ini (default: stdout)")
+    args = parser.parse_args(argv)
+    args.mode_list = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in args.mode_list if mode not in MODES]
+    if unknown:
+        parser.error(f"mode tidak dikenal: {', '.join(unknown)}")
+    return args
+
+
+def make_events(args) -> list:
+    """Event ringkas seperti hasil enqueue_events, dengan proporsi duplikat dup_ratio."""
+    num_unique = max(1, int(args.events * (1 - args.dup_ratio)))
+    return [
+        CompactEvent.from_event(Event(
+            topic=f"bench.{i % num_unique % args.topics}", event_id=f"log-{i % num_unique}", source="bench",
+            payload={"index": i % num_unique, "message": "GET /api/v1/orders 200 12ms"},
+        ))
+        for i in range(args.events)
+    ]
+
+
+class SlowStream:
+    """File log dengan jeda per write (time.sleep melepas GIL, seperti write yang terblokir)."""
+
+    def __init__(self, path: str, latency_s: float):
+        self.file = open(path, "w", encoding="utf-8")
+        self.latency_s = latency_s
+
+    def write(self, text: str):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def remove_root_handlers():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+
+
+def configure_logging(mode: str, log_path: str, latency_s: float):
+    """Mengganti handler root sesuai mode. Mengembalikan (listener atau None, file log)."""
+    remove_root_handlers()
+    stream = SlowStream(log_path, latency_s)
+    if mode == "per-event-sync":
+        # Seperti logging.basicConfig sebelumnya: format dan write di thread pemanggil
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.INFO)
+        return None, stream
+    return setup_logging(logging.INFO, stream=stream), stream
+
+
+async def run_once(mode: str, events: list, log_path: str, latency_s: float) -> dict:
+    listener, stream = configure_logging(mode, log_path, latency_s)
+    database.delete_database_files()
+    database.setup_database()
+    aggregator.dedup_cache.clear()
+    aggregator.event_log = SAMPLERS[mode]()
+
+    shards = config.CONSUMER_SHARDS
+    queues = [asyncio.Queue() for _ in range(shards)]
+    for event in events:
+        queues[aggregator.shard_for(event.topic, event.event_id)].put_nowait(event)
+    executor = ThreadPoolExecutor(max_workers=shards, thread_name_prefix="db-writer")
+    tasks = [asyncio.create_task(aggregator._event_log_summary_loop())] if mode == "summary" else []
+
+    started, started_cpu = time.perf_counter(), time.process_time()
+    tasks += [asyncio.create_task(aggregator.consumer_task(queue, shard_id, executor))
+              for shard_id, queue in enumerate(queues)]
+    await asyncio.gather(*(queue.join() for queue in queues))
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - started_cpu
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    executor.shutdown(wait=True)
+    if mode == "summary":
+        aggregator.event_log.flush_summary()
+    drain_started = time.perf_counter()
+    if listener is not None:
+        listener.stop()
+    drain = time.perf_counter() - drain_started
+    database.close_database()
+    remove_root_handlers()
+    stream.close()
+    with open(log_path, "rb") as f:
+        data = f.read()
+    return {
+        "throughput_eps": round(len(events) / elapsed, 1),
+        "cpu_us_per_event": round(cpu / len(events) * 1e6, 2),
+        "writer_drain_s": round(drain, 4),
+        "log_lines": data.count(b"\n"),
+        "log_bytes": len(data),
+    }
+
+
+async def main(args) -> dict:
+    events = make_events(args)
+    runs = []
+    for mode in args.mode_list:
+        log_path = os.path.join(WORK_FOLDER, f"{mode}.log")
+        results = [await run_once(mode, events, log_path, args.write_latency_us / 1e6) for _ in range(args.repeat)]
+        best = max(results, key=lambda result: result["throughput_eps"])
+        runs.append({"mode": mode, "events": len(events), **best})
+        benchmark.log(f"{mode}: {best['throughput_eps']:,.0f} ev/s, {best['cpu_us_per_event']} µs CPU/event, "
+                      f"{best['log_lines']} baris log")
+    baseline = next((run["throughput_eps"] for run in runs if run["mode"] == "off"), None)
+    for run in runs:
+        run["relative_to_off"] = round(run["throughput_eps"] / baseline, 3) if baseline else None
+    return {
+        "cpu_count": os.cpu_count(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "mode_list")},
+        "consumer_shards": config.CONSUMER_SHARDS,
+        "batch_size": config.CONSUMER_BATCH_SIZE,
+        "runs": runs,
+    }
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    benchmark.write_results(asyncio.run(main(args)), args.output)
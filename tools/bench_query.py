@@ -0,0 +1,134 @@
+# Benchmark query /events vs ukuran tabel: tabel diisi bertahap dengan baris sintetis (langsung lewat
+# SQL, tanpa jalur ingest) sampai setiap ukuran di --sizes, lalu latensi query investigasi yang umum
+# diukur di setiap tahap. Jendela waktu yang di-query tetap sama, jadi jika query hanya menyentuh
+# baris yang cocok, latensinya datar walaupun tabel terus membesar.
+# Jalankan:
+#   python tools/bench_query.py                                         # 100 rb, 1 jt, 5 jt baris
+#   python tools/bench_query.py --sizes 1000000,10000000,30000000 --output hasil.json
+#
+# Data: 1 event per --step-us (default 1 ms) mulai 2024-01-01 00:00 UTC, topic = n % --topics,
+# source = (n / --topics) % --sources; processed_at = timestamp event (resolusi detik).
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+
+BASE_TIME = datetime(2024, 1, 1)
+LOAD_CHUNK_ROWS = 500000
+
+LOAD_SQL = '''
+    WITH RECURSIVE seq(n) AS (SELECT ? UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+    INSERT INTO processed_events (topic, event_id, ts_us, source, payload, processed_at)
+    SELECT 'topic-' || (n % :topics), 'e' || n, :base_us + n * :step_us,
+           'src-' || ((n / :topics) % :sources), '{"n":' || n || ',"msg":"synthetic"}',
+           strftime('%Y-%m-%d %H:%M:%S', :base_s + (n * :step_us) / 1000000, 'unixepoch')
+    FROM seq
+'''
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Latensi query /events (SQLite) terhadap ukuran tabel.")
+    parser.add_argument("--sizes", default="100000,1000000,5000000", help="ukuran tabel (baris) per tahap, dipisah koma")
+    parser.add_argument("--topics", type=int, default=50, help="jumlah topic (default: 50)")
+    parser.add_argument("--sources", type=int, default=20, help="jumlah source per topic (default: 20)")
+    parser.add_argument("--step-us", type=int, default=1000, help="jarak waktu antar event, mikrodetik (default: 1000)")
+    parser.add_argument("--window-minutes", type=float, default=1, help="lebar jendela waktu query (default: 1)")
+    parser.add_argument("--limit", type=int, default=100, help="limit halaman /events (default: 100)")
+    parser.add_argument("--repeat", type=int, default=30, help="ulangan per query per tahap (default: 30)")
+    parser.add_argument("--db-folder", default=None, help="folder SQLite (default: folder sementara)")
+    parser.add_argument("--output", default=None, help="tulis hasil JSON ke file ini (default: stdout)")
+    args = parser.parse_args(argv)
+    args.size_list = sorted(int(value) for value in args.sizes.split(",") if value.strip())
+    return args
+
+
+def load_rows(database, start: int, end: int, args):
+    """Menambah baris n = start..end-1 per chunk (satu transaksi per chunk, synchronous=OFF)."""
+    base_us = int((BASE_TIME - datetime(1970, 1, 1)).total_seconds() * 1_000_000)
+    with database._writer(0) as conn:
+        conn.execute("PRAGMA synchronous=OFF")
+        for chunk_start in range(start, end, LOAD_CHUNK_ROWS):
+            chunk_end = min(end, chunk_start + LOAD_CHUNK_ROWS) - 1
+            conn.execute("BEGIN")
+            conn.execute(LOAD_SQL.replace("?", str(chunk_start), 1).replace("?", str(chunk_end), 1), {
+                "topics": args.topics, "sources": args.sources, "step_us": args.step_us,
+                "base_us": base_us, "base_s": base_us // 1_000_000,
+            })
+            conn.execute("COMMIT")
+        conn.execute(f"PRAGMA synchronous={database.config.SQLITE_SYNCHRONOUS}")
+
+
+def query_cases(args):
+    """Query yang diukur: jendela waktu tetap di awal data (mulai 30 detik setelah event pertama)."""
+    since = BASE_TIME + timedelta(seconds=30)
+    until = since + timedelta(minutes=args.window_minutes)
+    window = {"since": since, "until": until}
+    return {
+        "topic_source_window_timestamp": dict(topic="topic-7", source="src-3", time_field="timestamp", **window),
+        "topic_source_window_processed_at": dict(topic="topic-7", source="src-3", time_field="processed_at", **window),
+        "topic_window_timestamp": dict(topic="topic-7", time_field="timestamp", **window),
+        "source_window_timestamp": dict(source="src-3", time_field="timestamp", **window),
+        "topic_latest_desc": dict(topic="topic-7", time_field="timestamp", descending=True),
+        "topic_window_page5": dict(topic="topic-7", time_field="timestamp", page=5, **window),
+    }
+
+
+def measure(database, params: dict, limit: int, repeat: int) -> dict:
+    params = dict(params)
+    page = params.pop("page", 1)
+    after = None
+    for _ in range(page - 1):
+        _, after = database.get_events_page(limit=limit, after=after, **params)
+    timings, rows = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        events, _ = database.get_events_page(limit=limit, after=after, **params)
+        timings.append((time.perf_counter() - started) * 1000)
+        rows = len(events)
+    return {"rows": rows, "latency_ms": benchmark.summarize(timings)}
+
+
+def run(args) -> dict:
+    os.environ["AGGREGATOR_DB_FOLDER"] = args.db_folder or tempfile.mkdtemp(prefix="bench_query_")
+    os.environ["AGGREGATOR_STORAGE_PARTITIONS"] = "1"
+    from src import database
+    database.delete_database_files()
+    database.setup_database()
+
+    results = {"meta": {"commit": benchmark.git_commit(), "params": {
+        key: value for key, value in vars(args).items() if key not in ("output", "size_list")
+    }, "db_folder": database.DB_FOLDER}, "stages": []}
+    loaded = 0
+    for size in args.size_list:
+        benchmark.log(f"--- Mengisi tabel sampai {size:,} baris ---")
+        started = time.perf_counter()
+        load_rows(database, loaded, size, args)
+        load_seconds = time.perf_counter() - started
+        loaded = size
+        stage = {
+            "rows": size,
+            "load_rows_per_sec": round((size - (results["stages"][-1]["rows"] if results["stages"] else 0)) / load_seconds, 1),
+            "db_bytes": os.path.getsize(database.DB_NAME),
+            "queries": {},
+        }
+        for name, params in query_cases(args).items():
+            stage["queries"][name] = measure(database, params, args.limit, args.repeat)
+            benchmark.log(f"{name}: p50 {stage['queries'][name]['latency_ms']['p50']} ms "
+                          f"({stage['queries'][name]['rows']} baris)")
+        results["stages"].append(stage)
+    database.close_database()
+    return results
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    benchmark.write_results(run(args), args.output)
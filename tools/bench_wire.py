@@ -0,0 +1,202 @@
+# Benchmark format wire: byte di jaringan dan CPU per event untuk setiap format body /publish
+# (JSON, JSON+gzip, MessagePack, MessagePack+gzip, NDJSON+gzip lewat /publish/stream) dan
+# setiap format respons /events (JSON, MessagePack, NDJSON, masing-masing dengan/tanpa gzip).
+# App dijalankan in-process (ASGI, DB sementara) dengan payload log sintetis yang verbose.
+# Jalankan:
+#   python tools/bench_wire.py
+#   python tools/bench_wire.py --events 50000 --batch-size 500 --output hasil.json
+#
+# Kolom hasil /publish:
+#   bytes_per_event       ukuran body yang dikirim per event
+#   encode_us_per_event   CPU klien untuk membuat body
+#   decode_us_per_event   CPU server untuk membuka body (gzip) + parse + validasi menjadi Event
+#                         (fungsi yang sama dengan /publish, diukur terpisah dengan process_time)
+#   e2e_cpu_us_per_event  CPU seluruh proses dari request pertama sampai semua event tersimpan
+#                         (termasuk jalur tulis SQLite yang sama untuk semua format)
+# Kolom hasil /events: bytes_per_event (byte mentah di jaringan) dan cpu_us_per_event (server +
+# transport ASGI, body tidak didekode klien).
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+
+LEVELS = ("DEBUG", "INFO", "INFO", "INFO", "WARN", "ERROR")
+PATHS = ("/api/v1/orders", "/api/v1/users/me", "/api/v1/items", "/healthz", "/api/v1/payments/charge")
+AGENTS = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36",
+          "okhttp/4.12.0", "python-httpx/0.28.1")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Byte dan CPU per event untuk format body /publish dan /events.")
+    parser.add_argument("--events", type=int, default=20000, help="event per format (default: 20000)")
+    parser.add_argument("--batch-size", type=int, default=500, help="event per request /publish (default: 500)")
+    parser.add_argument("--gzip-level", type=int, default=1, help="level gzip body /publish (default: 1)")
+    parser.add_argument("--repeat", type=int, default=3, help="ulangan pengukuran decode (default: 3)")
+    parser.add_argument("--seed", type=int, default=42, help="seed workload (default: 42)")
+    parser.add_argument("--output", default=None, help="tulis hasil JSON ke file ini (default: stdout)")
+    args = parser.parse_args(argv)
+    # Parameter yang dibutuhkan benchmark.InProcessTarget
+    args.db_folder, args.log_level = None, "WARNING"
+    return args
+
+
+def make_events(count: int, prefix: str, seed: int) -> list:
+    """Event log sintetis: field berulang (level, path, user agent) seperti log HTTP sungguhan."""
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        path = rng.choice(PATHS)
+        status = rng.choice((200, 200, 200, 201, 404, 500))
+        events.append({
+            "topic": f"app.{rng.choice(('api', 'worker', 'auth'))}",
+            "event_id": f"{prefix}-{i}",
+            "timestamp": f"2024-01-01T00:{(i // 60000) % 60:02d}:{(i // 1000) % 60:02d}.{i % 1000:03d}000",
+            "source": f"svc-{rng.randrange(8)}",
+            "payload": {
+                "level": rng.choice(LEVELS),
+                "message": f"{rng.choice(('GET', 'POST'))} {path} {status} {rng.randrange(1, 900)}ms",
+                "http": {"method": "GET", "path": path, "status": status, "user_agent": rng.choice(AGENTS)},
+                "request_id": f"{rng.getrandbits(64):016x}",
+                "host": f"ip-10-0-{rng.randrange(4)}-{rng.randrange(256)}.ec2.internal",
+            },
+        })
+    return events
+
+
+def encode_bodies(events: list, fmt: str, batch_size: int, level: int):
+    """(path, body, header) per batch untuk satu format."""
+    import msgpack
+    requests = []
+    for start in range(0, len(events), batch_size):
+        batch = events[start:start + batch_size]
+        if fmt.startswith("json"):
+            path, body, headers = "/publish", json.dumps(batch, separators=(",", ":")).encode(), {"Content-Type": "application/json"}
+        elif fmt.startswith("msgpack"):
+            path, body, headers = "/publish", msgpack.packb(batch), {"Content-Type": "application/msgpack"}
+        else:
+            body = "\n".join(json.dumps(event, separators=(",", ":")) for event in batch).encode()
+            path, headers = "/publish/stream", {"Content-Type": "application/x-ndjson"}
+        if fmt.endswith("gzip"):
+            body = gzip.compress(body, compresslevel=level)
+            headers = {**headers, "Content-Encoding": "gzip"}
+        requests.append((path, body, headers))
+    return requests
+
+
+def measure_decode(requests: list, config, repeat: int) -> float:
+    """CPU (detik) untuk membuka dan memvalidasi semua body, seperti yang dilakukan /publish(/stream)."""
+    from src.models import Event, parse_events_json
+    from src.wire import decode_body, is_msgpack, parse_events_msgpack
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        for path, body, headers in requests:
+            raw = decode_body(body, headers.get("Content-Encoding"), config.PUBLISH_MAX_DECODED_BYTES)
+            if path == "/publish/stream":
+                [Event.model_validate_json(line) for line in raw.splitlines()]
+            elif is_msgpack(headers["Content-Type"]):
+                parse_events_msgpack(raw)
+            else:
+                parse_events_json(raw)
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+async def run_publish(target, args, fmt: str) -> dict:
+    events = make_events(args.events, fmt, args.seed)
+    started = time.process_time()
+    requests = encode_bodies(events, fmt, args.batch_size, args.gzip_level)
+    encode_cpu = time.process_time() - started
+    decode_cpu = measure_decode(requests, target.config, args.repeat)
+
+    client = target.client
+    before = await benchmark.get_stats(client)
+    started_cpu, started = time.process_time(), time.perf_counter()
+    for path, body, headers in requests:
+        response = await client.post(path, content=body, headers=headers)
+        if response.status_code != 202:
+            raise RuntimeError(f"{fmt}: HTTP {response.status_code} - {response.text[:200]}")
+    after = await benchmark.wait_processed(client, benchmark.processed_count(before) + len(events), 0.005, 300)
+    e2e_cpu, elapsed = time.process_time() - started_cpu, time.perf_counter() - started
+    count = len(events)
+    return {
+        "format": fmt,
+        "events": count,
+        "bytes_per_event": round(sum(len(body) for _, body, _ in requests) / count, 1),
+        "encode_us_per_event": round(encode_cpu / count * 1e6, 2),
+        "decode_us_per_event": round(decode_cpu / count * 1e6, 2),
+        "e2e_cpu_us_per_event": round(e2e_cpu / count * 1e6, 2),
+        "e2e_throughput_eps": round(count / elapsed, 1),
+        "check": benchmark.check_counts(before, after, count, 0),
+    }
+
+
+async def run_events(target, fmt: str, use_gzip: bool, limit: int = 1000) -> dict:
+    client = target.client
+    params = {"limit": limit, "format": fmt}
+    headers = {"Accept-Encoding": "gzip" if use_gzip else "identity"}
+    total_bytes = total_events = 0
+    started = time.process_time()
+    if fmt == "ndjson":
+        async with client.stream("GET", "/events", params={"format": "ndjson"}, headers=headers) as response:
+            async for chunk in response.aiter_raw():
+                total_bytes += len(chunk)
+        total_events = (await benchmark.get_stats(client))["unique_processed"]
+    else:
+        after = None
+        while True:
+            async with client.stream("GET", "/events", params={**params, **({"after": after} if after else {})},
+                                     headers=headers) as response:
+                raw = b"".join([chunk async for chunk in response.aiter_raw()])
+                after = response.headers.get("x-next-cursor")
+            total_bytes += len(raw)
+            total_events += limit if after else 0
+            if not after:
+                body = gzip.decompress(raw) if use_gzip and raw[:2] == b"\x1f\x8b" else raw
+                if fmt == "json":
+                    total_events += len(json.loads(body))
+                else:
+                    import msgpack
+                    total_events += len(msgpack.unpackb(body))
+                break
+    cpu = time.process_time() - started
+    return {
+        "format": fmt + ("+gzip" if use_gzip else ""),
+        "events": total_events,
+        "bytes_per_event": round(total_bytes / total_events, 1),
+        "cpu_us_per_event": round(cpu / total_events * 1e6, 2),
+    }
+
+
+async def main(args) -> dict:
+    target = benchmark.InProcessTarget(args)
+    target.wipe()
+    await target.start()
+    try:
+        publish = []
+        for fmt in ("json", "json+gzip", "msgpack", "msgpack+gzip", "ndjson+gzip"):
+            publish.append(await run_publish(target, args, fmt))
+            benchmark.log(json.dumps(publish[-1]))
+        events = []
+        for fmt in ("json", "msgpack", "ndjson"):
+            for use_gzip in (False, True):
+                events.append(await run_events(target, fmt, use_gzip))
+                benchmark.log(json.dumps(events[-1]))
+    finally:
+        await target.stop()
+    return {"params": {key: value for key, value in vars(args).items() if key != "output"}, "publish": publish, "events": events}
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    benchmark.write_results(asyncio.run(main(args)), args.output)
@@ -0,0 +1,124 @@
+# Benchmark skala multi-worker: server dijalankan dengan uvicorn --workers N (satu run per N,
+# folder data sementara yang baru), lalu skenario ingest tools/benchmark.py dikirim lewat HTTP.
+# Jalankan:
+#   python tools/bench_workers.py                                  # N = 1,2,4
+#   python tools/bench_workers.py --workers 1,2 --events 50000 --concurrency 16 --output hasil.json
+# Argumen lain diteruskan ke benchmark.py (--events, --dup-ratio, --batch-size, --concurrency, ...).
+#
+# Throughput hanya bisa naik jika ada core kosong: cpu_count ikut dicatat di hasil, dan
+# generator beban (proses ini) berbagi CPU yang sama dengan server.
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import benchmark
+
+STARTUP_TIMEOUT_SECONDS = 60
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark throughput ingest vs jumlah worker uvicorn.")
+    parser.add_argument("--workers", default="1,2,4", help="daftar jumlah worker, dipisah koma (default: 1,2,4)")
+    parser.add_argument("--port", type=int, default=0, help="port server (default: port kosong acak)")
+    parser.add_argument("--output", default=None, help="tulis hasil JSON ke file ini (default: stdout)")
+    args, rest = parser.parse_known_args(argv)
+    args.worker_counts = [int(value) for value in args.workers.split(",") if value.strip()]
+    return args, rest
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, db_folder: str, log_level: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "AGGREGATOR_DB_FOLDER": db_folder,
+        "AGGREGATOR_WORKERS": str(workers),
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", log_level.lower()],
+        cwd=benchmark.ROOT, env=env,
+        # Log per event (level INFO) di aplikasi ikut membebani server, jadi dibuang
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGINT) # shutdown normal: queue dikosongkan, status worker dihapus
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def wait_ready(url: str, workers: int, process: subprocess.Popen):
+    """Menunggu sampai semua worker menulis status (mode multi-worker) atau / merespons (satu worker)."""
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    async with httpx.AsyncClient(base_url=url, timeout=5.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server berhenti saat startup (exit code {process.returncode})")
+            try:
+                stats = (await client.get("/stats")).json()
+                if workers == 1 or len(stats.get("workers", [])) >= workers:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server dengan {workers} worker tidak siap dalam {STARTUP_TIMEOUT_SECONDS} detik")
+
+
+async def run_one(workers: int, args, bench_argv) -> dict:
+    port = args.port or free_port()
+    url = f"http://127.0.0.1:{port}"
+    bench_args = benchmark.parse_args(["--scenario", "ingest"] + bench_argv + ["--url", url])
+    with tempfile.TemporaryDirectory(prefix="aggregator-workers-") as db_folder:
+        process = start_server(workers, port, db_folder, bench_args.log_level)
+        try:
+            await wait_ready(url, workers, process)
+            result = await benchmark.run(bench_args)
+        finally:
+            stop_server(process)
+    ingest = result["scenarios"]["ingest"]
+    return {
+        "workers": workers,
+        "ack_throughput_eps": ingest["publish"]["ack_throughput_eps"],
+        "e2e_throughput_eps": ingest["e2e_throughput_eps"],
+        "e2e_latency_ms": ingest["e2e_latency_ms"],
+        "check": ingest["check"],
+        "meta": result["meta"],
+    }
+
+
+async def main(args, bench_argv) -> dict:
+    runs = []
+    for workers in args.worker_counts:
+        benchmark.log(f"=== {workers} worker ===")
+        runs.append(await run_one(workers, args, bench_argv))
+    baseline = runs[0]["e2e_throughput_eps"] if runs else 0
+    for item in runs:
+        item["speedup"] = round(item["e2e_throughput_eps"] / baseline, 2) if baseline else None
+        benchmark.log(f"{item['workers']} worker: ack {item['ack_throughput_eps']:,.0f} ev/s, "
+                      f"tersimpan {item['e2e_throughput_eps']:,.0f} ev/s (x{item['speedup']})")
+    return {"cpu_count": os.cpu_count(), "runs": runs}
+
+
+if __name__ == "__main__":
+    args, bench_argv = parse_args()
+    benchmark.write_results(asyncio.run(main(args, bench_argv)), args.output)
@@ -0,0 +1,576 @@
+# Benchmark suite aggregator: workload bisa diulang (seed tetap), hasil dalam JSON.
+# Jalankan:
+#   python tools/benchmark.py                                   # semua skenario, in-process (tanpa jaringan)
+#   python tools/benchmark.py --scenario ingest --events 50000 --dup-ratio 0.3 --output hasil.json
+#   python tools/benchmark.py --url http://127.0.0.1:8080 --scenario ingest,query   # server yang sudah jalan
+#
+# Skenario:
+#   ingest        publish workload (dengan duplikat), ukur latensi ack DAN latensi end-to-end
+#                 (publish -> event terlihat di /events), throughput ack vs throughput sampai tersimpan.
+#   dedup         publish semua event unik, lalu kirim ulang semuanya (100% duplikat).
+#   query         isi storage, lalu ukur /events: halaman pertama, filter topic, cursor walk, export NDJSON.
+#   cold-restart  isi storage, restart aplikasi, ukur waktu startup & warm-up Bloom, verifikasi dedup
+#                 setelah restart (hanya mode in-process).
+#
+# Latensi end-to-end diukur dengan polling /events (interval --poll-ms), jadi resolusinya
+# sebesar interval polling dan polling itu sendiri ikut membebani server.
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ("ingest", "dedup", "query", "cold-restart")
+EVENTS_PAGE_LIMIT = 1000 # halaman kecil agar polling ekor (halaman belum penuh) tetap murah
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark suite Pub-Sub Log Aggregator")
+    parser.add_argument("--scenario", default="all",
+                        help=f"daftar skenario dipisah koma: {', '.join(SCENARIOS)} atau all (default: all)")
+    parser.add_argument("--events", type=int, default=10000, help="jumlah event yang dikirim (default: 10000)")
+    parser.add_argument("--dup-ratio", type=float, default=0.2, help="proporsi event duplikat 0..1 (default: 0.2)")
+    parser.add_argument("--batch-size", type=int, default=100, help="event per request /publish (default: 100)")
+    parser.add_argument("--concurrency", type=int, default=8, help="jumlah request bersamaan (default: 8)")
+    parser.add_argument("--payload-bytes", type=int, default=64, help="perkiraan ukuran payload per event (default: 64)")
+    parser.add_argument("--topics", type=int, default=3, help="jumlah topic berbeda (default: 3)")
+    parser.add_argument("--seed", type=int, default=42, help="seed workload (default: 42)")
+    parser.add_argument("--poll-ms", type=float, default=20, help="interval polling /events dan /stats (default: 20)")
+    parser.add_argument("--query-repeat", type=int, default=20, help="ulangan per query di skenario query (default: 20)")
+    parser.add_argument("--timeout", type=float, default=300, help="batas waktu menunggu event tersimpan, detik (default: 300)")
+    parser.add_argument("--url", default=None,
+                        help="base URL server yang sudah jalan (mis. http://127.0.0.1:8080); tanpa ini: in-process")
+    parser.add_argument("--db-folder", default=None, help="folder SQLite untuk mode in-process (default: folder sementara)")
+    parser.add_argument("--log-level", default="WARNING", help="level logging aplikasi di mode in-process (default: WARNING)")
+    parser.add_argument("--output", default=None, help="tulis hasil JSON ke file ini (default: stdout)")
+    args = parser.parse_args(argv)
+    scenarios = SCENARIOS if args.scenario == "all" else tuple(s.strip() for s in args.scenario.split(",") if s.strip())
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"skenario tidak dikenal: {', '.join(unknown)}")
+    if not 0 <= args.dup_ratio < 1:
+        parser.error("--dup-ratio harus di antara 0 dan 1")
+    args.scenarios = scenarios
+    return args
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def summarize(values_ms):
+    """count/mean/p50/p95/p99/max dari daftar latensi (milidetik)."""
+    if not values_ms:
+        return {"count": 0}
+    ordered = sorted(values_ms)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+# --- Workload ---
+class Workload:
+    """
+    Event yang akan dikirim, sudah diserialisasi per batch sebelum pengukuran dimulai.
+    Bentuk workload (topic, posisi duplikat, payload) ditentukan seed; run_id membuat
+    event_id unik per run agar run berulang ke server yang sama tidak jadi duplikat semua.
+    """
+
+    def __init__(self, args, run_id: str, name: str, dup_ratio: float, count: int = None):
+        rng = random.Random(f"{args.seed}-{name}")
+        count = args.events if count is None else count
+        num_unique = max(1, count - int(count * dup_ratio))
+        topics = [f"bench.t{i}" for i in range(max(1, args.topics))]
+        base_time = datetime(2024, 1, 1)
+        filler_chars = max(0, args.payload_bytes - 16) // 2
+
+        unique = []
+        for i in range(num_unique):
+            unique.append({
+                "topic": topics[rng.randrange(len(topics))],
+                "event_id": f"{run_id}-{name}-{i}",
+                "timestamp": (base_time + timedelta(milliseconds=i)).isoformat(),
+                "source": "benchmark",
+                "payload": {"index": i, "data": rng.randbytes(filler_chars).hex()},
+            })
+        events = unique + [unique[rng.randrange(num_unique)] for _ in range(count - num_unique)]
+        rng.shuffle(events)
+
+        self.unique = unique
+        self.events = events
+        self.batches = [events[i:i + args.batch_size] for i in range(0, len(events), args.batch_size)]
+        self.bodies = [json.dumps(batch).encode() for batch in self.batches]
+
+    def head(self, num_batches: int) -> "Workload":
+        """Workload berisi num_batches batch pertama saja (event yang sama, untuk dikirim ulang)."""
+        subset = copy.copy(self)
+        subset.batches = self.batches[:num_batches]
+        subset.bodies = self.bodies[:num_batches]
+        subset.events = [event for batch in subset.batches for event in batch]
+        return subset
+
+    @property
+    def num_unique(self) -> int:
+        return len(self.unique)
+
+    @property
+    def num_duplicates(self) -> int:
+        return len(self.events) - len(self.unique)
+
+
+# --- Target: in-process (ASGI) atau server HTTP ---
+class InProcessTarget:
+    """Menjalankan app FastAPI di proses yang sama (lifespan + ASGITransport), tanpa jaringan."""
+
+    restartable = True
+
+    def __init__(self, args):
+        # Konfigurasi dibaca saat import, jadi env harus di-set sebelum src.main diimport
+        os.environ["AGGREGATOR_DB_FOLDER"] = args.db_folder or tempfile.mkdtemp(prefix="bench_suite_")
+        import logging
+        from src import config, database
+        from src import main as aggregator
+        logging.getLogger().setLevel(args.log_level.upper())
+        self.config = config
+        self.database = database
+        self.aggregator = aggregator
+        self.client = None
+        self._lifespan = None
+
+    def describe(self):
+        config = self.config
+        return {
+            "mode": "in-process",
+            "db_folder": config.DB_FOLDER,
+            "batch_size": config.CONSUMER_BATCH_SIZE,
+            "flush_interval_ms": config.CONSUMER_FLUSH_INTERVAL_MS,
+            "pool_size": config.CONSUMER_POOL_SIZE,
+            "consumer_shards": config.CONSUMER_SHARDS,
+            "storage_partitions": config.STORAGE_PARTITIONS,
+            "max_queue_size": config.MAX_QUEUE_SIZE,
+            "sqlite_synchronous": config.SQLITE_SYNCHRONOUS,
+            "metrics_enabled": config.METRICS_ENABLED,
+            "ingest_log": config.INGEST_LOG_ENABLED,
+            "ingest_log_fsync": config.INGEST_LOG_FSYNC,
+            "payload_compression": config.PAYLOAD_COMPRESSION,
+        }
+
+    async def start(self):
+        app = self.aggregator.app
+        self._lifespan = app.router.lifespan_context(app)
+        await self._lifespan.__aenter__()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://aggregator", timeout=None)
+
+    async def stop(self):
+        await self.client.aclose()
+        await self._lifespan.__aexit__(None, None, None)
+        self.client = self._lifespan = None
+
+    def wipe(self):
+        """Menghapus file DB dan ingest log (aplikasi harus sudah berhenti) agar skenario mulai dari storage kosong."""
+        self.database.delete_database_files()
+        shutil.rmtree(self.config.INGEST_LOG_FOLDER, ignore_errors=True)
+
+    def bloom_warming(self) -> bool:
+        return self.aggregator.dedup_cache.warming
+
+
+class HttpTarget:
+    """Server yang sudah berjalan. Storage tidak bisa dikosongkan, jadi hasil dihitung sebagai selisih."""
+
+    restartable = False
+
+    def __init__(self, args):
+        self.url = args.url.rstrip("/")
+        self.limits = httpx.Limits(max_connections=args.concurrency + 2)
+        self.client = None
+
+    def describe(self):
+        return {"mode": "http", "url": self.url}
+
+    async def start(self):
+        self.client = httpx.AsyncClient(base_url=self.url, limits=self.limits, timeout=60.0)
+
+    async def stop(self):
+        await self.client.aclose()
+        self.client = None
+
+    def wipe(self):
+        pass
+
+
+# --- Operasi dasar ---
+async def get_stats(client) -> dict:
+    response = await client.get("/stats")
+    response.raise_for_status()
+    return response.json()
+
+
+def processed_count(stats: dict) -> int:
+    return stats["unique_processed"] + stats["duplicate_dropped"]
+
+
+async def publish_all(client, workload: Workload, concurrency: int, sent_at: dict = None) -> dict:
+    """
+    Mengirim semua batch dengan `concurrency` request bersamaan. 429 diulang sesuai Retry-After.
+    Jika sent_at diberikan, waktu kirim pertama tiap event_id dicatat (untuk latensi end-to-end).
+    """
+    ack_latencies = []
+    counters = {"requests": 0, "retries_429": 0, "failed_requests": 0}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < len(workload.bodies):
+            index = next_index
+            next_index += 1
+            body = workload.bodies[index]
+            started = time.perf_counter()
+            if sent_at is not None:
+                for event in workload.batches[index]:
+                    sent_at.setdefault(event["event_id"], started)
+            while True:
+                counters["requests"] += 1
+                response = await client.post("/publish", content=body, headers={"Content-Type": "application/json"})
+                if response.status_code == 429:
+                    counters["retries_429"] += 1
+                    await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+                    continue
+                break
+            if response.status_code != 202:
+                counters["failed_requests"] += 1
+                log(f"Publish gagal: HTTP {response.status_code} - {response.text[:200]}")
+                continue
+            ack_latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - started
+    return {
+        **counters,
+        "elapsed_s": round(elapsed, 4),
+        "ack_throughput_eps": round(len(workload.events) / elapsed, 1) if elapsed else None,
+        "ack_latency_ms": summarize(ack_latencies),
+    }
+
+
+async def wait_processed(client, target_count: int, poll_interval: float, timeout: float) -> dict:
+    """Menunggu sampai unique_processed + duplicate_dropped mencapai target_count."""
+    deadline = time.perf_counter() + timeout
+    while True:
+        stats = await get_stats(client)
+        if processed_count(stats) >= target_count:
+            return stats
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"Timeout: baru {processed_count(stats)} dari {target_count} event diproses")
+        await asyncio.sleep(poll_interval)
+
+
+class StorageWatcher:
+    """
+    Polling /events (keyset pagination) dan mencatat kapan tiap event_id unik pertama kali
+    terlihat di storage. Halaman yang belum penuh tidak punya cursor berikutnya, jadi
+    halaman ekor dibaca ulang sampai penuh (maksimal EVENTS_PAGE_LIMIT baris per polling).
+    """
+
+    def __init__(self, client, sent_at: dict, expected: set, since: str, poll_interval: float):
+        self.client = client
+        self.sent_at = sent_at
+        self.expected = expected
+        self.since = since
+        self.poll_interval = poll_interval
+        self.seen = {}
+        self.polls = 0
+
+    async def run(self, timeout: float):
+        deadline = time.perf_counter() + timeout
+        cursor = None
+        while len(self.seen) < len(self.expected):
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"Timeout: baru {len(self.seen)} dari {len(self.expected)} event terlihat di /events")
+            params = {"limit": EVENTS_PAGE_LIMIT, "since": self.since}
+            if cursor:
+                params["after"] = cursor
+            response = await self.client.get("/events", params=params)
+            response.raise_for_status()
+            now = time.perf_counter()
+            self.polls += 1
+            for event in response.json():
+                event_id = event["event_id"]
+                if event_id in self.expected and event_id not in self.seen:
+                    self.seen[event_id] = now
+            next_cursor = response.headers.get("x-next-cursor")
+            if next_cursor:
+                cursor = next_cursor
+                continue
+            await asyncio.sleep(self.poll_interval)
+
+    def latencies_ms(self):
+        return [(seen - self.sent_at[event_id]) * 1000 for event_id, seen in self.seen.items()]
+
+
+def utc_now_iso() -> str:
+    # processed_at disimpan dalam UTC; mundur 1 detik untuk toleransi pembulatan
+    return (datetime.utcnow() - timedelta(seconds=1)).isoformat()
+
+
+async def fill_storage(client, workload: Workload, args) -> dict:
+    """Publish workload dan tunggu sampai semuanya diproses (tanpa pengukuran end-to-end)."""
+    baseline = processed_count(await get_stats(client))
+    publish = await publish_all(client, workload, args.concurrency)
+    await wait_processed(client, baseline + len(workload.events), args.poll_ms / 1000, args.timeout)
+    return publish
+
+
+def check_counts(before: dict, after: dict, unique: int, duplicates: int) -> dict:
+    """Membandingkan selisih /stats dengan jumlah unik/duplikat yang seharusnya."""
+    got_unique = after["unique_processed"] - before["unique_processed"]
+    got_duplicates = after["duplicate_dropped"] - before["duplicate_dropped"]
+    return {
+        "expected_unique": unique,
+        "unique_processed": got_unique,
+        "expected_duplicates": duplicates,
+        "duplicate_dropped": got_duplicates,
+        "ok": got_unique == unique and got_duplicates == duplicates,
+    }
+
+
+# --- Skenario ---
+async def scenario_ingest(target, args, run_id: str) -> dict:
+    client = target.client
+    workload = Workload(args, run_id, "ingest", args.dup_ratio)
+    before = await get_stats(client)
+    sent_at = {}
+    watcher = StorageWatcher(client, sent_at, {event["event_id"] for event in workload.unique},
+                             utc_now_iso(), args.poll_ms / 1000)
+
+    started = time.perf_counter()
+    watch_task = asyncio.create_task(watcher.run(args.timeout))
+    publish = await publish_all(client, workload, args.concurrency, sent_at=sent_at)
+    await watch_task
+    stored_elapsed = time.perf_counter() - started
+    after = await wait_processed(client, processed_count(before) + len(workload.events),
+                                 args.poll_ms / 1000, args.timeout)
+    processed_elapsed = time.perf_counter() - started
+
+    return {
+        "events": len(workload.events),
+        "unique": workload.num_unique,
+        "duplicates": workload.num_duplicates,
+        "publish": publish,
+        "stored_elapsed_s": round(stored_elapsed, 4),
+        "processed_elapsed_s": round(processed_elapsed, 4),
+        "e2e_throughput_eps": round(len(workload.events) / processed_elapsed, 1),
+        "e2e_latency_ms": summarize(watcher.latencies_ms()),
+        "events_polls": watcher.polls,
+        "check": check_counts(before, after, workload.num_unique, workload.num_duplicates),
+    }
+
+
+async def scenario_dedup(target, args, run_id: str) -> dict:
+    client = target.client
+    workload = Workload(args, run_id, "dedup", 0.0)
+    before = await get_stats(client)
+    first_started = time.perf_counter()
+    first = await fill_storage(client, workload, args)
+    first_elapsed = time.perf_counter() - first_started
+
+    middle = await get_stats(client)
+    replay_started = time.perf_counter()
+    replay = await publish_all(client, workload, args.concurrency)
+    after = await wait_processed(client, processed_count(middle) + len(workload.events),
+                                 args.poll_ms / 1000, args.timeout)
+    replay_elapsed = time.perf_counter() - replay_started
+
+    return {
+        "events": len(workload.events),
+        "first_pass": {**first, "e2e_throughput_eps": round(len(workload.events) / first_elapsed, 1)},
+        "replay": {**replay, "e2e_throughput_eps": round(len(workload.events) / replay_elapsed, 1)},
+        "dedup_cache": after["dedup_cache"],
+        "check": check_counts(before, after, workload.num_unique, len(workload.events)),
+    }
+
+
+async def timed_requests(client, repeat: int, path: str, params: dict) -> dict:
+    latencies = []
+    rows = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await client.get(path, params=params)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        rows = len(response.json())
+    return {"rows": rows, "latency_ms": summarize(latencies)}
+
+
+async def scenario_query(target, args, run_id: str) -> dict:
+    client = target.client
+    workload = Workload(args, run_id, "query", args.dup_ratio)
+    # Di mode HTTP storage berisi data lain, jadi query dibatasi ke event run ini
+    since = None if target.restartable else utc_now_iso()
+    await fill_storage(client, workload, args)
+    base = {"since": since} if since else {}
+
+    # Cursor walk: semua halaman sampai X-Next-Cursor tidak ada
+    walk_started = time.perf_counter()
+    walk_rows = walk_pages = 0
+    cursor = None
+    while True:
+        params = {**base, "limit": EVENTS_PAGE_LIMIT}
+        if cursor:
+            params["after"] = cursor
+        response = await client.get("/events", params=params)
+        response.raise_for_status()
+        walk_rows += len(response.json())
+        walk_pages += 1
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    walk_elapsed = time.perf_counter() - walk_started
+
+    # Export NDJSON (ASGITransport membuffer seluruh respons; di mode HTTP di-stream)
+    export_started = time.perf_counter()
+    export_rows = 0
+    async with client.stream("GET", "/events", params={**base, "format": "ndjson"}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line:
+                export_rows += 1
+    export_elapsed = time.perf_counter() - export_started
+
+    return {
+        "stored_events": workload.num_unique,
+        "first_page": await timed_requests(client, args.query_repeat, "/events", {**base, "limit": EVENTS_PAGE_LIMIT}),
+        "topic_page": await timed_requests(client, args.query_repeat, "/events",
+                                           {**base, "topic": "bench.t0", "limit": EVENTS_PAGE_LIMIT}),
+        "cursor_walk": {
+            "rows": walk_rows, "pages": walk_pages, "elapsed_s": round(walk_elapsed, 4),
+            "rows_per_sec": round(walk_rows / walk_elapsed, 1) if walk_elapsed else None,
+        },
+        "ndjson_export": {
+            "rows": export_rows, "elapsed_s": round(export_elapsed, 4),
+            "rows_per_sec": round(export_rows / export_elapsed, 1) if export_elapsed else None,
+        },
+    }
+
+
+async def scenario_cold_restart(target, args, run_id: str) -> dict:
+    if not target.restartable:
+        return {"skipped": "restart hanya bisa dilakukan di mode in-process"}
+    workload = Workload(args, run_id, "restart", args.dup_ratio)
+    await fill_storage(target.client, workload, args)
+    before = await get_stats(target.client)
+
+    await target.stop()
+    started = time.perf_counter()
+    await target.start()
+    startup_elapsed = time.perf_counter() - started
+    while target.bloom_warming():
+        await asyncio.sleep(0.001)
+    warm_elapsed = time.perf_counter() - started
+
+    client = target.client
+    restarted = await get_stats(client)
+    # Kirim ulang sebagian event lama: semuanya harus terdeteksi duplikat setelah restart
+    replay = workload.head(max(1, len(workload.batches) // 10))
+    replay_publish = await publish_all(client, replay, args.concurrency)
+    after = await wait_processed(client, processed_count(restarted) + len(replay.events),
+                                 args.poll_ms / 1000, args.timeout)
+
+    return {
+        "stored_events": workload.num_unique,
+        "startup_ms": round(startup_elapsed * 1000, 3),
+        "bloom_warm_ms": round(warm_elapsed * 1000, 3),
+        "stats_survived_restart": all(
+            restarted[key] == before[key] for key in ("unique_processed", "duplicate_dropped")
+        ),
+        "replay": replay_publish,
+        "check": check_counts(restarted, after, 0, len(replay.events)),
+    }
+
+
+SCENARIO_FUNCS = {
+    "ingest": scenario_ingest,
+    "dedup": scenario_dedup,
+    "query": scenario_query,
+    "cold-restart": scenario_cold_restart,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    target = HttpTarget(args) if args.url else InProcessTarget(args)
+    # Di mode in-process storage dikosongkan per skenario, jadi event_id boleh deterministik
+    run_id = uuid.uuid4().hex[:8] if args.url else f"s{args.seed}"
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("scenarios", "output")},
+            "target": target.describe(),
+        },
+        "scenarios": {},
+    }
+    for name in args.scenarios:
+        log(f"--- Skenario: {name} ---")
+        target.wipe()
+        await target.start()
+        try:
+            result = await SCENARIO_FUNCS[name](target, args, run_id)
+        finally:
+            if target.client is not None:
+                await target.stop()
+        results["scenarios"][name] = result
+        log(json.dumps(result, indent=2))
+    return results
+
+
+def write_results(results: dict, output: str = None):
+    """Hasil JSON ke file (jika output diisi) atau stdout."""
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+        log(f"Hasil ditulis ke {output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    write_results(asyncio.run(run(args)), args.output)